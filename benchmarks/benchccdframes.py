@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""Time HDFSelection and CCDFrames operations on synthetic run files.
+
+python benchmarks/benchccdframes.py [options] [size ...]
+
+Sizes are the keys of SIZES, by default all.  The run files are written
+by py15sacla.synthetic to a temporary directory.  The best times are
+compared with the stored baselines in baselines.json next to this file.
+Cases slower than the baseline by more than the tolerance factor are
+reported as regressions, which gives a nonzero exit code.  Use --save
+to store new baselines after an intended change or on a new machine.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import timeit
+
+from py15sacla.synthetic import writeSyntheticRun
+from py15sacla.hdfselection import HDFSelection
+from py15sacla.ccdframes import CCDFrames
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'baselines.json')
+
+# Number of frames and frame shape of the benchmarked runs.
+SIZES = {
+    'small' : (50, (64, 64)),
+    'medium' : (200, (256, 256)),
+    'large' : (400, (512, 512)),
+}
+
+
+def besttime(fnc, *args):
+    "Return the best time in seconds of several repeated calls."
+    t = timeit.Timer(lambda: fnc(*args))
+    number, _ = t.autorange()
+    return min(t.repeat(repeat=3, number=number)) / number
+
+
+def consume(iterator):
+    "Exhaust iterator, e.g., of processed frames."
+    for x in iterator:
+        pass
+    return
+
+
+def benchcases(filename):
+    "Return a list of (name, function) pairs for the run file."
+    sel = HDFSelection(filename)
+    frames = sel['detector_data$']
+    delays = HDFSelection(filename, 'opt_delay')[0][()]
+    ccd = CCDFrames(filename)
+    ccd.setBackground(0.1)
+    ccd.setThreshold(0.5, 3)
+    ccdhist = CCDFrames(filename)
+    ccdhist.setThreshold(0.5, 3)
+    ccdhist.setHistBins(0, 3, 30)
+    rv = [
+        ('HDFSelection', lambda: HDFSelection(filename)),
+        ('pattern', lambda: sel['detector_2d_1 detector_data$']),
+        ('groupby', lambda: frames.groupby(delays)),
+        ('generate', lambda: consume(ccd.generate())),
+        ('mean', ccd.mean),
+        ('ahistogram', ccdhist.ahistogram),
+        ('toarray', lambda: ccd.toarray(slice(None))),
+        ('compress', lambda: ccd.compress(delays, 'mean')),
+    ]
+    return rv
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark py15sacla on synthetic run files.")
+    parser.add_argument('sizes', nargs='*',
+        help="data sizes to benchmark from {}, by default all".format(
+            ', '.join(sorted(SIZES, key=lambda s: SIZES[s][0]))))
+    parser.add_argument('--save', action='store_true',
+        help="store the measured times as new baselines")
+    parser.add_argument('--baselines', default=BASELINES,
+        help="JSON file of baseline times [%(default)s]")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+        help="maximum ratio to the baseline time [%(default)s]")
+    opts = parser.parse_args(argv)
+    for size in opts.sizes:
+        if size not in SIZES:
+            parser.error("unknown size {!r}".format(size))
+    sizes = opts.sizes or sorted(SIZES, key=lambda s: SIZES[s][0])
+    baselines = {}
+    if os.path.isfile(opts.baselines):
+        with open(opts.baselines) as fp:
+            baselines = json.load(fp)
+    tmpdir = tempfile.mkdtemp()
+    regressions = []
+    try:
+        for size in sizes:
+            nframes, shape = SIZES[size]
+            filename = os.path.join(tmpdir, 'run_{}.h5'.format(size))
+            writeSyntheticRun(filename, nframes=nframes, shape=shape)
+            print("{}: {} frames of {}x{}".format(size, nframes, *shape))
+            measured = baselines.setdefault(size, {}) if opts.save else {}
+            reference = {} if opts.save else baselines.get(size, {})
+            for name, fnc in benchcases(filename):
+                t = besttime(fnc)
+                measured[name] = t
+                line = "  {:14s} {:10.6f} s".format(name, t)
+                if name in reference:
+                    ratio = t / reference[name]
+                    line += "   baseline {:10.6f} s   ratio {:5.2f}".format(
+                            reference[name], ratio)
+                    if ratio > opts.tolerance:
+                        line += "   REGRESSION"
+                        regressions.append((size, name))
+                print(line)
+    finally:
+        shutil.rmtree(tmpdir)
+    if opts.save:
+        with open(opts.baselines, 'w') as fp:
+            json.dump(baselines, fp, indent=2, sort_keys=True)
+        print("Baselines saved to {}".format(opts.baselines))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+# End of file
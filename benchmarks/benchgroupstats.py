@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Compare py15sacla.groupstats with the former utils implementations.
+
+python benchmarks/benchgroupstats.py [nshots]
+
+The former unique_ordered used pandas.unique, which is skipped when
+pandas is not installed.  The former multiplicities counted values in
+a Python loop over the flattened array.
+"""
+
+import sys
+import timeit
+import collections
+import numpy
+
+from py15sacla import groupstats
+
+
+def legacy_unique_ordered(a):
+    import pandas
+    return pandas.unique(a)
+
+
+def legacy_multiplicities(a):
+    a = numpy.asarray(a)
+    cnts = collections.OrderedDict()
+    for x in a.flat:
+        cnts[x] = cnts.get(x, 0) + 1
+    return numpy.array(list(cnts.values()))
+
+
+def besttime(fnc, *args):
+    "Return the best time in seconds of several repeated calls."
+    t = timeit.Timer(lambda: fnc(*args))
+    number, _ = t.autorange()
+    return min(t.repeat(repeat=3, number=number)) / number
+
+
+def main(nshots=100000):
+    # delay-scan like keys with 50 distinct delays
+    keys = numpy.random.randint(0, 50, size=nshots) * 0.25
+    cases = [
+        ('unique_ordered', groupstats.unique_ordered, legacy_unique_ordered),
+        ('multiplicities', groupstats.multiplicities, legacy_multiplicities),
+    ]
+    print("nshots = {}".format(nshots))
+    for name, fnew, fold in cases:
+        tnew = besttime(fnew, keys)
+        try:
+            told = besttime(fold, keys)
+        except ImportError:
+            print("{:16s} new {:10.6f} s   legacy skipped".format(name, tnew))
+            continue
+        print("{:16s} new {:10.6f} s   legacy {:10.6f} s   speedup {:6.1f}x"
+              .format(name, tnew, told, told / tnew))
+    return
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
+
+# End of file
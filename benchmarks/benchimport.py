@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+"""Measure import time and heavy dependencies of py15sacla entry points.
+
+python benchmarks/benchimport.py [repeat]
+
+Every statement is executed in a fresh Python process.  The reported
+time is the best of repeat runs.  The last column lists the heavy
+packages that were imported by the statement.
+"""
+
+import sys
+import subprocess
+
+STATEMENTS = [
+    'import py15sacla',
+    'import py15sacla.cli',
+    'from py15sacla.cli import _buildParser; _buildParser()',
+    'from py15sacla.compression import INPUT_TEMPLATE',
+    'from py15sacla.ipy_all import findfiles; findfiles("x")',
+    'from py15sacla.ipy_all import *',
+]
+
+HEAVY = ['numpy', 'h5py', 'IPython', 'pandas', 'matplotlib']
+
+SCRIPT = '''\
+import sys, time
+t0 = time.perf_counter()
+{}
+t = time.perf_counter() - t0
+print(t, ' '.join(m for m in {!r} if m in sys.modules))
+'''
+
+
+def importtime(statement):
+    "Return (seconds, heavy_modules) for statement in a new process."
+    script = SCRIPT.format(statement, HEAVY)
+    out = subprocess.check_output([sys.executable, '-c', script])
+    t, _, heavy = out.decode().strip().partition(' ')
+    return float(t), heavy
+
+
+def main(repeat=5):
+    for stmt in STATEMENTS:
+        results = [importtime(stmt) for i in range(repeat)]
+        t = min(r[0] for r in results)
+        heavy = results[0][1] or '-'
+        print("{:58s} {:8.4f} s   {}".format(stmt, t, heavy))
+    return
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
+
+# End of file
@@ -1,7 +1,6 @@
 #!/bin/bash
 
-rm temp_comp.py.e*
-rm temp_comp.py.o*
+rm -f py15sacla.o* py15sacla.e*
 
 rm SaveRunHDF-*.o*
 rm SaveRunHDF-*.e*
@@ -1,29 +1,18 @@
 #!/home/mdean/anaconda3/bin/python
 
-import sys
-import fileinput 
-from shutil import copy
-import subprocess 
+"""Compress one run or an inclusive range of runs on this machine.
+
+usage: compress.py run [lastrun]
 
-if len(sys.argv) == 2:
-    run = sys.argv[1]
-    copy('/home/mdean/datacompressing/comp1file.py', 
-         '/home/mdean/datacompressing/temp_comp.py')
-    #print("running {}".format(run))
-    for line in fileinput.input('temp_comp.py', inplace=True):
-        print(line.replace('run = ', 'run = {}'.format(run)), end='')
-    
-    subprocess.run(['chmod', '+x', '/home/mdean/datacompressing/temp_comp.py'])
-    subprocess.run(["qsub", "/home/mdean/datacompressing/temp_comp.py"])
+This is a shortcut for "py15sacla compress", see its --help for options
+such as --jobs or --emit-jobarray for submitting a PBS job array.
+"""
+
+import sys
+from py15sacla.cli import main
 
-elif len(sys.argv) == 3:
-    for run in range(int(sys.argv[1]), int(sys.argv[2])+1):
-        copy('/home/mdean/datacompressing/comp1file.py', 
-               '/home/mdean/datacompressing/temp_comp.py')
-        #print("running {}".format(run))
-        for line in fileinput.input('/home/mdean/datacompressing/temp_comp.py', inplace=True):
-            print(line.replace('run = ', 'run = {}'.format(run)), end='')
-        
-        subprocess.run(['chmod', '+x', '/home/mdean/datacompressing/temp_comp.py'])
-        subprocess.run(["qsub", "/home/mdean/datacompressing/temp_comp.py"])  
-            
+if len(sys.argv) == 3:
+    runs = ['{}-{}'.format(*sys.argv[1:3])]
+else:
+    runs = sys.argv[1:]
+sys.exit(main(['compress'] + runs))
@@ -1,12 +1,11 @@
 from py15sacla import hdfselection
 from py15sacla import ccdframes
 from py15sacla.utils import getDetectorConfig
+from py15sacla.background import buildBackground
 import h5py
 import numpy as np
 import matplotlib.pyplot as plt
 
-from functools import reduce
-
 
 run = 542357
 
@@ -17,11 +16,11 @@ run_info = hdfselection.HDFSelection('/work/mdean/h5files/run_' + str(run) + '_b
 
 BG_info = run_info['detector_2d_1']['detector_data']
 
-BG = reduce(lambda a,b :a+b, [h5im.value for h5im in BG_info])/len(BG_info)
+BG_model = buildBackground(BG_info)
+BG = BG_model.mean
 
 plt.imshow(BG, vmin=np.percentile(BG,5), vmax=np.percentile(BG,95))
 plt.colorbar()
 
-h5file = h5py.File('/home/mdean/datacompressing/BG.h5')
-h5file.create_dataset('BG', data=BG)
-h5file.close()
+# versioned dark file with mean, variance and hot pixels, "BG" links to mean
+BG_model.save('/home/mdean/datacompressing/BG.h5')
@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+
+"""Execute the py15sacla command with
+
+python -m py15sacla
+"""
+
+import sys
+from py15sacla.cli import main
+
+sys.exit(main())
+
+# End of file
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+'''Streaming accumulators of per-pixel statistics over detector frames.
+
+The accumulators are updated from single 2D frames or from 3D blocks of
+frames stacked along the first axis.  Accumulators updated from separate
+subsets of frames can be merged exactly.
+'''
+
+import numpy
+
+
+class MeanVarianceAccumulator(object):
+
+    """Per-pixel mean and variance using Welford updates.
+
+    Blocks of frames and other accumulators are combined with the exact
+    pairwise formula of Chan et al., so that the result does not depend
+    on how the frames were split.  Frames can have weights, which give
+    the weighted mean sum(w * frame) / sum(w) and the variance with
+    reliability weights.
+
+    Data attributes:
+
+    count    -- number of accumulated frames.
+    weight   -- sum of the frame weights, equal to count for unweighted
+                frames.
+    weight2  -- sum of the squared frame weights.
+    mean     -- array of per-pixel means or None before the first update.
+    m2       -- array of per-pixel weighted sums of squared deviations
+                from mean.
+    """
+
+    count = 0
+    weight = 0
+    weight2 = 0
+    mean = None
+    m2 = None
+
+    def update(self, frames, weight=None, scale=None):
+        """Add one frame or a 3D block of frames.
+
+        frames   -- 2D array of one frame or 3D array of several frames
+                    stacked along the first axis.
+        weight   -- optional weight of the frame or array of per-frame
+                    weights for a 3D block.
+        scale    -- optional factor of the frame values or array of
+                    per-frame factors, e.g., the inverse of I0.  This
+                    is applied without making scaled copies of frames.
+
+        No return value.
+        """
+        frames = numpy.asarray(frames)
+        if weight is not None or scale is not None:
+            self._updateWeighted(frames, weight, scale)
+            return
+        if frames.ndim == 3:
+            if len(frames):
+                bmean = frames.mean(axis=0)
+                dev = frames - bmean
+                bm2 = numpy.einsum('ijk,ijk->jk', dev, dev)
+                self._combine(len(frames), bmean, bm2)
+            return
+        if self.mean is None:
+            self._combine(1, frames.astype(float),
+                    numpy.zeros(frames.shape, dtype=float))
+            return
+        self.count += 1
+        self.weight += 1
+        self.weight2 += 1
+        delta = frames - self.mean
+        self.mean += delta / self.weight
+        delta *= frames - self.mean
+        self.m2 += delta
+        return
+
+
+    def merge(self, other):
+        """Add statistics from another MeanVarianceAccumulator.
+
+        No return value.
+        """
+        if other.count:
+            self._combine(other.count, other.mean, other.m2,
+                    other.weight, other.weight2)
+        return
+
+
+    def variance(self, ddof=0):
+        """Return array of per-pixel variances.
+
+        ddof -- delta degrees of freedom, the divisor is count - ddof
+                for unweighted frames and weight - ddof * weight2 / weight
+                for weighted frames.
+
+        Return 2D array.
+        """
+        w = self.weight
+        n = w - ddof * self.weight2 / w if w else 0
+        return self.m2 / (n if n > 0 else 1)
+
+
+    def std(self, ddof=0):
+        "Return array of per-pixel standard deviations."
+        return numpy.sqrt(self.variance(ddof))
+
+
+    def effectiveCount(self):
+        """Return effective number of frames for the error of the mean.
+
+        This is weight**2 / weight2, which equals count for unweighted
+        frames.
+        """
+        return self.weight ** 2 / self.weight2 if self.weight2 else 0
+
+    # helper methods
+
+    def _updateWeighted(self, frames, weight, scale):
+        "Add frames with weights and scale factors, see update."
+        nfr = len(frames) if frames.ndim == 3 else None
+        shape = () if nfr is None else (nfr,)
+        w = numpy.broadcast_to(numpy.asarray(
+            1.0 if weight is None else weight, dtype=float), shape)
+        s = numpy.broadcast_to(numpy.asarray(
+            1.0 if scale is None else scale, dtype=float), shape)
+        if nfr is None:
+            frames = frames[numpy.newaxis]
+            w, s, nfr = w.reshape(1), s.reshape(1), 1
+        if not nfr:
+            return
+        bw = w.sum()
+        bw2 = numpy.dot(w, w)
+        ws = w * s
+        bsum = numpy.einsum('i,ijk->jk', ws, frames)
+        bmean = bsum / bw if bw else numpy.zeros_like(bsum)
+        if nfr == 1:
+            bm2 = numpy.zeros_like(bmean)
+        else:
+            dev = frames * s[:, numpy.newaxis, numpy.newaxis]
+            dev -= bmean
+            bm2 = numpy.einsum('i,ijk,ijk->jk', w, dev, dev)
+        self._combine(nfr, bmean, bm2, bw, bw2)
+        return
+
+
+    def _combine(self, nb, bmean, bm2, bw=None, bw2=None):
+        """Combine statistics of nb frames with mean bmean and m2 bm2.
+
+        bw, bw2  -- sum of weights and squared weights of the frames,
+                    by default nb for unweighted frames.
+        """
+        bw = nb if bw is None else bw
+        bw2 = nb if bw2 is None else bw2
+        if not self.count:
+            self.count = nb
+            self.weight = bw
+            self.weight2 = bw2
+            self.mean = numpy.array(bmean, dtype=float)
+            self.m2 = numpy.array(bm2, dtype=float)
+            return
+        n = self.weight + bw
+        if n:
+            delta = bmean - self.mean
+            self.mean += delta * (float(bw) / n)
+            delta *= delta
+            delta *= float(self.weight) * bw / n
+            self.m2 += bm2
+            self.m2 += delta
+        self.count += nb
+        self.weight = n
+        self.weight2 += bw2
+        return
+
+# End of class MeanVarianceAccumulator
+
+# End of file
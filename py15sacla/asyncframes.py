@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+'''Asynchronous reductions of CCDFrames for interactive use.
+
+Frames are processed and accumulated in batches on a worker thread, so
+that an asyncio event loop such as the Jupyter kernel stays responsive.
+Partial accumulators are yielded periodically for progressive display
+and a reduction stops at the next batch when its task is cancelled:
+
+    async for acc in accumulate(ccd, MeanVarianceAccumulator()):
+        display(acc.mean)
+'''
+
+
+async def batches(ccd, batchsize=16):
+    '''Asynchronously generate batches of processed frames.
+
+    ccd          -- CCDFrames object.
+    batchsize    -- maximum number of frames in one batch.
+
+    Yield 3D arrays of processed frames stacked along the first axis.
+    '''
+    async with _FrameBatcher(ccd, batchsize) as fb:
+        block = await fb.next()
+        while block is not None:
+            yield block
+            block = await fb.next()
+    return
+
+
+async def accumulate(ccd, acc, batchsize=16, interval=1.0):
+    '''Asynchronously update accumulator with all processed frames.
+
+    ccd          -- CCDFrames object.
+    acc          -- accumulator with an update method that accepts 3D
+                    blocks of frames, e.g., MeanVarianceAccumulator or
+                    HistogramAccumulator.  Per-frame weights of ccd are
+                    passed as in CCDFrames.accumulate.
+    batchsize    -- maximum number of frames accumulated in one step.
+    interval     -- minimum time in seconds between partial results.
+
+    Yield acc at least every interval seconds and after the last frame
+    unless it was just yielded.  acc is not modified while the consumer
+    handles it.
+    '''
+    import time
+    pending = True
+    async with _FrameBatcher(ccd, batchsize, acc.update) as fb:
+        t0 = time.time()
+        while (await fb.next()) is not None:
+            pending = True
+            if time.time() - t0 >= interval:
+                pending = False
+                yield acc
+                t0 = time.time()
+    if pending:
+        yield acc
+    return
+
+
+async def meanAsync(ccd, batchsize=16, interval=1.0, callback=None):
+    '''Asynchronously compute average processed frame.
+
+    ccd          -- CCDFrames object.
+    batchsize, interval -- see accumulate.
+    callback     -- optional function called as callback(nframes, mean)
+                    with partial results.
+
+    Return 2D array of the average frame as CCDFrames.mean.
+    '''
+    from py15sacla.accumulators import MeanVarianceAccumulator
+    acc = MeanVarianceAccumulator()
+    async for acc in accumulate(ccd, acc, batchsize, interval):
+        if callback is not None and acc.count:
+            callback(acc.count, acc.mean)
+    rv = acc.mean if acc.count else 0.0
+    return rv
+
+
+async def histogramAsync(ccd, batchsize=16, interval=1.0, callback=None):
+    '''Asynchronously compute histogram of all processed frames.
+
+    ccd          -- CCDFrames object.  Automatic bins are assigned to
+                    its chistbins as in CCDFrames.histogram.
+    batchsize, interval -- see accumulate.
+    callback     -- optional function called as callback(nframes, acc)
+                    with the partial HistogramAccumulator.
+
+    Return the same array of bin counts as CCDFrames.histogram.
+    '''
+    from py15sacla.histogram import HistogramAccumulator
+    acc = HistogramAccumulator([ccd.chistbins or (None, None, 50)])
+    async for acc in accumulate(ccd, acc, batchsize, interval):
+        if callback is not None:
+            callback(acc.nframes, acc)
+    ccd._assignAutoHistBins(acc)
+    return acc.counts()
+
+# Local Helpers --------------------------------------------------------------
+
+class _FrameBatcher(object):
+    '''Generation of frame batches on a dedicated worker thread.
+
+    The frame generator is advanced only on the worker thread.  When the
+    consumer stops early, the generator is closed on that thread after
+    the running batch, so a cancelled reduction does not block the loop.
+    '''
+
+    def __init__(self, ccd, batchsize, update=None):
+        self.ccd = ccd
+        self.batchsize = batchsize
+        self.update = update
+        self._executor = None
+        self._frames = None
+        self._weights = (None, None)
+        self._scale = None
+        self._index = 0
+        return
+
+
+    async def __aenter__(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(1)
+        self._frames = self.ccd.generate()
+        self._weights = self.ccd._frameWeights()
+        # integer frames are accumulated in photons as in accumulate
+        if self.ccd._isADU():
+            self._scale = self.ccd._photonScale()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._executor.submit(self._frames.close)
+        self._executor.shutdown(wait=False)
+        return
+
+
+    async def next(self):
+        "Return next batch of frames or None after the last frame."
+        import asyncio
+        loop = asyncio.get_running_loop()
+        rv = await loop.run_in_executor(self._executor, self._nextBlock)
+        return rv
+
+
+    def _nextBlock(self):
+        "Read and process next batch and pass it to the update function."
+        import itertools
+        import numpy
+        frames = list(itertools.islice(self._frames, self.batchsize))
+        if not frames:
+            return None
+        rv = numpy.array(frames)
+        weights, factors = self._weights
+        lo = self._index
+        self._index += len(rv)
+        aa = rv if self._scale is None else rv * self._scale
+        if self.update is not None and weights is None:
+            self.update(aa)
+        elif self.update is not None:
+            self.update(aa, weight=weights[lo:self._index],
+                    scale=factors[lo:self._index])
+        return rv
+
+# End of class _FrameBatcher
+
+# End of file
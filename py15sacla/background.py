@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+'''Dark background model built from a run of background frames.
+
+The model keeps per-pixel mean, variance and hot-pixel flags in raw
+detector units together with the photon conversion factor of the run.
+It is stored in a versioned HDF5 dark file that can be passed directly
+to CCDFrames.setBackground.
+'''
+
+import numpy
+
+DARK_FORMAT = 'py15sacla-dark'
+DARK_VERSION = 1
+
+
+class BackgroundModel(object):
+
+    """Per-pixel dark statistics of detector frames in raw units.
+
+    Data attributes:
+
+    mean         -- 2D array of per-pixel mean values.
+    variance     -- 2D array of per-pixel variances.
+    hotpixels    -- 2D boolean array of flags for hot pixels.
+    nframes      -- number of frames used to build the model.
+    tophotons    -- conversion factor from raw values to photon counts.
+                    None when unknown, as for legacy background files.
+    run_number   -- run number of the background frames or None.
+    """
+
+    def __init__(self, mean, variance, hotpixels=None, nframes=0,
+            tophotons=1.0, run_number=None):
+        """Initialize new BackgroundModel.
+
+        mean         -- 2D array of per-pixel mean values.
+        variance     -- 2D array of per-pixel variances.
+        hotpixels    -- optional boolean array of hot pixel flags.
+                        All False when not specified.
+        nframes      -- number of frames used to build the model.
+        tophotons    -- conversion factor from raw values to photons.
+        run_number   -- optional run number of the background frames.
+        """
+        self.mean = numpy.asarray(mean, dtype=float)
+        self.variance = numpy.asarray(variance, dtype=float)
+        if hotpixels is None:
+            hotpixels = numpy.zeros(self.mean.shape, dtype=bool)
+        self.hotpixels = numpy.asarray(hotpixels, dtype=bool)
+        self.nframes = int(nframes)
+        self.tophotons = None if tophotons is None else float(tophotons)
+        self.run_number = run_number
+        return
+
+
+    def image(self, photons=True):
+        """Return the mean background image.
+
+        photons  -- convert to photon counts when True.
+
+        Return 2D array.
+        """
+        rv = self.mean * self._tophotons() if photons else self.mean.copy()
+        return rv
+
+
+    def noise(self, photons=True):
+        """Return per-pixel standard deviation of background frames.
+
+        photons  -- convert to photon counts when True.
+
+        Return 2D array.
+        """
+        rv = numpy.sqrt(self.variance)
+        if photons:
+            rv *= self._tophotons()
+        return rv
+
+
+    def findHotPixels(self, nsigma=5):
+        """Flag pixels with outlying mean or noise as hot pixels.
+
+        nsigma   -- threshold in robust standard deviations, which are
+                    estimated from the median absolute deviation.
+
+        No return value.  Assign hotpixels.
+        """
+        flags = numpy.zeros(self.mean.shape, dtype=bool)
+        for a in (self.mean, numpy.sqrt(self.variance)):
+            med = numpy.median(a)
+            sigma = 1.4826 * numpy.median(numpy.fabs(a - med))
+            if sigma > 0:
+                flags |= (a - med) > nsigma * sigma
+        self.hotpixels = flags
+        return
+
+
+    def save(self, filename):
+        """Write this model to a versioned dark HDF5 file.
+
+        filename -- path to the output file, which is overwritten.
+                    The mean image is also linked as "BG" for scripts
+                    that read the former background files.
+
+        No return value.
+        """
+        import h5py
+        with h5py.File(filename, 'w') as fp:
+            fp.attrs['format'] = DARK_FORMAT
+            fp.attrs['version'] = DARK_VERSION
+            fp.create_dataset('mean', data=self.mean)
+            fp.create_dataset('variance', data=self.variance)
+            fp.create_dataset('hotpixels',
+                    data=self.hotpixels.astype(numpy.uint8))
+            fp.create_dataset('nframes', data=self.nframes)
+            if self.tophotons is not None:
+                fp.create_dataset('tophotons', data=self.tophotons)
+            if self.run_number is not None:
+                fp.create_dataset('run_number', data=self.run_number)
+            fp['BG'] = h5py.SoftLink('/mean')
+        return
+
+    # helper methods
+
+    def _tophotons(self):
+        "Return photon conversion factor, raise ValueError when unknown."
+        if self.tophotons is None:
+            emsg = "Photon conversion is unknown for this background."
+            raise ValueError(emsg)
+        return self.tophotons
+
+# End of class BackgroundModel
+
+
+def loadBackground(filename):
+    '''Read BackgroundModel from a dark HDF5 file.
+
+    filename -- path to a file written by BackgroundModel.save.
+                Legacy files with only a "BG" dataset of the mean image
+                are also accepted as version 0 with zero variance and
+                unknown photon conversion.
+
+    Return BackgroundModel object.
+    '''
+    import h5py
+    with h5py.File(filename, 'r') as fp:
+        fmt = fp.attrs.get('format')
+        if isinstance(fmt, bytes):
+            fmt = fmt.decode()
+        if fmt is None and isinstance(fp.get('BG'), h5py.Dataset):
+            bg = fp['BG'][()]
+            return BackgroundModel(bg, numpy.zeros_like(bg), tophotons=None)
+        if fmt != DARK_FORMAT:
+            emsg = "{0!r} is not a dark background file.".format(filename)
+            raise ValueError(emsg)
+        version = int(fp.attrs['version'])
+        if version > DARK_VERSION:
+            emsg = "Unsupported dark file version {0}.".format(version)
+            raise ValueError(emsg)
+        run_number = fp['run_number'][()] if 'run_number' in fp else None
+        tophotons = fp['tophotons'][()] if 'tophotons' in fp else None
+        rv = BackgroundModel(fp['mean'][()], fp['variance'][()],
+                hotpixels=fp['hotpixels'][()], nframes=fp['nframes'][()],
+                tophotons=tophotons, run_number=run_number)
+    return rv
+
+
+def buildBackground(src, nshards=1, hotsigma=5):
+    '''Build BackgroundModel from background frames in a single pass.
+
+    src      -- source of the raw background frames.  Accepted types are
+                CCDFrames, HDFSelection, h5py.Group or a string of the HDF
+                file.  CCDFrames are processed with their background,
+                threshold, ROI and binning and the results are converted
+                back to raw units when cnormalize is set.  Other sources
+                are not normalized, thresholded or subtracted.
+    nshards  -- number of parallel processes that accumulate contiguous
+                shards of the frames.  Values other than 1 require src
+                to be a filename.
+    hotsigma -- threshold for flagging hot pixels, see findHotPixels.
+
+    Return BackgroundModel object.
+    '''
+    from py15sacla.ccdframes import CCDFrames
+    from py15sacla.accumulators import MeanVarianceAccumulator
+    from py15sacla.utils import getDetectorConfig
+    if isinstance(src, CCDFrames):
+        ccd = src
+    else:
+        ccd = CCDFrames(src)
+        ccd.cnormalize = False
+    if not len(ccd.selection):
+        raise ValueError("Cannot build background without any frames.")
+    acc = MeanVarianceAccumulator()
+    if nshards == 1:
+        for aa in ccd.generate():
+            acc.update(aa)
+    else:
+        if not isinstance(src, str):
+            emsg = "Parallel shards require src to be a filename."
+            raise TypeError(emsg)
+        import multiprocessing
+        bounds = numpy.linspace(0, len(ccd.selection), nshards + 1)
+        bounds = bounds.round().astype(int)
+        tasks = [(src, lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])
+                if lo < hi]
+        pool = multiprocessing.Pool(len(tasks))
+        try:
+            for shard in pool.map(_accumulateShard, tasks):
+                acc.merge(shard)
+        finally:
+            pool.close()
+            pool.join()
+    cfg = getDetectorConfig(ccd.selection[0])
+    # normalized frames are in photons, the model keeps raw units
+    units = 1.0
+    if ccd.cnormalize and not ccd._isADU():
+        units = cfg['tophotons']
+    rv = BackgroundModel(acc.mean / units, acc.variance() / units ** 2,
+            nframes=acc.count,
+            tophotons=cfg['tophotons'], run_number=cfg['run_number'])
+    rv.findHotPixels(hotsigma)
+    return rv
+
+# Local Helpers --------------------------------------------------------------
+
+def _accumulateShard(task):
+    "Return MeanVarianceAccumulator for raw frames lo:hi in a file."
+    from py15sacla.ccdframes import CCDFrames
+    from py15sacla.accumulators import MeanVarianceAccumulator
+    filename, lo, hi = task
+    ccd = CCDFrames(filename)
+    ccd.cnormalize = False
+    acc = MeanVarianceAccumulator()
+    for aa in ccd._subset(numpy.arange(lo, hi)).generate():
+        acc.update(aa)
+    ccd.hdffile.close()
+    return acc
+
+# End of file
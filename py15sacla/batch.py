@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+'''Batch processing of many runs on a single machine.
+
+Every run becomes one task that calls compression.compressRun in a local
+process pool.  Each run writes its own log file, failed runs are retried
+and the outcome is collected in a list of RunResult objects.  The same
+run list can be also written as a job array script for a batch system.
+'''
+
+import os
+
+
+class RunResult(object):
+
+    """Outcome of processing one run.
+
+    Data attributes:
+
+    run      -- run number.
+    ok       -- True when the last attempt succeeded.
+    attempts -- number of attempts made.
+    walltime -- total wall time of all attempts in seconds.
+    error    -- error message of the last failed attempt or None.
+    logfile  -- path to the log file of this run.
+    """
+
+    def __init__(self, run, logfile):
+        self.run = run
+        self.ok = False
+        self.attempts = 0
+        self.walltime = 0.0
+        self.error = None
+        self.logfile = logfile
+        return
+
+# End of class RunResult
+
+
+def parseRunList(specs):
+    '''Convert run specifications to a list of run numbers.
+
+    specs    -- list of strings, each is a run number, an inclusive
+                range "first-last" or several of these separated by
+                commas.  Can be also a single string.
+
+    Return a list of unique integer run numbers in the given order.
+    '''
+    from py15sacla.utils import unique_everseen
+    if isinstance(specs, str):
+        specs = [specs]
+    runs = []
+    for spec in specs:
+        for w in spec.split(','):
+            w = w.strip()
+            if not w:
+                continue
+            if '-' in w.lstrip('-'):
+                lo, hi = w.split('-', 1)
+                runs.extend(range(int(lo), int(hi) + 1))
+            else:
+                runs.append(int(w))
+    return list(unique_everseen(runs))
+
+
+def runBatch(runs, jobs=1, retries=1, logdir='.', metricsfile=None,
+        **options):
+    '''Compress runs in a local process pool.
+
+    runs     -- list of run numbers.
+    jobs     -- number of worker processes.  Process runs sequentially
+                in this process when 1.
+    retries  -- number of times a failed run is attempted again.
+    logdir   -- directory for the per-run log files "run_{run}.log".
+    metricsfile  -- optional JSON-lines log, where every attempt appends
+                its throughput metrics, see py15sacla.metrics.
+    options  -- keyword arguments passed to compressRun.
+
+    Return a list of RunResult objects in the order of runs.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    if not os.path.isdir(logdir):
+        os.makedirs(logdir)
+    results = [RunResult(run, os.path.join(logdir, 'run_{}.log'.format(run)))
+            for run in runs]
+    pending = results
+    while pending:
+        tasks = [(r.run, r.logfile, r.attempts + 1, metricsfile, options)
+                for r in pending]
+        if jobs > 1:
+            pool = ProcessPoolExecutor(min(jobs, len(tasks)))
+            try:
+                futures = [pool.submit(_runTask, t) for t in tasks]
+                outcomes = [_futureOutcome(f) for f in futures]
+            finally:
+                pool.shutdown()
+        else:
+            outcomes = [_runTask(t) for t in tasks]
+        for r, (ok, walltime, error) in zip(pending, outcomes):
+            r.attempts += 1
+            r.ok = ok
+            r.walltime += walltime
+            r.error = error
+        pending = [r for r in pending if not r.ok and r.attempts <= retries]
+    return results
+
+
+def formatSummary(results):
+    '''Return a printable summary table of batch results.
+
+    results  -- list of RunResult objects.
+
+    Return string.
+    '''
+    lines = ['{:>10s} {:>6s} {:>8s} {:>10s}  {}'.format(
+        'run', 'status', 'attempts', 'walltime', 'log')]
+    for r in results:
+        status = 'ok' if r.ok else 'FAILED'
+        lines.append('{:>10} {:>6s} {:>8d} {:>9.1f}s  {}'.format(
+            r.run, status, r.attempts, r.walltime, r.logfile))
+        if not r.ok:
+            lines.append('{:>10s} {}'.format('', r.error))
+    nfailed = sum(not r.ok for r in results)
+    lines.append('{} runs, {} succeeded, {} failed'.format(
+        len(results), len(results) - nfailed, nfailed))
+    return '\n'.join(lines)
+
+
+def jobArrayScript(runs, args, jobname='py15sacla'):
+    '''Return PBS job array script that compresses one run per array task.
+
+    runs     -- list of run numbers.
+    args     -- list of additional command-line arguments for
+                the "py15sacla compress" command.
+    jobname  -- name of the batch job.
+
+    Return string with the script text.
+    '''
+    import shlex
+    command = ['py15sacla', 'compress', '--jobs=1']
+    command += [shlex.quote(a) for a in args]
+    command.append('"${RUNS[$IDX]}"')
+    lines = [
+        '#!/bin/bash',
+        '#PBS -N {}'.format(jobname),
+        '#PBS -J 0-{}'.format(len(runs) - 1),
+        '',
+        'RUNS=({})'.format(' '.join(map(str, runs))),
+        'IDX=${PBS_ARRAY_INDEX:-$PBS_ARRAYID}',
+        'cd "${PBS_O_WORKDIR:-.}"',
+        'exec ' + ' '.join(command),
+        '',
+    ]
+    return '\n'.join(lines)
+
+# Local Helpers --------------------------------------------------------------
+
+def _futureOutcome(future):
+    '''Return outcome of a _runTask future from the process pool.
+
+    future   -- Future of a submitted _runTask call.  Tasks that finished
+                before a worker process died keep their own outcome.
+
+    Return a tuple of (ok, walltime, error).
+    '''
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        rv = future.result()
+    except BrokenProcessPool as e:
+        emsg = "worker process died: {}".format(e)
+        rv = (False, 0.0, emsg)
+    return rv
+
+
+def _runTask(task):
+    '''Compress one run with output redirected to its log file.
+
+    task     -- tuple of (run, logfile, attempt, metricsfile, options).
+                Metrics are not recorded when metricsfile is None.
+
+    Return a tuple of (ok, walltime, error).
+    '''
+    import sys
+    import time
+    import traceback
+    import contextlib
+    from py15sacla.compression import compressRun, INPUT_TEMPLATE
+    from py15sacla.profiling import profile
+    from py15sacla import metrics
+    run, logfile, attempt, metricsfile, options = task
+    ok = False
+    error = None
+    t0 = time.time()
+    with open(logfile, 'a') as fp, \
+            contextlib.redirect_stdout(fp), contextlib.redirect_stderr(fp):
+        print("# run {} attempt {} started {}".format(
+            run, attempt, time.ctime(t0)))
+        try:
+            with profile() as stats:
+                compressRun(run, **options)
+            ok = True
+        except Exception as e:
+            traceback.print_exc()
+            error = '{}: {}'.format(type(e).__name__, e)
+        walltime = time.time() - t0
+        print("# run {} {} after {:.1f} s".format(
+            run, 'finished' if ok else 'failed', walltime))
+        sys.stdout.flush()
+    if metricsfile is not None:
+        infile = (options.get('infile') or INPUT_TEMPLATE).format(run=run)
+        stats.peak('rss', metrics.peakRSS())
+        rec = metrics.runRecord(run, infile, stats, walltime, ok, error,
+                started=t0)
+        metrics.appendMetrics(metricsfile, rec)
+    return (ok, walltime, error)
+
+# End of file
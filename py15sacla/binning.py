@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+'''Pixel binning of detector images and multi-resolution pyramids.
+
+A binning factor is an integer or a (rows, columns) pair of integers.
+Each output pixel is the sum or mean of a block of factor input pixels.
+Trailing rows or columns that do not fill a whole block are dropped.
+
+A pyramid is a sequence of mean-binned copies of an image with binning
+factors 2, 4, 8 and so on, which is stored in reduced files for quick
+previews.
+'''
+
+import numpy
+
+# Smallest larger dimension of a pyramid level.  Levels are binned by
+# successive factors of 2 until both image dimensions are at most this.
+PYRAMID_MINSIZE = 64
+
+
+def binFrame(a, factor, mean=False):
+    '''Bin the last two axes of an array by integer factors.
+
+    a        -- 2D image or a stack of images as a 3D array.
+    factor   -- integer or a tuple of (rows, columns) binning factors.
+    mean     -- return block averages when True, block sums otherwise.
+
+    Return binned array.  Sums keep the data type of a, except for
+    integer types narrower than 32 bits, which are summed in int64.
+    '''
+    fy, fx = _factors(factor)
+    a = numpy.asarray(a)
+    if (fy, fx) == (1, 1):
+        return a
+    ny, nx = binnedShape(a.shape[-2:], (fy, fx))
+    lead = a.shape[:-2]
+    blocks = a[..., :ny * fy, :nx * fx].reshape(lead + (ny, fy, nx, fx))
+    if mean:
+        rv = blocks.mean(axis=(-3, -1))
+    else:
+        dtype = a.dtype
+        if numpy.issubdtype(dtype, numpy.integer) and dtype.itemsize < 4:
+            dtype = numpy.dtype(numpy.int64)
+        rv = blocks.sum(axis=(-3, -1), dtype=dtype)
+    return rv
+
+
+def binnedShape(shape, factor):
+    '''Return shape of a 2D image after binning.
+
+    shape    -- tuple of (rows, columns) of the unbinned image.
+    factor   -- integer or a tuple of (rows, columns) binning factors.
+
+    Return tuple of (rows, columns).
+    '''
+    fy, fx = _factors(factor)
+    ny, nx = shape
+    return (ny // fy, nx // fx)
+
+
+def buildPyramid(image, minsize=PYRAMID_MINSIZE):
+    '''Return mean-binned levels of an image for quick previews.
+
+    image    -- 2D array.
+    minsize  -- levels are created until both dimensions are at most
+                minsize or the next level would be empty.
+
+    Return a list of (factor, binned_image) pairs with increasing
+    factors of 2, 4, 8, etc.  The list is empty for small images.
+    '''
+    rv = []
+    level = numpy.asarray(image, dtype=float)
+    factor = 1
+    while max(level.shape) > minsize and min(level.shape) >= 2:
+        level = binFrame(level, 2, mean=True)
+        factor *= 2
+        rv.append((factor, level))
+    return rv
+
+# Local Helpers --------------------------------------------------------------
+
+def _factors(factor):
+    "Return binning factor as a validated (rows, columns) tuple."
+    fy, fx = (factor, factor) if numpy.ndim(factor) == 0 else factor
+    if int(fy) != fy or int(fx) != fx or fy < 1 or fx < 1:
+        emsg = "Binning factors must be positive integers, not {!r}."
+        raise ValueError(emsg.format(factor))
+    return (int(fy), int(fx))
+
+# End of file
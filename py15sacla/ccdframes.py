@@ -21,9 +21,21 @@ class CCDFrames(object):
                     region of interest.
     cthreshold   -- tuple of (lobound, hibound) filter for background
                     subtracted arrays.  Thereshold is not applied for the
-                    bounds set to None.
+                    bounds set to None.  The bounds can be scalars or
+                    per-pixel arrays of the image or ROI shape.
     chistbins    -- tuple of (lobound, hibound, bincount) values for
                     configuring histogram bins.
+    cprefetch    -- number of frames read ahead on a background thread
+                    during generate, by default 4.  Frames are read in
+                    the calling thread when 0.
+    cdtype       -- numpy dtype of the processed frames or None for the
+                    raw floating type or float64 for integer raw data.
+                    See setComputeType for the integer ADU mode.
+    cbinning     -- integer or (rows, columns) factor for summing blocks
+                    of processed pixels, by default 1 for no binning.
+    cweights     -- array of per-frame weights of the reductions or None.
+    cnormalizer  -- array of per-frame normalizers of the reductions,
+                    e.g., I0, or None.
     """
 
     cnormalize = True
@@ -31,13 +43,19 @@ class CCDFrames(object):
     cbackground = 0
     cthreshold = (None, None)
     chistbins = ()
+    cprefetch = 4
+    cdtype = None
+    cbinning = 1
+    cweights = None
+    cnormalizer = None
+    _sketched = (None, None)
 
     def __init__(self, src):
         """Initialize new CCDFrames object.
 
         src  -- HDF source for the detector images.  Accepted types are
-                HDFSelection, h5py.Group or a string of the HDF file.
-                This is used to assign the selection attribute.
+                HDFSelection, h5py.Group, FrameCache or a string of the
+                HDF file.  This is used to assign the selection attribute.
         """
         self.selection = HDFSelection(src, "detector_data$")
         return
@@ -66,11 +84,20 @@ class CCDFrames(object):
         Return a list of (unique_key, CCDFrames) pairs.
         """
         import copy
+        weighted = self._hasFrameWeights()
+        if weighted:
+            keys = list(keys)
         rv = []
         for k, sel in self.selection.groupbyitems(keys):
             selccd = copy.copy(self)
             selccd.selection = sel
             rv.append((k, selccd))
+        if weighted:
+            kidx = {}
+            for i, k in enumerate(keys):
+                kidx.setdefault(k, []).append(i)
+            for k, ccd in rv:
+                ccd._subsetFrameWeights(self, kidx[k])
         if isinstance(self.cbackground, CCDFrames):
             ccdlist = [ccd for k, ccd in rv]
             bggroups = self.cbackground.groupby(keys)
@@ -96,11 +123,26 @@ class CCDFrames(object):
 
         background   -- numpy array of photon counts or CCDFrames that
                         correspond to a series of background images.
+                        Can be also BackgroundModel or a filename of
+                        a dark file, which are converted to the mean
+                        image according to cnormalize.  Legacy files
+                        are converted with the photon conversion of
+                        the first selected frame.
                         Set to 0 to turn-off background subtraction.
 
         No return value.  Assign cbackground.
         """
         import copy
+        from py15sacla.background import BackgroundModel, loadBackground
+        if isinstance(background, str):
+            background = loadBackground(background)
+        if isinstance(background, BackgroundModel):
+            if self.cnormalize and background.tophotons is None:
+                from py15sacla.utils import getDetectorConfig
+                cfg = getDetectorConfig(self.selection[0])
+                background = background.mean * cfg['tophotons']
+            else:
+                background = background.image(photons=self.cnormalize)
         if background is self:
             background = copy.copy(self)
             background.selection = self.selection.copy()
@@ -117,12 +159,142 @@ class CCDFrames(object):
         lo   -- lower threshold bound.  Maps to -inf if None.
         hi   -- upper threshold bound.  Maps to +inf if None.
 
+        The bounds can be also 2D arrays of per-pixel thresholds.  Arrays
+        of the full image shape are cropped to croislice, arrays of the
+        ROI shape are used as they are.
+
         No return value.  Assing cthreshold.
         """
         self.cthreshold = (lo, hi)
         return
 
 
+    def setNoiseThreshold(self, noise, klo=None, khi=None):
+        """Set per-pixel threshold window from a background noise map.
+
+        noise    -- 2D array of per-pixel standard deviations in the
+                    units of processed images.  Can be also BackgroundModel
+                    or a filename of a dark file, which are converted
+                    according to cnormalize.
+        klo      -- multiple of noise for the lower bound.  No lower
+                    bound when None.
+        khi      -- multiple of noise for the upper bound.  No upper
+                    bound when None.
+
+        No return value.  Assign cthreshold.
+        """
+        from py15sacla.background import BackgroundModel, loadBackground
+        if isinstance(noise, str):
+            noise = loadBackground(noise)
+        if isinstance(noise, BackgroundModel):
+            noise = noise.noise(photons=self.cnormalize)
+        noise = numpy.asarray(noise, dtype=float)
+        lo = None if klo is None else klo * noise
+        hi = None if khi is None else khi * noise
+        self.setThreshold(lo, hi)
+        return
+
+
+    def setComputeType(self, dtype):
+        """Set data type used for processing the frames.
+
+        dtype    -- numpy floating or integer type or None for the
+                    default type of the raw data.
+
+        With float32 the frames are processed and returned in single
+        precision.  Each processed value differs from float64 by rounding
+        only, i.e., relative 6e-8, while sum and mean accumulate in
+        float64 and keep that accuracy.
+
+        With an integer type the frames are processed in raw detector
+        units (ADU) and generate and toarray return ADU frames.  The
+        background in photons is converted to ADU and rounded, which
+        changes each background-subtracted value by at most 0.5 ADU, i.e.,
+        0.5 / e_per_ph photons.  Threshold bounds are compared exactly in
+        ADU.  The photon conversion is applied once at the end of sum,
+        mean, total, atotal, amin and amax and to frames passed to
+        accumulators in accumulate and the histogram methods.  All frames
+        must have the same photon conversion factor.  Floating raw data
+        are rounded to integers, which makes integer processing suitable
+        only for integer-valued detector data.  Integer types must be
+        signed and at least 32 bits wide so that background subtraction
+        and binning do not wrap around.
+
+        No return value.  Assign cdtype.  Raise ValueError for unsigned
+        or narrower integer types.
+        """
+        dt = None if dtype is None else numpy.dtype(dtype)
+        if dt is not None and numpy.issubdtype(dt, numpy.integer) and (
+                numpy.issubdtype(dt, numpy.unsignedinteger) or
+                dt.itemsize < 4):
+            emsg = ("Integer compute type must be signed with at least "
+                    "32 bits, got {}.").format(dt)
+            raise ValueError(emsg)
+        self.cdtype = dt
+        return
+
+
+    def setBinning(self, factor):
+        """Set pixel binning of the processed image arrays.
+
+        factor   -- integer or a tuple of (rows, columns) factors.
+                    Blocks of processed pixels are summed into one
+                    binned pixel, so that binned values are still photon
+                    counts.  Trailing pixels that do not fill a whole
+                    block are dropped.  Use 1 to turn-off binning.
+
+        Binning is applied after background subtraction and thresholds
+        and before any accumulation, so that all reductions and
+        histograms use the binned frames.
+
+        No return value.  Assign cbinning.
+        """
+        from py15sacla.binning import binnedShape
+        binnedShape((0, 0), factor)
+        self.cbinning = factor
+        return
+
+
+    def setWeights(self, weights):
+        """Set per-frame weights of the reductions.
+
+        weights  -- array of the same size as the selection, a pattern
+                    of an event dataset in the HDF file or a list of
+                    patterns whose datasets are summed.  Cached frames
+                    read the events from the source file of the cache.
+                    Use None to turn-off weighting.
+
+        Weighted sum, total and histograms add frames multiplied by
+        their weights and mean gives sum(w * frame) / sum(w).  The frames
+        from generate and toarray are not weighted.
+
+        No return value.  Assign cweights.
+        """
+        self.cweights = self._frameValues(weights)
+        return
+
+
+    def setNormalizer(self, normalizer):
+        """Set per-frame normalization of the reductions.
+
+        normalizer   -- array of the same size as the selection or event
+                    dataset patterns as in setWeights, for example,
+                    ('user_4', 'user_5') for I0.  Use None to turn-off
+                    normalization.
+
+        The reductions use frames divided by their normalizer, which is
+        applied as a per-frame factor inside the accumulation.  The
+        per-frame results of atotal, amin and amax are divided as well.
+        Frames with zero or non-finite normalizer get zero weight.
+        Use setWeights(I0) together with setNormalizer(I0) for the mean
+        sum(frame) / sum(I0).
+
+        No return value.  Assign cnormalizer.
+        """
+        self.cnormalizer = self._frameValues(normalizer)
+        return
+
+
     def setHistBins(self, lo, hi, bins):
         """Configure bins for the histogram of the processed image arrays.
 
@@ -142,59 +314,227 @@ class CCDFrames(object):
         start    -- start generating from that data frame if nonzero.
 
         The iterator returns normalized, background-subtracted, thresholded
-        arrays.
+        arrays, which are binned according to cbinning.  Stage timings are
+        recorded when called in a profile context.
         """
+        from py15sacla.profiling import active
+        return self._generate(start, active())
+
+
+    def _generate(self, start, prof, sketch=False):
+        """Generate processed frames, see generate.
+
+        prof     -- ProfileStats for recording the stage timings or None.
+        sketch   -- flag for collecting QuantileSketch of the values in
+                    a complete pass, which is then returned by sketch.
+        """
+        import copy
+        import time
         import itertools
-        from py15sacla.utils import getDetectorConfig
+        from py15sacla.binning import binFrame
+        from py15sacla.sketches import QuantileSketch
         # create iterator that returns background arrays
         ibg = itertools.repeat(self.cbackground)
         if isinstance(self.cbackground, CCDFrames):
             nbg = len(self.cbackground.selection)
             if nbg != len(self.selection):
                 raise ValueError("Incompatible length of background frames.")
-            ibg = self.cbackground.generate()
-        idd = iter(self.selection)
-        if start:
-            next(itertools.islice(ibg, start, start), None)
-            next(itertools.islice(idd, start, start), None)
-        for dd in idd:
-            # ROI
-            rv = dd[self.croislice]
-            # convert to photon counts if requested
-            cfg = getDetectorConfig(dd)
-            if self.cnormalize:
-                rv *= cfg['tophotons']
-            # background
-            bg = ibg.next()
-            if numpy.shape(bg) == dd.shape:
-                bg = bg[self.croislice]
-            rv -= bg
-            # threshold
-            lo, hi = self.cthreshold
-            if lo is not None:
-                rv[rv < lo] = 0
-            if hi is not None:
-                rv[rv > hi] = 0
-            yield rv
+            bgccd = self.cbackground
+            if self._isADU() and bgccd._isADU():
+                # background frames are subtracted in photon counts
+                bgccd = copy.copy(bgccd)
+                bgccd.cdtype = None
+            # background is timed as a single stage
+            ibg = bgccd._generate(start, None)
+        iraw = self._rawFrames(start, prof)
+        # time in next(iraw) is recorded by the iterator unless prefetched
+        waitstage = 'wait' if self.cprefetch > 0 else None
+        sketch = QuantileSketch() if sketch and not start else None
+        lohi = None
+        adu = self._isADU()
+        scale = None
+        bgcache = (None, None)
+        t = prof and time.perf_counter()
+        try:
+            for name, shape, cfg, data in iraw:
+                if prof is not None:
+                    t = (prof.lap(waitstage, t) if waitstage
+                            else time.perf_counter())
+                ctype = self._computeType(data.dtype)
+                factor = cfg['tophotons'] if self.cnormalize else 1.0
+                # copy out of the read buffer, convert to photon counts
+                # if requested
+                if adu and numpy.issubdtype(data.dtype, numpy.floating):
+                    rv = numpy.rint(data).astype(ctype)
+                elif adu:
+                    rv = data.astype(ctype)
+                elif self.cnormalize:
+                    rv = numpy.multiply(data, factor, dtype=ctype)
+                else:
+                    rv = data.astype(ctype)
+                if prof is not None:
+                    t = prof.lap('convert', t)
+                    prof.count('frames')
+                    prof.count('bytes', data.nbytes)
+                # background
+                bg = next(ibg)
+                if numpy.shape(bg) == shape:
+                    bg = bg[self.croislice]
+                # threshold bounds are cropped to ROI only once
+                if lohi is None:
+                    scale = factor
+                    lohi = [self._cropToROI(b, shape)
+                            for b in self.cthreshold]
+                    if adu:
+                        lohi = [b if b is None else numpy.divide(b, scale)
+                                for b in lohi]
+                if adu:
+                    if factor != scale:
+                        emsg = ("Integer processing requires the same "
+                                "photon conversion for all frames.")
+                        raise ValueError(emsg)
+                    if bgcache[0] is not bg:
+                        bgadu = numpy.rint(numpy.divide(bg, scale))
+                        bgcache = (bg, bgadu.astype(ctype))
+                    elif prof is not None:
+                        prof.count('background cache hits')
+                    bg = bgcache[1]
+                rv -= bg
+                if prof is not None:
+                    t = prof.lap('background', t)
+                lo, hi = lohi
+                if lo is not None:
+                    rv[rv < lo] = 0
+                if hi is not None:
+                    rv[rv > hi] = 0
+                if prof is not None:
+                    t = prof.lap('threshold', t)
+                if self.cbinning != 1:
+                    rv = binFrame(rv, self.cbinning)
+                    if prof is not None:
+                        t = prof.lap('binning', t)
+                if sketch is not None:
+                    sketch.update(rv)
+                    if prof is not None:
+                        t = prof.lap('sketch', t)
+                yield rv
+                if prof is not None:
+                    t = prof.lap('reduce', t)
+        finally:
+            if hasattr(iraw, 'close'):
+                iraw.close()
+        if sketch is not None:
+            if adu and scale is not None and scale != 1:
+                sketch.scale(scale)
+            self._sketched = (self._sketchSignature(), sketch)
         pass
 
 
-    def toarray(self, index):
+    def sketch(self, nframes=None):
+        """Return QuantileSketch of the values in processed image data.
+
+        nframes  -- optional number of evenly spaced frames to be sampled.
+                    Use all frames when None.
+
+        The sketch from the last call is reused when the configuration
+        has not changed since.  Otherwise this needs one pass over all or
+        nframes sampled frames, which is not shared with other methods.
+
+        Return QuantileSketch object.
+        """
+        from py15sacla.profiling import active
+        signature, rv = self._sketched
+        if signature is not None and all(a is b for a, b in
+                zip(signature, self._sketchSignature())):
+            if active() is not None:
+                active().count('sketch cache hits')
+            return rv
+        nsel = len(self.selection)
+        ccd = self
+        if nframes is not None and nframes < nsel:
+            indices = numpy.linspace(0, nsel - 1, nframes).round()
+            ccd = self._subset(numpy.unique(indices.astype(int)))
+        for aa in ccd._generate(0, active(), True):
+            pass
+        rv = ccd._sketched[1]
+        return rv
+
+
+    def cached(self, path):
+        """Return a copy of this object that reads raw frames from a cache.
+
+        path     -- path to the ".npy" file of a memory-mapped frame cache.
+                    The cache is written from the selected frames when
+                    it does not exist or is out of date.
+
+        The copy keeps the processing configuration of this object
+        except for cprefetch, which is 0 because the frames are read in
+        place from the memory map.  CCDFrames background is not cached.
+
+        Return CCDFrames object.
+        """
+        import copy
+        from py15sacla.framecache import FrameCache
+        from py15sacla.framecache import exportFrameCache, isCacheCurrent
+        if isCacheCurrent(path, self.selection):
+            fc = FrameCache(path)
+        else:
+            fc = exportFrameCache(self.selection, path)
+        rv = copy.copy(self)
+        rv.selection = HDFSelection(fc)
+        rv.cprefetch = 0
+        return rv
+
+
+    def profile(self, stats=None):
+        """Return context manager that records a timing breakdown.
+
+        stats    -- optional ProfileStats to be updated.  Use a new
+                    ProfileStats when None.
+
+        All HDFSelection and CCDFrames operations in the with block
+        record their stage timings, number of frames, bytes read and
+        cache hits to the ProfileStats of the context, for example
+
+            with ccd.profile() as stats:
+                ccd.mean()
+            print(stats)
+
+        Return context manager from profiling.profile.
+        """
+        from py15sacla.profiling import profile
+        return profile(stats)
+
+
+    def toarray(self, index, lazy=False, chunksize=64):
         """Return NumPy array of processed image data.
 
         index    -- integer, slice, array of boolean flags, or
                     other index type accepted in numpy arrays.
+        lazy     -- when True, return LazyFrameStack that processes
+                    the frames on demand in chunks of chunksize frames.
+                    The lazy stack is 3D also for a scalar index.
+
+        The arrays are of cdtype when set and of float otherwise.
+        Integer cdtype gives values in raw detector units.
 
         Return 2D array for scalar index.  Return 3D array if
         index is a range.
         """
-        from py15sacla.utils import unique_ordered
+        import copy
+        from py15sacla.groupstats import unique_ordered
         nsel = len(self.selection)
         indices = numpy.arange(nsel)[index]
         indices = unique_ordered(indices.reshape(-1))
-        rv = numpy.empty(0, dtype=float)
+        if lazy:
+            from py15sacla.lazystack import LazyFrameStack
+            return LazyFrameStack(self, indices, chunksize)
+        # single frames are read without read-ahead
+        ccd = copy.copy(self)
+        ccd.cprefetch = 0
+        rv = numpy.empty(0, dtype=self.cdtype or float)
         for i, idx in enumerate(indices):
-            aa = self.generate(start=idx).next()
+            aa = next(ccd.generate(start=idx))
             if not rv.size:
                 rv.resize(len(indices), *aa.shape)
             rv[i] = aa
@@ -203,7 +543,8 @@ class CCDFrames(object):
         return rv
 
 
-    def compress(self, keys, method, bgmap=None):
+    def compress(self, keys, method, bgmap=None, bgframes=None,
+            bgkeys=None):
         '''Compress processed image frames at the repeated keys.
 
         keys     -- iterable collection of the same size as the selection.
@@ -215,89 +556,462 @@ class CCDFrames(object):
         bgmap    -- dictionary that maps each key to a background array.
                     May be also a tuple of (keyvalues, bgarrays) which is
                     converted to a dictionary.
-
-        Return a tuple of (unique_keys, compressed_images).
+        bgframes -- CCDFrames of background images, which are averaged
+                    per each key of bgkeys and subtracted from the frames
+                    of the same key.  The background is processed with
+                    the ROI and binning of this object.  Cannot be used
+                    together with bgmap.
+        bgkeys   -- iterable collection of the same size as the bgframes
+                    selection.  It must contain all values of keys.
+
+        The per-key background of bgmap or bgframes replaces cbackground
+        of this object.  For string method, no threshold and no frame
+        weights the background and signal frames are reduced per key in
+        a single pass over both files and the background is subtracted
+        from the per-key results at the end.  Otherwise the per-key
+        background means are computed first and used as bgmap.
+
+        Return a tuple of (unique_keys, compressed_images).  Raise
+        ValueError if bgframes has no frames for some of the keys.
         '''
-        from py15sacla.utils import unique_ordered
+        from py15sacla.groupstats import unique_ordered
         fzip = method
-        if isinstance(method, basestring):
+        if isinstance(method, str):
             assert method in 'mean sum total'.split()
             fzip = getattr(CCDFrames, method)
+        ukeys = unique_ordered(keys)
+        if bgframes is not None:
+            if bgmap is not None:
+                emsg = "bgmap and bgframes cannot be used together."
+                raise ValueError(emsg)
+            linear = (all(b is None for b in self.cthreshold) and
+                      not self._hasFrameWeights())
+            if isinstance(method, str) and linear:
+                return self._compressWithBackground(keys, method,
+                        bgframes, bgkeys)
+            # background is subtracted from the unbinned frames
+            bgccd = self._matchedBackground(bgframes)
+            bgccd.cbinning = 1
+            bgmap = bgccd._keyedSums([], bgkeys)[1]
+            self._checkBackgroundKeys(ukeys, bgmap)
+            for x, (n, a) in bgmap.items():
+                bgmap[x] = a / n
         ccdgroups = self.groupby(keys)
         if bgmap is not None:
             if isinstance(bgmap, tuple) and 2 == len(bgmap):
                 bgmap = dict(zip(*bgmap))
-            for ccd, x in zip(ccdgroups, unique_ordered(keys)):
+            for ccd, x in zip(ccdgroups, ukeys):
                 ccd.setBackground(bgmap[x])
-        ukeys = unique_ordered(keys)
         zipped = numpy.array([fzip(ccd) for ccd in ccdgroups])
         return (ukeys, zipped)
 
 
-    def sum(self):
-        "Return sum of the processed image data as a 2D array."
-        return sum(self.generate())
+    def _compressWithBackground(self, keys, method, bgframes, bgkeys):
+        """Single-pass compress with per-key background, see compress.
+
+        Return a tuple of (unique_keys, compressed_images).
+        """
+        import copy
+        from py15sacla.groupstats import unique_ordered
+        bgccd = self._matchedBackground(bgframes)
+        ukeys = unique_ordered(keys)
+        # per-key background replaces the background of this object
+        sig = copy.copy(self)
+        sig.cbackground = 0
+        sums, bgsums = sig._keyedSums(keys, bgkeys, bgccd)
+        self._checkBackgroundKeys(ukeys, bgsums)
+        scale = self._photonScale() if self._isADU() else 1.0
+        rv = []
+        for x in ukeys:
+            n, a = sums[x]
+            nbg, abg = bgsums[x]
+            a = a * scale - abg * (float(n) / nbg)
+            if method == 'mean':
+                a = a / n
+            elif method == 'total':
+                a = a.sum()
+            rv.append(a)
+        zipped = numpy.array(rv)
+        return (ukeys, zipped)
+
+
+    def _matchedBackground(self, bgframes):
+        """Return copy of background CCDFrames processed like this object.
+
+        The copy has the ROI and binning of this object, no frame
+        weights and returns floating frames in the same units.
+        """
+        import copy
+        rv = copy.copy(bgframes)
+        rv.croislice = self.croislice
+        rv.cbinning = self.cbinning
+        rv.cnormalize = self.cnormalize
+        rv.cweights = rv.cnormalizer = None
+        if rv._isADU():
+            rv.cdtype = None
+        return rv
+
+
+    def _keyedSums(self, keys, bgkeys, bgccd=None):
+        """Sum processed frames per key in one pass over both sources.
+
+        keys     -- keys of the frames in this object.
+        bgkeys   -- keys of the frames in bgccd or of this object when
+                    bgccd is None.
+        bgccd    -- CCDFrames of the background frames.  The frames of
+                    both objects are read concurrently and alternately.
+
+        Return a pair of dictionaries that map keys to (count, sum)
+        of this object and of the background.  Only the second dictionary
+        is filled when bgccd is None.
+        """
+        import itertools
+        if bgccd is None:
+            bgccd, keys = self, []
+        keys, bgkeys = list(keys), list(bgkeys)
+        if len(keys) not in (0, len(self.selection)):
+            emsg = "keys must be of the same length as the selection."
+            raise ValueError(emsg)
+        if len(bgkeys) != len(bgccd.selection):
+            emsg = "bgkeys must be of the same length as the background."
+            raise ValueError(emsg)
+        acctypes = [numpy.int64 if ccd._isADU() else numpy.float64
+                    for ccd in (self, bgccd)]
+        frames = self.generate() if keys else iter(())
+        bgframes = bgccd.generate()
+        rv = ({}, {})
+        try:
+            for fb in itertools.zip_longest(zip(keys, frames),
+                    zip(bgkeys, bgframes)):
+                for kf, sums, acctype in zip(fb, rv, acctypes):
+                    if kf is None:
+                        continue
+                    x, a = kf
+                    if x in sums:
+                        n, s = sums[x]
+                        s += a
+                        sums[x] = (n + 1, s)
+                    else:
+                        sums[x] = (1, a.astype(acctype))
+        finally:
+            for it in (frames, bgframes):
+                if hasattr(it, 'close'):
+                    it.close()
+        return rv
+
+
+    @staticmethod
+    def _checkBackgroundKeys(keys, bgsums):
+        """Raise ValueError if some keys have no background frames.
+        """
+        for x in keys:
+            if x not in bgsums:
+                emsg = "No background frames for key {!r}.".format(x)
+                raise ValueError(emsg)
+        return
+
+
+    def accumulate(self, acc, callback=None, interval=1.0, stop=None,
+            keys=None):
+        """Update accumulator with processed frames and report progress.
+
+        acc      -- accumulator with an update method for single frames,
+                    e.g., MeanVarianceAccumulator or HistogramAccumulator.
+        callback -- optional function called with a Progress snapshot
+                    at least every interval seconds and at the end.
+        interval -- minimum time in seconds between the callback calls.
+        stop     -- optional stop criterion, a function of Progress
+                    that ends the reduction when it returns True.  It is
+                    checked at the callback times.
+        keys     -- optional iterable of the same size as the selection,
+                    which is passed to acc.update with each frame.
+
+        When cweights or cnormalizer are set, acc.update is also called
+        with the weight and scale keyword arguments of the frame, where
+        scale is the inverse of the normalizer.
+
+        Return Progress of the completed or stopped reduction.
+        """
+        from py15sacla.progress import Progress
+        rv = Progress(acc, len(self.selection))
+        ikeys = iter(keys) if keys is not None else None
+        scale = self._photonScale() if self._isADU() else None
+        weights, factors = self._frameWeights()
+        kw = {}
+        frames = self.generate()
+        try:
+            for i, aa in enumerate(frames):
+                if scale is not None:
+                    aa = aa * scale
+                if weights is not None:
+                    kw = dict(weight=weights[i], scale=factors[i])
+                if ikeys is None:
+                    acc.update(aa, **kw)
+                else:
+                    acc.update(aa, next(ikeys), **kw)
+                if not rv.tick(interval):
+                    continue
+                if callback is not None:
+                    callback(rv)
+                if stop is not None and stop(rv):
+                    rv.stopped = True
+                    break
+        finally:
+            frames.close()
+        if callback is not None and not rv.isreported():
+            callback(rv)
+        return rv
+
+
+    def sum(self, callback=None, interval=1.0, stop=None):
+        """Return sum of the processed image data as a 2D array.
+
+        callback, interval, stop -- optional progress reports and early
+                    stop criterion, see accumulate.  When stopped early,
+                    return sum of the processed frames only.
+        """
+        weighted = self._hasFrameWeights()
+        if callback is None and stop is None and weighted:
+            return self._weightedSum()
+        if callback is None and stop is None and self.cdtype is None:
+            return sum(self.generate())
+        if callback is None and stop is None:
+            acctype = numpy.int64 if self._isADU() else numpy.float64
+            rv = sum(self.generate(), numpy.zeros((), dtype=acctype))
+            if self._isADU():
+                rv = rv * self._photonScale()
+            return rv
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        acc = self.accumulate(MeanVarianceAccumulator(),
+                callback, interval, stop).acc
+        rv = acc.mean * acc.weight if acc.count else 0
+        return rv
 
 
     def total(self):
         "Return sum of all values from the processed image frames."
-        psums = map(lambda aa: aa.sum(), self.generate())
-        return sum(psums)
+        weights, factors = self._frameWeights()
+        if weights is None:
+            rv = sum(aa.sum() for aa in self.generate())
+        else:
+            wf = weights * factors
+            rv = sum(aa.sum() * f for aa, f in zip(self.generate(), wf))
+        if self._isADU():
+            rv = rv * self._photonScale()
+        return rv
 
 
-    def mean(self):
+    def mean(self, callback=None, interval=1.0, stop=None):
         """Return average corrected frame as a 2D array.
+
+        callback, interval, stop -- optional progress reports and early
+                    stop criterion, see accumulate.  The progress acc is
+                    MeanVarianceAccumulator, so that stop can be, e.g.,
+                    progress.relativeErrorBelow.  When stopped early,
+                    return average of the processed frames.
         """
-        return self.sum() / max(1, len(self.selection))
+        weights = self._frameWeights()[0]
+        if callback is None and stop is None and weights is not None:
+            return self.sum() / (weights.sum() or 1.0)
+        if callback is None and stop is None:
+            return self.sum() / max(1, len(self.selection))
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        acc = self.accumulate(MeanVarianceAccumulator(),
+                callback, interval, stop).acc
+        rv = acc.mean if acc.count else 0.0
+        return rv
+
+
+    async def meanAsync(self, batchsize=16, interval=1.0, callback=None):
+        """Asynchronous variant of mean for use in an event loop.
+
+        Frames are processed on a worker thread in batches of batchsize.
+        callback(nframes, mean) is called with partial results at least
+        every interval seconds.  See asyncframes.meanAsync.
+
+        Return average corrected frame as a 2D array.
+        """
+        from py15sacla import asyncframes
+        rv = await asyncframes.meanAsync(self, batchsize, interval, callback)
+        return rv
 
 
     def atotal(self):
         "Return array of totals from all pixels per each processed frame."
-        psums = map(lambda aa: aa.sum(), self.generate())
-        return numpy.array(psums)
+        rv = numpy.array([aa.sum() for aa in self.generate()])
+        return self._normalized(self._toPhotons(rv))
 
 
     def amin(self):
         """Return array of minimum values per each processed frame.
         """
         rv = numpy.array([aa.min() for aa in self.generate()])
-        return rv
+        return self._normalized(self._toPhotons(rv))
 
 
     def amax(self):
         """Return array of maximum values per each processed frame.
         """
         rv = numpy.array([aa.max() for aa in self.generate()])
-        return rv
+        return self._normalized(self._toPhotons(rv))
+
+
+    def histograms(self, specs=(), keys=None, perframe=False,
+            callback=None, interval=1.0, stop=None):
+        """Accumulate histograms of the processed frames in a single pass.
+
+        specs    -- list of (lobound, hibound, bins) tuples for the bins.
+                    Use (None, None, bins) for automatic range.  When empty,
+                    use chistbins or automatic range with at most 50 bins.
+        keys     -- optional iterable of the same size as the selection.
+                    When specified, accumulate also histograms per each key.
+        perframe -- flag for keeping histogram counts of every frame.
+        callback, interval, stop -- optional progress reports and early
+                    stop criterion, see accumulate.
+
+        Return HistogramAccumulator object.
+        """
+        from py15sacla.histogram import HistogramAccumulator
+        if not specs:
+            specs = [self.chistbins or (None, None, 50)]
+        acc = HistogramAccumulator(specs, perframe=perframe)
+        self.accumulate(acc, callback, interval, stop, keys=keys)
+        return acc
+
+
+    def features(self, rois=None, batchsize=64):
+        """Extract a table of per-shot features in a single pass.
+
+        rois     -- optional dictionary of named regions for ROI sums,
+                    see FeatureAccumulator.  The regions and positions
+                    refer to the processed frames.
+        batchsize -- number of frames evaluated together as a 3D block.
+
+        The values are in photons and divided by cnormalizer when set.
+
+        Return FeatureAccumulator with tags of the frames.  Use its
+        table method for the per-shot columns.
+        """
+        from py15sacla.features import FeatureAccumulator, frameTags
+        acc = FeatureAccumulator(rois)
+        acc.tags = frameTags(self.selection)
+        scale = self._photonScale() if self._isADU() else 1.0
+        factors = self._frameWeights()[1]
+        block = None
+        n = lo = 0
+        for aa in self.generate():
+            if block is None:
+                block = numpy.empty((batchsize,) + aa.shape, aa.dtype)
+            block[n] = aa
+            n += 1
+            if n < batchsize:
+                continue
+            s = scale if factors is None else scale * factors[lo:lo + n]
+            acc.update(block[:n], scale=s)
+            lo += n
+            n = 0
+        if n:
+            s = scale if factors is None else scale * factors[lo:lo + n]
+            acc.update(block[:n], scale=s)
+        return acc
+
+
+    def pumpProbe(self, laser, delays=None, callback=None, interval=1.0,
+            stop=None):
+        """Accumulate laser-on and laser-off frames in a single pass.
+
+        laser    -- iterable of the same size as the selection, nonzero
+                    for the shots with the pump laser on.
+        delays   -- optional iterable of the same size as the selection,
+                    e.g., opt_delay or its bins.  All frames belong to
+                    a single delay of None when not specified.
+        callback, interval, stop -- optional progress reports and early
+                    stop criterion, see accumulate.
+
+        Return PumpProbeAccumulator, see its difference method for
+        the difference images and their errors.
+        """
+        from py15sacla.pumpprobe import PumpProbeAccumulator
+        laser = [bool(x) for x in laser]
+        nsel = len(self.selection)
+        delays = [None] * nsel if delays is None else list(delays)
+        if not len(laser) == len(delays) == nsel:
+            emsg = "laser and delays must be of the same size as selection."
+            raise ValueError(emsg)
+        acc = PumpProbeAccumulator()
+        self.accumulate(acc, callback, interval, stop,
+                keys=zip(delays, laser))
+        return acc
+
+
+    def integrate(self, bins, keys=None, perframe=False, callback=None,
+            interval=1.0, stop=None):
+        """Accumulate 1D profiles of the processed frames in a single pass.
+
+        bins     -- ProfileBins lookup of the processed frame shape, e.g.,
+                    from integration.radialBins or integration.axisBins.
+        keys     -- optional iterable of the same size as the selection.
+                    When specified, accumulate also mean profiles per key.
+        perframe -- flag for keeping the profile of every frame.
+        callback, interval, stop -- optional progress reports and early
+                    stop criterion, see accumulate.
+
+        Return ProfileAccumulator object.
+        """
+        from py15sacla.integration import ProfileAccumulator
+        acc = ProfileAccumulator(bins, perframe=perframe)
+        self.accumulate(acc, callback, interval, stop, keys=keys)
+        return acc
 
 
     def ahistogram(self):
         """Get histogram counts per each processed CCD frame as a 2D array.
 
-        Use setHistBins to configure histogram bins.  Bin edges and centers
-        are available in self.hedges and self.hcenters.
+        Use setHistBins to configure histogram bins.  When not set, the
+        bins are selected automatically in the same pass and assigned to
+        chistbins.  Bin edges and centers are available in self.hedges
+        and self.hcenters.
 
         Return a 2D array of histogram counts per each frame.
         """
-        import functools
-        from py15sacla.utils import eqbinhistogram
-        self._ensureHistBinsExist()
-        lo, hi, bins = self.chistbins
-        fnc = functools.partial(eqbinhistogram, bins=bins, range=(lo, hi))
-        histcounts = map(fnc, self.generate())
-        rv = numpy.array([c for c, e in histcounts])
+        acc = self.histograms(perframe=True)
+        self._assignAutoHistBins(acc)
+        rv = acc.framecounts()
         return rv
 
 
-    def histogram(self):
+    def histogram(self, callback=None, interval=1.0, stop=None):
         """Return histogram counts of all processed frames.
 
-        Use setHistBins to configure histogram bins.  Bin edges and centers
-        are available in self.hedges and self.hcenters.
+        Use setHistBins to configure histogram bins.  When not set, the
+        bins are selected automatically in the same pass and assigned to
+        chistbins.  Bin edges and centers are available in self.hedges
+        and self.hcenters.
+
+        callback, interval, stop -- optional progress reports and early
+                    stop criterion, see accumulate.
 
         Return a simple array of bin counts.
         """
-        rv = self.ahistogram().sum(axis=0)
+        acc = self.histograms(callback=callback, interval=interval,
+                stop=stop)
+        self._assignAutoHistBins(acc)
+        rv = acc.counts()
+        return rv
+
+
+    async def histogramAsync(self, batchsize=16, interval=1.0,
+            callback=None):
+        """Asynchronous variant of histogram for use in an event loop.
+
+        callback(nframes, acc) is called with partial HistogramAccumulator
+        at least every interval seconds.  See asyncframes.histogramAsync.
+
+        Return a simple array of bin counts.
+        """
+        from py15sacla import asyncframes
+        rv = await asyncframes.histogramAsync(self, batchsize, interval,
+                callback)
         return rv
 
     # properties
@@ -324,11 +1038,240 @@ class CCDFrames(object):
 
     # helper methods
 
+    def _assignAutoHistBins(self, acc):
+        """Set histogram bins from automatic range of an accumulator.
+        """
+        if not self.chistbins and acc.nframes:
+            self.setHistBins(*acc.range())
+        return
+
+
     def _ensureHistBinsExist(self):
         """Set default histogram bins if they were not yet configured.
+
+        The bins are the same as automatic bins of histogram.
         """
+        from py15sacla.histogram import autoBins
         if not self.chistbins:
-            self.setHistBins(min(self.amin()), max(self.amax()), 50)
+            sk = self.sketch()
+            self.setHistBins(*autoBins(sk.vmin, sk.vmax, 50))
         return
 
+
+    def _cropToROI(self, a, shape):
+        """Crop per-pixel array of the full image shape to croislice.
+
+        a        -- scalar, None or an array.
+        shape    -- shape of the full image.
+
+        Return a cropped contiguous array if a has the full image shape.
+        Return a unchanged otherwise.
+        """
+        if a is not None and numpy.shape(a) == shape:
+            a = numpy.ascontiguousarray(numpy.asarray(a)[self.croislice])
+        return a
+
+
+    def _sketchSignature(self):
+        """Return tuple of configuration items that affect processed data.
+
+        The items are compared by identity to decide if a cached sketch
+        is still valid.
+        """
+        rv = (self.selection._datanames, self.cnormalize,
+                self.croislice, self.cbackground, self.cthreshold,
+                self.cdtype, self.cbinning)
+        return rv
+
+
+    def _computeType(self, rawtype):
+        "Return dtype of processed frames for raw data of rawtype."
+        if self.cdtype is not None:
+            return self.cdtype
+        if numpy.issubdtype(rawtype, numpy.floating):
+            return numpy.dtype(rawtype)
+        return numpy.dtype(float)
+
+
+    def _isADU(self):
+        "Return True when frames are processed in integer raw units."
+        return (self.cdtype is not None and
+                numpy.issubdtype(self.cdtype, numpy.integer))
+
+
+    def _photonScale(self):
+        "Return factor that converts processed ADU values to photons."
+        from py15sacla.utils import getDetectorConfig
+        if not (self.cnormalize and len(self.selection)):
+            return 1.0
+        return getDetectorConfig(self.selection[0])['tophotons']
+
+
+    def _toPhotons(self, a):
+        "Convert array of per-frame ADU results to photons if needed."
+        if not self._isADU():
+            return a
+        return a * self._photonScale()
+
+
+    def _hasFrameWeights(self):
+        "Return True when cweights or cnormalizer are set."
+        return not (self.cweights is None and self.cnormalizer is None)
+
+
+    def _frameWeights(self):
+        """Return per-frame weights and normalization factors.
+
+        Frames with zero or non-finite normalizer have zero weight.
+
+        Return a tuple of (weights, factors) of float arrays or
+        (None, None) when the reductions are not weighted.
+        """
+        if not self._hasFrameWeights():
+            return (None, None)
+        nsel = len(self.selection)
+        weights = numpy.ones(nsel)
+        if self.cweights is not None:
+            weights[:] = self.cweights
+        factors = numpy.ones(nsel)
+        if self.cnormalizer is not None:
+            norm = self.cnormalizer
+            good = numpy.isfinite(norm) & (norm != 0)
+            factors[good] = 1.0 / norm[good]
+            factors[~good] = 0.0
+            weights[~good] = 0.0
+        return (weights, factors)
+
+
+    def _weightedSum(self):
+        """Return weighted sum of processed frames, see sum.
+
+        Floating frames are scaled in place, so that no scaled copies
+        are made.
+        """
+        weights, factors = self._frameWeights()
+        rv = None
+        for aa, f in zip(self.generate(), weights * factors):
+            if aa.dtype.kind == 'f':
+                aa *= f
+            else:
+                aa = aa * f
+            if rv is None:
+                rv = aa.astype(float)
+            else:
+                rv += aa
+        if rv is None:
+            return 0
+        if self._isADU():
+            rv = rv * self._photonScale()
+        return rv
+
+
+    def _normalized(self, a):
+        "Divide array of per-frame results by cnormalizer if set."
+        if self.cnormalizer is None:
+            return a
+        factors = self._frameWeights()[1]
+        return a * factors
+
+
+    def _frameValues(self, values):
+        """Return per-frame array for setWeights or setNormalizer.
+
+        values   -- None, array of the selection size or patterns of
+                    event datasets, which are read from the HDF file
+                    and summed.  Frames from a FrameCache read the event
+                    data from the source file of the cache.
+
+        Return float array or None.  Raise ValueError for values
+        of incompatible size or for patterns without data.
+        """
+        from py15sacla.framecache import FrameCache
+        if values is None:
+            return None
+        if isinstance(values, str):
+            values = [values]
+        if all(isinstance(v, str) for v in values):
+            iscached = isinstance(self.hdffile, FrameCache)
+            run_info = HDFSelection(self.hdffile.source if iscached
+                    else self.hdffile)
+            try:
+                columns = []
+                for pattern in values:
+                    sel = run_info[pattern]
+                    if not len(sel):
+                        emsg = "No event data matching {!r}.".format(
+                                pattern)
+                        raise ValueError(emsg)
+                    columns.append(sel[0][:])
+            finally:
+                if iscached:
+                    run_info.hdffile.close()
+            values = sum(columns)
+        rv = numpy.array(values, dtype=float)
+        if rv.shape != (len(self.selection),):
+            emsg = "Per-frame values must match the selection size."
+            raise ValueError(emsg)
+        return rv
+
+
+    def _subsetFrameWeights(self, src, indices):
+        "Copy cweights and cnormalizer of src at indices."
+        for name in ('cweights', 'cnormalizer'):
+            a = getattr(src, name)
+            if a is not None:
+                setattr(self, name, a[indices])
+        return
+
+
+    def _rawFrames(self, start, prof=None):
+        """Return iterator over raw frames in the region of interest.
+
+        start    -- index of the first frame.
+        prof     -- optional ProfileStats for timing the reads.
+
+        The iterator returns (name, shape, config, data) tuples as
+        FramePrefetcher.  The frames are read ahead when cprefetch is
+        positive.
+        """
+        from py15sacla.prefetch import FramePrefetcher
+        if self.cprefetch > 0:
+            return FramePrefetcher(self.selection, self.croislice,
+                    depth=self.cprefetch, start=start, prof=prof)
+        return self._readFrames(start, prof)
+
+
+    def _readFrames(self, start, prof):
+        "Generate raw frame tuples of _rawFrames in the calling thread."
+        import time
+        from py15sacla.utils import getDetectorConfig
+        for dd in self.selection[start:]:
+            t = prof and time.perf_counter()
+            data = dd[self.croislice]
+            if prof is not None:
+                t = prof.lap('read', t)
+            cfg = getDetectorConfig(dd)
+            if prof is not None:
+                prof.lap('config', t)
+            yield (dd.name, dd.shape, cfg, data)
+        pass
+
+
+    def _subset(self, indices):
+        """Return a copy of this object restricted to selected frames.
+
+        indices  -- integer indices of the frames to keep.  When
+                    cbackground is of a CCDFrames type, it is subset
+                    accordingly.
+
+        Return CCDFrames object.
+        """
+        import copy
+        rv = copy.copy(self)
+        rv.selection = self.selection[indices]
+        rv._subsetFrameWeights(self, indices)
+        if isinstance(self.cbackground, CCDFrames):
+            rv.cbackground = self.cbackground._subset(indices)
+        return rv
+
 # End of class CCDFrames
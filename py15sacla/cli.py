@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+'''Command-line interface of the py15sacla package.
+
+Usage: py15sacla compress [options] RUNS...
+       py15sacla store [options] STORE FILES...
+       py15sacla metrics [options] FILES...
+
+Use "py15sacla COMMAND --help" for the command options.
+'''
+
+import sys
+
+
+def main(argv=None):
+    '''Run the py15sacla command.
+
+    argv -- list of command-line arguments without the program name.
+            Use sys.argv[1:] when None.
+
+    Return exit status of the command.
+    '''
+    parser = _buildParser()
+    args = parser.parse_args(argv)
+    if not hasattr(args, 'command'):
+        parser.print_help()
+        return 2
+    return args.command(args)
+
+
+def cmdCompress(args):
+    "Compress detector images and event data for a list of runs."
+    from py15sacla import batch
+    runs = batch.parseRunList(args.runs)
+    if not runs:
+        print("No runs to process.", file=sys.stderr)
+        return 2
+    if args.emit_jobarray:
+        passargs = ['--input=' + args.input, '--output=' + args.output,
+                '--threshold={},{}'.format(*args.threshold),
+                '--logdir=' + args.logdir, '--retries={}'.format(args.retries),
+                '--compression=' + args.compression,
+                '--background=' + args.background]
+        if args.metrics:
+            passargs.append('--metrics=' + args.metrics)
+        script = batch.jobArrayScript(runs, passargs)
+        with open(args.emit_jobarray, 'w') as fp:
+            fp.write(script)
+        print("Wrote job array for {} runs to {}".format(
+            len(runs), args.emit_jobarray))
+        return 0
+    options = dict(infile=args.input, outfile=args.output,
+            background=args.background or None, threshold=args.threshold,
+            compression=_compressionFilter(args.compression))
+    metricsfile = _metricsFile(args)
+    if args.chunksize:
+        from py15sacla.scheduler import runChunked
+        results = runChunked(runs, jobs=args.jobs, chunksize=args.chunksize,
+                retries=args.retries, logdir=args.logdir,
+                metricsfile=metricsfile, **options)
+    else:
+        results = batch.runBatch(runs, jobs=args.jobs,
+                retries=args.retries, logdir=args.logdir,
+                metricsfile=metricsfile, **options)
+    print(batch.formatSummary(results))
+    if args.store:
+        from py15sacla.reduced import ReducedStore
+        with ReducedStore(args.store,
+                compression=options['compression']) as store:
+            for r in results:
+                if r.ok:
+                    store.add(args.output.format(run=r.run))
+        print("Added {} runs to {}".format(
+            sum(r.ok for r in results), args.store))
+    return int(not all(r.ok for r in results))
+
+
+def cmdStore(args):
+    "Add reduced run files to a consolidated multi-run store."
+    from py15sacla.reduced import ReducedStore
+    with ReducedStore(args.store,
+            compression=_compressionFilter(args.compression)) as store:
+        for filename in args.files:
+            store.add(filename)
+        nruns = len(store)
+    print("{} contains {} runs".format(args.store, nruns))
+    return 0
+
+
+def cmdMetrics(args):
+    "Summarize throughput metrics of compressed runs."
+    from py15sacla.metrics import readMetrics, summarizeMetrics
+    records = readMetrics(args.files)
+    if not records:
+        print("No metrics records found.", file=sys.stderr)
+        return 2
+    print(summarizeMetrics(records, by=args.by, slow=args.slow))
+    return 0
+
+# Local Helpers --------------------------------------------------------------
+
+def _buildParser():
+    "Create ArgumentParser for the py15sacla command."
+    import argparse
+    from py15sacla import compression
+    parser = argparse.ArgumentParser(prog='py15sacla',
+            description='Data reduction tools for the SACLA experiment.')
+    subparsers = parser.add_subparsers(title='commands')
+    p = subparsers.add_parser('compress', help=cmdCompress.__doc__,
+            description=cmdCompress.__doc__)
+    p.add_argument('runs', nargs='+', metavar='RUNS',
+            help='run numbers or inclusive ranges such as 542357-542370')
+    p.add_argument('-j', '--jobs', type=int, default=1,
+            help='number of parallel worker processes [%(default)s]')
+    p.add_argument('--chunksize', type=int, default=0, metavar='N',
+            help='split runs into chunks of N frames that are shared '
+            'between workers with work stealing, 0 for one task per run '
+            '[%(default)s]')
+    p.add_argument('--retries', type=int, default=1,
+            help='number of retries for failed runs [%(default)s]')
+    p.add_argument('--input', default=compression.INPUT_TEMPLATE,
+            help='input file template with {run} [%(default)s]')
+    p.add_argument('--output', default=compression.OUTPUT_TEMPLATE,
+            help='output file template with {run} [%(default)s]')
+    p.add_argument('--background', default=compression.BACKGROUND_FILE,
+            help='dark or legacy background file, empty string for '
+            'none [%(default)s]')
+    p.add_argument('--threshold', type=_parseThreshold,
+            default=compression.THRESHOLD,
+            help='threshold window in photons as LO,HI [0.9,3]')
+    p.add_argument('--logdir', default='logs',
+            help='directory for per-run log files [%(default)s]')
+    p.add_argument('--compression', default=compression.COMPRESSION,
+            help='HDF5 compression filter of the output files, '
+            '"none" to disable [%(default)s]')
+    p.add_argument('--store', metavar='FILE',
+            help='add the compressed runs to a consolidated store FILE')
+    p.add_argument('--metrics', metavar='FILE',
+            help='append JSON-lines throughput metrics of every run to '
+            'FILE, "none" to disable [LOGDIR/metrics.jsonl]')
+    p.add_argument('--emit-jobarray', metavar='FILE',
+            help='write PBS job array script to FILE instead of '
+            'running the runs locally')
+    p.set_defaults(command=cmdCompress)
+    p = subparsers.add_parser('store', help=cmdStore.__doc__,
+            description=cmdStore.__doc__)
+    p.add_argument('store', metavar='STORE',
+            help='store file, which is created when it does not exist')
+    p.add_argument('files', nargs='+', metavar='FILES',
+            help='reduced run files written by the compress command')
+    p.add_argument('--compression', default=compression.COMPRESSION,
+            help='HDF5 compression filter for the added runs, '
+            '"none" to disable [%(default)s]')
+    p.set_defaults(command=cmdStore)
+    p = subparsers.add_parser('metrics', help=cmdMetrics.__doc__,
+            description=cmdMetrics.__doc__)
+    p.add_argument('files', nargs='+', metavar='FILES',
+            help='metrics logs written by the compress command')
+    p.add_argument('--by', default='host',
+            help='record field for grouping the runs, e.g., host, '
+            'infile or indir for the input directory [%(default)s]')
+    p.add_argument('--slow', type=float, default=0.5,
+            help='list runs slower than this fraction of the median '
+            'frame rate [%(default)s]')
+    p.set_defaults(command=cmdMetrics)
+    return parser
+
+
+def _compressionFilter(name):
+    "Return HDF5 compression filter for a command-line value."
+    return None if name.lower() == 'none' else name
+
+
+def _metricsFile(args):
+    "Return metrics log path for the compress command or None."
+    import os
+    from py15sacla.metrics import METRICS_FILE
+    if args.metrics is None:
+        return os.path.join(args.logdir, METRICS_FILE)
+    if args.metrics.lower() == 'none':
+        return None
+    return args.metrics
+
+
+def _parseThreshold(s):
+    "Convert string 'LO,HI' to a tuple of floats."
+    lo, hi = s.split(',')
+    return (float(lo), float(hi))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# End of file
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+'''Reduction of a single run into a compressed HDF5 file.
+
+This is the library form of the former compression/comp1file.py script.
+It is used by the batch driver of the py15sacla command.  NumPy and h5py
+are imported only when a run is processed, so that the command line can
+use the defaults below without loading them.
+'''
+
+# Default file locations used at the beamtime.  {run} is replaced with
+# the run number.
+INPUT_TEMPLATE = '/work/mdean/h5files/run_{run}_sig.h5'
+OUTPUT_TEMPLATE = '/work/mdean/compressed/comp_{run}.h5'
+BACKGROUND_FILE = '/home/mdean/datacompressing/BG.h5'
+
+# Default threshold window in photons.
+THRESHOLD = (0.9, 3)
+
+# Default compression filter of the output files.  LZF is fast and always
+# available in h5py.
+COMPRESSION = 'lzf'
+
+# Output variables and patterns of the per-shot event data they are read
+# from.  Variables missing in the input file are skipped.
+EVENT_COLUMNS = [
+    ('opt_delay', 'opt_delay'),
+    ('opt_nd', 'opt_nd'),
+    ('accelerator', 'accelerator'),
+    ('xfel_selector', 'xfel_pulse_selector_status'),
+    ('laser_selector', 'laser_pulse_selector_status'),
+    ('sample_theta', 'huber/omega'),
+    ('huber_theta', 'huber/theta'),
+    ('huber_phi', 'phi'),
+    ('huber_chi', 'chi'),
+    ('huber_twotheta', 'huber/twotheta'),
+]
+
+# Event variables that are summed to give the I0 normalization.
+I0_COLUMNS = ('user_4', 'user_5')
+
+
+def compressRun(run, infile=None, outfile=None, background=BACKGROUND_FILE,
+        threshold=THRESHOLD, roi=(), compression=COMPRESSION):
+    '''Reduce detector images and event data of one run to a small file.
+
+    run          -- run number, which is also used in the file templates.
+    infile       -- input HDF5 file, where "{run}" is replaced with
+                    the run number.  Use INPUT_TEMPLATE when None.
+    outfile      -- output HDF5 file, where "{run}" is replaced with
+                    the run number.  Use OUTPUT_TEMPLATE when None.
+    background   -- background image, BackgroundModel or dark file path
+                    passed to CCDFrames.setBackground.  No background
+                    subtraction when None.
+    threshold    -- tuple of (lo, hi) threshold bounds in photons.
+    roi          -- tuple of slices for the region of interest.
+    compression  -- HDF5 compression filter of the output datasets.
+
+    Return dictionary with summary information about the run.
+    '''
+    import time
+    from py15sacla.profiling import active
+    prof = active()
+    infile = (infile or INPUT_TEMPLATE).format(run=run)
+    outfile = (outfile or OUTPUT_TEMPLATE).format(run=run)
+    t = prof and time.perf_counter()
+    signal = signalFrames(infile, background, threshold, roi)
+    if prof is not None:
+        prof.lap('setup', t)
+    acc = accumulateFrames(signal)
+    signal.hdffile.close()
+    t = prof and time.perf_counter()
+    provenance = reductionProvenance(infile, background, threshold, roi)
+    rv = writeCompressed(run, infile, outfile, acc, provenance, compression)
+    if prof is not None:
+        prof.lap('write', t)
+    return rv
+
+
+def signalFrames(infile, background=BACKGROUND_FILE, threshold=THRESHOLD,
+        roi=()):
+    '''Return CCDFrames of detector images configured for compression.
+
+    infile       -- input HDF5 file of the run.
+    background, threshold, roi -- processing options, see compressRun.
+
+    Return CCDFrames object.
+    '''
+    from py15sacla.hdfselection import HDFSelection
+    from py15sacla.ccdframes import CCDFrames
+    sel = HDFSelection(infile, 'detector_2d_1 detector_data$')
+    signal = CCDFrames(sel)
+    signal.setROI(roi)
+    if background is not None:
+        signal.setBackground(background)
+    signal.setThreshold(*threshold)
+    return signal
+
+
+def accumulateFrames(signal, start=0, stop=None, batchsize=16):
+    '''Accumulate statistics of processed frames in a range of indices.
+
+    signal       -- CCDFrames configured by signalFrames.
+    start, stop  -- range of frame indices, by default all frames.
+    batchsize    -- number of frames added together as a 3D block,
+                    which takes fewer array passes than single frames.
+
+    Return MeanVarianceAccumulator object.
+    '''
+    import numpy
+    from py15sacla.accumulators import MeanVarianceAccumulator
+    nsel = len(signal.selection)
+    stop = nsel if stop is None else min(stop, nsel)
+    ccd = signal
+    if (start, stop) != (0, nsel):
+        ccd = signal._subset(numpy.arange(start, stop))
+    acc = MeanVarianceAccumulator()
+    block = None
+    n = 0
+    for aa in ccd.generate():
+        if block is None:
+            block = numpy.empty((batchsize,) + aa.shape, aa.dtype)
+        block[n] = aa
+        n += 1
+        if n == batchsize:
+            acc.update(block)
+            n = 0
+    if n:
+        acc.update(block[:n])
+    return acc
+
+
+def writeCompressed(run, infile, outfile, acc, provenance=None,
+        compression=COMPRESSION):
+    '''Write event data and accumulated mean image of a run.
+
+    run          -- run number.
+    infile       -- input HDF5 file of the run with event data.
+    outfile      -- output HDF5 file, which is overwritten.
+    acc          -- MeanVarianceAccumulator of all processed frames.
+    provenance   -- optional dictionary that describes the reduction,
+                    see reductionProvenance.
+    compression  -- HDF5 compression filter of the output datasets.
+
+    Return dictionary with summary information about the run.
+    '''
+    import numpy
+    from py15sacla.hdfselection import HDFSelection
+    from py15sacla.reduced import ReducedRun
+    run_info = HDFSelection(infile)
+    events = readEventColumns(run_info)
+    run_info.hdffile.close()
+    edict = dict(events)
+    for name, flag in (('xfel_selector', 'XRAY'), ('laser_selector', 'LASER')):
+        if name in edict and numpy.any(edict[name] == 0):
+            print("{} SHUTTER CLOSED in run {}".format(flag, run))
+    if acc.count:
+        image, variance = acc.mean, acc.variance()
+    else:
+        image, variance = numpy.zeros((0, 0)), None
+    reduced = ReducedRun(run, image, variance=variance, nframes=acc.count,
+            events=events, provenance=provenance)
+    print("Writing into h5File {}".format(outfile))
+    reduced.save(outfile, compression=compression)
+    rv = {'run' : run, 'nframes' : acc.count,
+          'infile' : infile, 'outfile' : outfile}
+    return rv
+
+
+def reductionProvenance(infile, background, threshold, roi):
+    '''Return dictionary that describes how a run was reduced.
+
+    infile, background, threshold, roi -- processing options,
+                    see compressRun.
+
+    Return dictionary of strings and numbers for ReducedRun.
+    '''
+    import time
+    import socket
+    import numpy
+    if background is None or isinstance(background, str):
+        bgname = background or ''
+    else:
+        bgname = '<{}>'.format(type(background).__name__)
+    rv = {'infile' : infile,
+          'background' : bgname,
+          'threshold' : numpy.asarray(threshold, dtype=float),
+          'roi' : repr(tuple(roi)),
+          'host' : socket.gethostname(),
+          'created' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+          }
+    return rv
+
+
+def readEventColumns(run_info):
+    '''Read per-shot event variables from a run selection.
+
+    run_info -- HDFSelection of the run file.
+
+    Return a list of (name, array) pairs for the EVENT_COLUMNS found
+    in the file and I0 when all I0_COLUMNS are present.
+    '''
+    rv = []
+    for name, pattern in EVENT_COLUMNS:
+        sel = run_info[pattern]
+        if len(sel):
+            rv.append((name, sel[0][:]))
+    i0parts = [run_info[p] for p in I0_COLUMNS]
+    if all(len(sel) for sel in i0parts):
+        rv.append(('I0', sum(sel[0][:] for sel in i0parts)))
+    return rv
+
+# End of file
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+'''Per-shot features of detector frames.
+
+FeatureAccumulator computes a table of scalar features for every frame
+with vectorized operations on 3D blocks of frames.  The default columns
+are
+
+    tag                 tag number of the shot, when known
+    total, min, max     sum, minimum and maximum of the pixel values
+    com_row, com_col    center of mass of the frame in pixels
+    width_row, width_col    RMS width around the center of mass
+    peak_row, peak_col  position of the maximum pixel
+    roi_<name>          sum of the values in each named region
+
+Positions are in the pixels of the processed frames, i.e., after the ROI
+and binning of CCDFrames.  The center of mass and width are NaN for
+frames with a non-positive total.  The table is obtained in a single
+pass with CCDFrames.features and can be saved with ReducedRun.
+'''
+
+import re
+import numpy
+
+# Feature columns other than tag and the ROI sums in the table order.
+FEATURE_COLUMNS = ('total', 'min', 'max', 'com_row', 'com_col',
+                   'width_row', 'width_col', 'peak_row', 'peak_col')
+
+# Columns that are multiplied by the scale factors of the frames.
+_SCALED = ('total', 'min', 'max')
+
+
+class FeatureAccumulator(object):
+
+    """Table of per-shot features accumulated from frames.
+
+    Data attributes:
+
+    rois     -- OrderedDict of named regions, which are tuples of slices
+                of the frame arrays.
+    tags     -- array of tag numbers of the frames or None.
+    nframes  -- number of frames processed so far.
+    """
+
+    tags = None
+    nframes = 0
+
+    def __init__(self, rois=None):
+        """Initialize new FeatureAccumulator object.
+
+        rois     -- optional dictionary or sequence of (name, roislice)
+                    pairs for the roi_<name> columns.  roislice is a tuple
+                    of slices for row and column indices, for example,
+                    numpy.s_[10:20, :].
+        """
+        import collections
+        self.rois = collections.OrderedDict(rois or ())
+        names = list(FEATURE_COLUMNS)
+        names += ['roi_' + name for name in self.rois]
+        self._columns = collections.OrderedDict((n, []) for n in names)
+        return
+
+
+    def update(self, frames, weight=None, scale=None):
+        """Add features of one frame or a 3D block of frames.
+
+        frames   -- 2D array of one frame or 3D array of several frames
+                    stacked along the first axis.
+        weight   -- ignored, accepted for use with CCDFrames.accumulate.
+        scale    -- optional factor of the frame values or array of
+                    per-frame factors, which multiplies the total, min,
+                    max and ROI sums.
+
+        No return value.
+        """
+        frames = numpy.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[numpy.newaxis]
+        nfr, ny, nx = frames.shape
+        if not nfr:
+            return
+        flat = frames.reshape(nfr, -1)
+        prow = frames.sum(axis=2, dtype=float)
+        pcol = frames.sum(axis=1, dtype=float)
+        total = prow.sum(axis=1)
+        good = total > 0
+        tdiv = numpy.where(good, total, 1.0)
+        rv = {'total' : total,
+              'min' : flat.min(axis=1).astype(float),
+              'max' : flat.max(axis=1).astype(float)}
+        for name, proj, n in (('row', prow, ny), ('col', pcol, nx)):
+            pos = numpy.arange(n, dtype=float)
+            com = numpy.dot(proj, pos) / tdiv
+            m2 = numpy.dot(proj, pos * pos) / tdiv - com * com
+            width = numpy.sqrt(numpy.maximum(m2, 0))
+            com[~good] = numpy.nan
+            width[~good] = numpy.nan
+            rv['com_' + name] = com
+            rv['width_' + name] = width
+        rv['peak_row'], rv['peak_col'] = numpy.divmod(flat.argmax(axis=1), nx)
+        for name, roi in self.rois.items():
+            sl = (slice(None),) + tuple(roi)
+            rv['roi_' + name] = frames[sl].sum(axis=(1, 2), dtype=float)
+        if scale is not None:
+            s = numpy.broadcast_to(numpy.asarray(scale, dtype=float), (nfr,))
+            for name in list(_SCALED) + ['roi_' + n for n in self.rois]:
+                rv[name] = rv[name] * s
+        for name, values in self._columns.items():
+            values.append(rv[name])
+        self.nframes += nfr
+        return
+
+
+    def merge(self, other):
+        """Append features from another FeatureAccumulator.
+
+        other    -- FeatureAccumulator with the same ROI names.  Its rows
+                    are appended after the frames in this accumulator.
+
+        No return value.
+        """
+        if list(self._columns) != list(other._columns):
+            emsg = "Cannot merge accumulators with different columns."
+            raise ValueError(emsg)
+        if (self.tags is None) != (other.tags is None):
+            emsg = "Cannot merge accumulators with and without tags."
+            raise ValueError(emsg)
+        if self.tags is not None:
+            self.tags = numpy.concatenate([self.tags, other.tags])
+        for name, values in self._columns.items():
+            values.extend(other._columns[name])
+        self.nframes += other.nframes
+        return
+
+
+    def columnnames(self):
+        "Return a list of the table column names."
+        rv = ([] if self.tags is None else ['tag']) + list(self._columns)
+        return rv
+
+
+    def table(self):
+        """Return table of the per-shot features.
+
+        Return OrderedDict of 1D arrays with one value per frame, where
+        the first column is tag when tags are known.  The peak positions
+        are integers and all other features are floats.
+        """
+        import collections
+        rv = collections.OrderedDict()
+        if self.tags is not None:
+            rv['tag'] = numpy.asarray(self.tags)[:self.nframes]
+        for name, values in self._columns.items():
+            dtype = int if name.startswith('peak_') else float
+            rv[name] = numpy.concatenate(
+                    [numpy.empty(0, dtype=dtype)] + values)
+        return rv
+
+# End of class FeatureAccumulator
+
+
+def frameTags(selection):
+    '''Return tag numbers of the frames in an HDFSelection.
+
+    selection    -- HDFSelection of detector frames in "tag_T" groups.
+
+    Return integer array with -1 for frames without a tag in the path.
+    '''
+    rv = numpy.full(len(selection), -1, dtype=numpy.int64)
+    for i, name in enumerate(selection._datanames):
+        mx = _TAG_RX.search(name)
+        if mx:
+            rv[i] = int(mx.group(1))
+    return rv
+
+# Local Helpers --------------------------------------------------------------
+
+_TAG_RX = re.compile(r'/tag_(\d+)/')
+
+# End of file
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+'''Memory-mapped cache of raw detector frames.
+
+Raw frames of a selection are copied once into a contiguous 3D stack in
+the NumPy ".npy" format.  A JSON sidecar with the same base name and
+".index.json" extension keeps the dataset names of the frames, their
+detector configuration and the source file for checking staleness.
+
+FrameCache opens the stack as a read-only memory map and can be used in
+place of an HDF file, so that HDFSelection and CCDFrames iterate over
+the cached frames without HDF5 reads.  Indexing a cached frame returns
+a view of the memory map, which is copied only when processed:
+
+    ccd = CCDFrames('run_1_sig.h5').cached('/scratch/run_1.npy')
+'''
+
+import os
+import numpy
+
+CACHE_FORMAT = 'py15sacla-framecache'
+CACHE_VERSION = 1
+
+
+class FrameCache(object):
+
+    """Read-only memory-mapped stack of raw frames with a name index.
+
+    Data attributes:
+
+    path         -- path to the ".npy" file of the frame stack.
+    frames       -- read-only memory-mapped 3D array of the frames.
+    names        -- list of HDF dataset names of the cached frames.
+    configs      -- list of detector configuration dictionaries,
+                    one per each frame as from getDetectorConfig.
+    source       -- path of the HDF file the frames were read from.
+    """
+
+    def __init__(self, path):
+        """Open an existing frame cache.
+
+        path     -- path to the ".npy" file written by exportFrameCache.
+        """
+        index = _readIndex(path)
+        self.path = path
+        self.frames = numpy.load(path, mmap_mode='r')
+        if len(self.frames) != len(index['names']):
+            emsg = "Frame cache {0!r} does not match its index.".format(path)
+            raise ValueError(emsg)
+        self.names = index['names']
+        cfgtable = index['configs']
+        self.configs = [cfgtable[i] for i in index['config_index']]
+        self.source = index['source']
+        self._position = dict((n, i) for i, n in enumerate(self.names))
+        return
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def __contains__(self, name):
+        return name in self._position
+
+
+    def __getitem__(self, name):
+        "Return CachedFrame for the HDF dataset name of a frame."
+        return CachedFrame(self, self._position[name])
+
+
+    def close(self):
+        "Release the memory map of the frame stack."
+        self.frames = None
+        return
+
+# End of class FrameCache
+
+
+class CachedFrame(object):
+
+    """Single frame of a FrameCache that behaves as a read-only Dataset.
+
+    Data attributes:
+
+    cache        -- FrameCache that owns the frame.
+    index        -- position of the frame in the cached stack.
+    """
+
+    def __init__(self, cache, index):
+        self.cache = cache
+        self.index = index
+        return
+
+
+    def __getitem__(self, key):
+        "Return read-only view of the frame values at key in the cache."
+        return self.cache.frames[self.index][key]
+
+
+    def __array__(self, dtype=None, copy=None):
+        return numpy.asarray(self.cache.frames[self.index], dtype=dtype)
+
+
+    def read_direct(self, dest, source_sel=None):
+        """Copy frame values to an existing array like h5py.Dataset.
+
+        dest         -- destination array of a matching shape.
+        source_sel   -- optional index of the source values.
+
+        No return value.
+        """
+        a = self.cache.frames[self.index]
+        dest[...] = a if source_sel is None else a[source_sel]
+        return
+
+
+    def config(self):
+        "Return a copy of the detector configuration dictionary."
+        return dict(self.cache.configs[self.index])
+
+    # properties
+
+    @property
+    def name(self):
+        "HDF dataset name of this frame in the source file."
+        return self.cache.names[self.index]
+
+
+    @property
+    def shape(self):
+        "Shape of the frame array."
+        return self.cache.frames.shape[1:]
+
+
+    @property
+    def dtype(self):
+        "Data type of the frame array."
+        return self.cache.frames.dtype
+
+# End of class CachedFrame
+
+
+def exportFrameCache(src, path):
+    '''Copy raw detector frames to a memory-mapped frame cache.
+
+    src      -- source of the raw frames.  Accepted types are CCDFrames,
+                HDFSelection, h5py.Group or a string of the HDF file.
+                All frames must have the same shape.
+    path     -- path to the output ".npy" file.  The index sidecar is
+                written next to it.  Existing files are overwritten.
+
+    Return FrameCache object for the new cache.
+    '''
+    import json
+    from numpy.lib.format import open_memmap
+    from py15sacla.hdfselection import HDFSelection
+    from py15sacla.ccdframes import CCDFrames
+    sel = src.selection if isinstance(src, CCDFrames) else src
+    sel = HDFSelection(sel, 'detector_data$')
+    if not len(sel):
+        raise ValueError("Cannot cache an empty selection of frames.")
+    ds0 = sel[0]
+    tmppath = path + '.tmp.npy'
+    mm = open_memmap(tmppath, mode='w+', dtype=ds0.dtype,
+            shape=(len(sel),) + ds0.shape)
+    configs = []
+    cfgindex = []
+    cfgcache = {}
+    try:
+        for i, dd in enumerate(sel):
+            if dd.shape != ds0.shape:
+                emsg = "Frame {} has shape {} different from {}.".format(
+                        dd.name, dd.shape, ds0.shape)
+                raise ValueError(emsg)
+            mm[i] = dd[()]
+            cfgkey = _configKey(dd)
+            if cfgkey not in cfgcache:
+                cfgcache[cfgkey] = len(configs)
+                configs.append(_jsonConfig(dd))
+            cfgindex.append(cfgcache[cfgkey])
+        mm.flush()
+    except Exception:
+        del mm
+        os.remove(tmppath)
+        raise
+    del mm
+    source = _sourceFile(sel)
+    index = {
+        'format' : CACHE_FORMAT,
+        'version' : CACHE_VERSION,
+        'source' : source,
+        'source_mtime' : os.path.getmtime(source),
+        'names' : sel.names,
+        'configs' : configs,
+        'config_index' : cfgindex,
+    }
+    tmpindex = indexPath(path) + '.tmp'
+    with open(tmpindex, 'w') as fp:
+        json.dump(index, fp)
+    os.rename(tmppath, path)
+    os.rename(tmpindex, indexPath(path))
+    return FrameCache(path)
+
+
+def isCacheCurrent(path, src):
+    '''Check if a frame cache is up to date with its source frames.
+
+    path     -- path to the ".npy" file of the frame cache.
+    src      -- HDFSelection of the raw frames expected in the cache.
+
+    Return True when the cache exists, contains the same frames and its
+    source file was not modified after the cache was written.
+    '''
+    from py15sacla.hdfselection import HDFSelection
+    if not (os.path.isfile(path) and os.path.isfile(indexPath(path))):
+        return False
+    try:
+        index = _readIndex(path)
+    except ValueError:
+        return False
+    sel = HDFSelection(src, 'detector_data$')
+    source = _sourceFile(sel)
+    rv = (index['source'] == source and
+            index['source_mtime'] == os.path.getmtime(source) and
+            index['names'] == sel.names)
+    return rv
+
+
+def indexPath(path):
+    "Return path to the index sidecar of a frame cache file."
+    return os.path.splitext(path)[0] + '.index.json'
+
+# Local Helpers --------------------------------------------------------------
+
+def _readIndex(path):
+    "Load and validate the index sidecar of a frame cache."
+    import json
+    with open(indexPath(path)) as fp:
+        index = json.load(fp)
+    if index.get('format') != CACHE_FORMAT:
+        emsg = "{0!r} is not a frame cache index.".format(indexPath(path))
+        raise ValueError(emsg)
+    if index['version'] > CACHE_VERSION:
+        emsg = "Unsupported frame cache version {0}.".format(
+                index['version'])
+        raise ValueError(emsg)
+    return index
+
+
+def _sourceFile(sel):
+    "Return absolute path of the HDF file with frames of a selection."
+    if isinstance(sel.hdffile, FrameCache):
+        return sel.hdffile.source
+    return os.path.abspath(sel.hdffile.filename)
+
+
+def _configKey(dd):
+    "Return key of the run group that determines detector configuration."
+    if dd.name.startswith('/run_'):
+        return dd.name.split('/', 2)[1]
+    return None
+
+
+def _jsonConfig(dd):
+    "Return detector configuration of a dataset with plain Python values."
+    from py15sacla.utils import getDetectorConfig
+    cfg = getDetectorConfig(dd)
+    rv = dict((k, numpy.asarray(v).item()) for k, v in cfg.items())
+    return rv
+
+# End of file
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+'''Vectorized statistics over groups of repeated key values.
+
+All functions here treat the input as a flattened array and preserve
+the order of the first appearance of every unique value.  They rely
+only on NumPy sorting and run in O(n log n) time.
+'''
+
+import numpy
+
+
+def unique_inverse_ordered(a):
+    '''Return unique values in the order of appearance and inverse indices.
+
+    a    -- array-like object, which is processed as flattened array.
+
+    Return a tuple of (uniques, inverse), where uniques are the unique
+    values of a in the order of appearance and inverse is an integer
+    array such that uniques[inverse] reconstructs the flattened a.
+    '''
+    a = numpy.asarray(a).reshape(-1)
+    u, first, inverse = numpy.unique(a,
+            return_index=True, return_inverse=True)
+    order = numpy.argsort(first, kind='stable')
+    rank = numpy.empty_like(order)
+    rank[order] = numpy.arange(len(order))
+    return (u[order], rank[inverse.reshape(-1)])
+
+
+def unique_ordered(a):
+    '''Return unique values in array a in the order of appearance.
+
+    a    -- array-like object, which is processed as flattened array.
+
+    Return NumPy array of unique values.
+    '''
+    a = numpy.asarray(a).reshape(-1)
+    u, first = numpy.unique(a, return_index=True)
+    order = numpy.argsort(first, kind='stable')
+    return u[order]
+
+
+def multiplicities(a):
+    '''Return multiplicities of unique values in array a.
+
+    a    -- array-like object, which is processed as flattened array.
+
+    Return integer array of counts for the unique values in the order
+    of their appearance, i.e., as returned by unique_ordered.
+    '''
+    a = numpy.asarray(a).reshape(-1)
+    u, first, counts = numpy.unique(a,
+            return_index=True, return_counts=True)
+    order = numpy.argsort(first, kind='stable')
+    return counts[order]
+
+# End of file
@@ -16,12 +16,17 @@ class HDFSelection(object):
 
         src  -- source node for selecting HDF5 datasets.  Accepted types
                 are HDFSelection, HDF5 Group or a string, which is used
-                to open an h5py.File.
+                to open an h5py.File.  Can be also FrameCache, whose
+                frames are then selected in place of the HDF datasets.
         pattern  -- optional string pattern for matching dataset names.
                 By default an empty string that matches everything.
         mode -- Python mode used for opening the HDF5 file, by default 'r'.
                 Used only when src is a string.
         '''
+        import time
+        from py15sacla.profiling import active
+        prof = active()
+        t = prof and time.perf_counter()
         #if mode is not None and not isinstance(src, basestring): MPMD fixing py2 to py3 update
         if mode is not None and not isinstance(src, str):
             raise ValueError("mode is valid only when src is a filename.")
@@ -42,10 +47,19 @@ class HDFSelection(object):
             src.visititems(collect_datanames)
             self._datanames.sort()
         else:
-            raise TypeError("Unsupported selection source {0!r}.".format(src))
+            from py15sacla.framecache import FrameCache
+            if not isinstance(src, FrameCache):
+                emsg = "Unsupported selection source {0!r}.".format(src)
+                raise TypeError(emsg)
+            self.hdffile = src
+            self._datanames[:] = sorted(src.names)
+        if prof is not None and not isinstance(src, HDFSelection):
+            t = prof.lap('selection scan', t)
         if pattern:
             mp = MultiPattern(pattern)
             self._datanames = [n for n in self._datanames if mp.match(n)]
+            if prof is not None:
+                prof.lap('selection match', t)
         return
 
 
@@ -94,18 +108,18 @@ class HDFSelection(object):
 
         Return a list of (unique_key, HDFSelection) pairs.
         """
-        from collections import OrderedDict
-        groups = OrderedDict()
-        cnt = 0
-        for i, k in enumerate(keys):
-            if not k in groups:
-                groups[k] = []
-            groups[k].append(i)
-            cnt += 1
-        if cnt != len(self):
+        from py15sacla.groupstats import unique_inverse_ordered
+        akeys = numpy.asarray(keys)
+        if akeys.ndim != 1 or akeys.dtype == object:
+            return self._groupbyitemsGeneric(keys)
+        if len(akeys) != len(self):
             emsg = "groupby keys must be of the compatible length."
             raise ValueError(emsg)
-        rv = [(k, self[gi]) for k, gi in groups.iteritems()]
+        ukeys, inverse = unique_inverse_ordered(akeys)
+        order = numpy.argsort(inverse, kind='stable')
+        bounds = numpy.cumsum(numpy.bincount(inverse, minlength=len(ukeys)))
+        groups = numpy.split(order, bounds[:-1])
+        rv = [(k, self[gi]) for k, gi in zip(ukeys, groups)]
         return rv
 
 
@@ -168,8 +182,13 @@ class HDFSelection(object):
             return self[key[0]][key[1:]]
         #if isinstance(key, basestring): MPMD py2 to py3 update
         if isinstance(key, str):
+            import time
+            from py15sacla.profiling import active
+            t = time.perf_counter()
             mp = MultiPattern(key)
             dnms = [n for n in self._datanames if mp.match(n)]
+            if active() is not None:
+                active().lap('selection match', t)
         elif isinstance(key, slice):
             dnms = self._datanames[key]
         else:
@@ -279,6 +298,23 @@ class HDFSelection(object):
 
     # Internal helper functions
 
+    def _groupbyitemsGeneric(self, keys):
+        "Implementation of groupbyitems for arbitrary hashable keys."
+        from collections import OrderedDict
+        groups = OrderedDict()
+        cnt = 0
+        for i, k in enumerate(keys):
+            if not k in groups:
+                groups[k] = []
+            groups[k].append(i)
+            cnt += 1
+        if cnt != len(self):
+            emsg = "groupby keys must be of the compatible length."
+            raise ValueError(emsg)
+        rv = [(k, self[gi]) for k, gi in groups.items()]
+        return rv
+
+
     def __checkOperationArgument(self, other):
         "Check validity of the argument for addition or subtraction."
         if not isinstance(other, HDFSelection):
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+
+'''Streaming histograms of detector frames.
+
+HistogramAccumulator updates histogram counts in place from single frames
+or 3D blocks of frames.  It supports several bin specifications at once
+and can keep per-frame and per-key histograms in the same pass.
+'''
+
+import numpy
+
+
+class HistogramAccumulator(object):
+
+    """Accumulate histogram counts for one or more bin specifications.
+
+    Every bin specification is a tuple of (lobound, hibound, bins) with
+    the same meaning as CCDFrames.chistbins.  Values equal to hibound are
+    counted in the last bin.  Values outside of the range are counted
+    separately as underflow and overflow.
+
+    When lobound and hibound are None the range is selected automatically
+    from the data.  Automatic bins have the smallest width that is a power
+    of 2 and fits the values in at most bins intervals, and edges at its
+    integer multiples.  The bins are shifted or widened when new values
+    fall outside, where widening merges pairs of adjacent bins.  Only
+    the bins from the minimum to the maximum value are reported, so the
+    range exceeds the data by less than one bin at each end.  Because all
+    automatic bins lie on the same grids, it is possible to merge
+    accumulators that were updated from different subsets of frames.
+    The bins depend only on the extent of the values, see autoBins.
+
+    Data attributes:
+
+    specs    -- list of (lobound, hibound, bins) tuples as passed to the
+                constructor.  Use the range method for actual bounds.
+    perframe -- flag for keeping histogram counts of every frame.
+    nframes  -- number of frames processed so far.
+    keys     -- list of unique keys in the order of appearance.
+    """
+
+    perframe = False
+    nframes = 0
+
+    def __init__(self, specs, perframe=False):
+        """Initialize new HistogramAccumulator object.
+
+        specs    -- list of (lobound, hibound, bins) tuples.  Can be also
+                    a single tuple for one bin specification.
+        perframe -- keep histogram counts of every frame when True.
+        """
+        specs = list(specs)
+        if specs and not isinstance(specs[0], (tuple, list)):
+            specs = [tuple(specs)]
+        self.specs = [tuple(s) for s in specs]
+        self.perframe = bool(perframe)
+        self.keys = []
+        self._keyindex = {}
+        self._bins = [_HistogramBins(*s) for s in self.specs]
+        self._fbuf = numpy.empty(0, dtype=float)
+        self._ibuf = numpy.empty(0, dtype=numpy.intp)
+        return
+
+
+    def update(self, frames, keys=None, weight=None, scale=None):
+        """Add frame values to the histogram counts.
+
+        frames   -- 2D array of one frame or 3D array of several frames
+                    stacked along the first axis.
+        keys     -- optional key for every frame, for example a delay bin.
+                    Must be a single value for a 2D frame.  When specified,
+                    histogram counts are also accumulated per each key.
+        weight, scale -- optional per-frame weights and normalization
+                    factors as in MeanVarianceAccumulator.update.  The
+                    counts of each frame are multiplied by weight * scale,
+                    the values are binned without scaling.  Weighted
+                    counts are floating point numbers.
+
+        No return value.
+        """
+        frames = numpy.asarray(frames)
+        factor = None
+        if weight is not None or scale is not None:
+            factor = numpy.multiply(1.0 if weight is None else weight,
+                    1.0 if scale is None else scale, dtype=float)
+            nfr = len(frames) if frames.ndim == 3 else 1
+            factor = numpy.broadcast_to(factor, (nfr,))
+        if frames.ndim == 2:
+            frames = frames[numpy.newaxis]
+            if keys is not None:
+                keys = [keys]
+        nfr = len(frames)
+        kidx = None
+        if keys is not None:
+            kidx = self._keyIndices(keys)
+            if len(kidx) != nfr:
+                emsg = "keys must be of the same length as frames."
+                raise ValueError(emsg)
+        if not nfr:
+            return
+        if any(hb.auto for hb in self._bins):
+            lo, hi = frames.min(), frames.max()
+            for hb in self._bins:
+                if hb.auto:
+                    hb.cover(lo, hi)
+        for hb in self._bins:
+            idx = self._binIndices(hb, frames)
+            hb.add(idx, kidx, len(self.keys), self.perframe, factor)
+        self.nframes += nfr
+        return
+
+
+    def merge(self, other):
+        """Add histogram counts from another accumulator.
+
+        other    -- HistogramAccumulator with the same bin specifications
+                    and perframe flag.  Per-frame counts of other are
+                    appended after the frames in this accumulator.
+
+        No return value.
+        """
+        if (self.specs != other.specs or self.perframe != other.perframe):
+            emsg = "Cannot merge accumulators with different configuration."
+            raise ValueError(emsg)
+        kidx = self._keyIndices(other.keys)
+        for hb, hbo in zip(self._bins, other._bins):
+            hb.merge(hbo, kidx, len(self.keys))
+        self.nframes += other.nframes
+        return
+
+
+    def counts(self, i=0):
+        """Return histogram counts summed over all frames.
+
+        i    -- index of the bin specification.
+
+        Return 1D integer array.
+        """
+        hb = self._bins[i]
+        return hb.total[1:hb.used() + 1].copy()
+
+
+    def framecounts(self, i=0):
+        """Return histogram counts of every processed frame.
+
+        i    -- index of the bin specification.
+
+        Return 2D integer array of shape (nframes, bins).
+        """
+        if not self.perframe:
+            raise ValueError("Per-frame histograms are not accumulated.")
+        hb = self._bins[i]
+        nb = hb.bins + 2
+        rv = numpy.concatenate([numpy.empty((0, nb), dtype=hb.total.dtype)]
+                + hb.frames)
+        return rv[:, 1:hb.used() + 1]
+
+
+    def keycounts(self, i=0):
+        """Return histogram counts accumulated per each key.
+
+        i    -- index of the bin specification.
+
+        Return a tuple of (keys, counts), where counts is a 2D integer
+        array of shape (len(keys), bins).
+        """
+        hb = self._bins[i]
+        rv = hb.bykey[:len(self.keys), 1:hb.used() + 1].copy()
+        return (list(self.keys), rv)
+
+
+    def underflow(self, i=0):
+        "Return number of values below the lower bound of bin spec i."
+        return self._bins[i].total[0].item()
+
+
+    def overflow(self, i=0):
+        "Return number of values above the upper bound of bin spec i."
+        return self._bins[i].total[-1].item()
+
+
+    def range(self, i=0):
+        """Return a tuple of (lobound, hibound, bins) for bin spec i.
+
+        This gives the current automatically selected range, which may
+        have fewer bins than the specification.
+        """
+        hb = self._bins[i]
+        n = hb.used()
+        if not hb.auto or hb.delta is None:
+            return (hb.lo, hb.hi, n)
+        return (hb.lo, float((hb.start + n) * hb.delta), n)
+
+
+    def edges(self, i=0):
+        "Return bin edges for the bin specification i."
+        lo, hi, bins = self.range(i)
+        return numpy.linspace(lo, hi, bins + 1)
+
+    # helper methods
+
+    def _keyIndices(self, keys):
+        "Return array of row indices for keys, register new keys."
+        rv = []
+        for k in keys:
+            if k not in self._keyindex:
+                self._keyindex[k] = len(self.keys)
+                self.keys.append(k)
+            rv.append(self._keyindex[k])
+        return numpy.array(rv, dtype=numpy.intp)
+
+
+    def _binIndices(self, hb, frames):
+        """Calculate bin indices of frame values into reusable buffers.
+
+        Index 0 is for underflow and index bins + 1 for overflow.
+
+        Return integer array of the same shape as frames.
+        """
+        n = frames.size
+        if self._fbuf.size < n:
+            self._fbuf = numpy.empty(n, dtype=float)
+            self._ibuf = numpy.empty(n, dtype=numpy.intp)
+        t = self._fbuf[:n].reshape(frames.shape)
+        idx = self._ibuf[:n].reshape(frames.shape)
+        if hb.auto:
+            # automatic bins are on a grid of multiples of the bin width,
+            # scaling by a power of 2 is exact
+            numpy.multiply(frames, 1.0 / hb.delta, out=t)
+            numpy.floor(t, out=t)
+            numpy.subtract(t, hb.start - 1, out=t)
+            idx[...] = t
+            return idx
+        numpy.subtract(frames, hb.lo, out=t)
+        numpy.multiply(t, hb.bins / (hb.hi - hb.lo), out=t)
+        numpy.clip(t, 0, hb.bins - 0.5, out=t)
+        numpy.floor(t, out=t)
+        numpy.add(t, 1, out=t)
+        idx[...] = t
+        idx[frames < hb.lo] = 0
+        idx[frames > hb.hi] = hb.bins + 1
+        return idx
+
+# End of class HistogramAccumulator
+
+
+def autoBins(vmin, vmax, bins=50):
+    '''Return automatic histogram bins for values from vmin to vmax.
+
+    vmin, vmax   -- extent of the values.
+    bins         -- maximum number of bins.
+
+    Return a tuple of (lobound, hibound, bins) of the same bins as the
+    automatic range of HistogramAccumulator for these values.
+    '''
+    acc = HistogramAccumulator((None, None, bins))
+    acc._bins[0].cover(vmin, vmax)
+    return acc.range()
+
+# Local Helpers --------------------------------------------------------------
+
+class _HistogramBins(object):
+    '''Counts for one bin specification of HistogramAccumulator.
+
+    All count arrays have bins + 2 columns, where the first and last
+    columns hold underflow and overflow counts.
+
+    Data:
+
+    bins    -- number of histogram bins.
+    auto    -- flag for automatically selected range.
+    lo, hi  -- range of the histogram bins.  For automatic range these
+               are None until some data were processed.
+    delta   -- width of automatic bins, a power of 2.
+    start   -- index of the first automatic bin, so that lo equals
+               start * delta.
+    vmin, vmax  -- extent of the values in automatic bins.
+    total   -- 1D array of counts from all frames.
+    frames  -- list of 2D arrays of per-frame counts.
+    bykey   -- 2D array of per-key counts, may have unused trailing rows.
+    '''
+
+    delta = None
+    start = 0
+    vmin = None
+    vmax = None
+
+    def __init__(self, lo, hi, bins):
+        self.auto = lo is None and hi is None
+        if (lo is None) != (hi is None):
+            raise ValueError("Both or none of lo, hi must be None.")
+        self.bins = int(bins)
+        if self.auto and self.bins < 2:
+            raise ValueError("Automatic range requires at least 2 bins.")
+        self.lo = None if self.auto else float(lo)
+        self.hi = None if self.auto else float(hi)
+        if not self.auto and not self.lo < self.hi:
+            raise ValueError("Histogram range must have lo < hi.")
+        nb = self.bins + 2
+        self.total = numpy.zeros(nb, dtype=numpy.int64)
+        self.frames = []
+        self.bykey = numpy.zeros((0, nb), dtype=numpy.int64)
+        return
+
+
+    def add(self, idx, kidx, nkeys, perframe, factor=None):
+        """Add counts from bin indices idx of shape (nframes, ...).
+
+        factor is an optional array of per-frame count multipliers.
+        """
+        nb = self.bins + 2
+        nfr = len(idx)
+        self._ensureKeyRows(nkeys)
+        if factor is not None:
+            self._promote()
+        if perframe or factor is not None or (kidx is not None and nfr > 1):
+            idx += (nb * numpy.arange(nfr)).reshape((nfr,) + (1,) *
+                    (idx.ndim - 1))
+            rows = numpy.bincount(idx.reshape(-1), minlength=nfr * nb)
+            rows = rows.reshape(nfr, nb)
+            if factor is not None:
+                rows = rows * factor[:, numpy.newaxis]
+            self.total += rows.sum(axis=0)
+            if perframe:
+                self.frames.append(rows)
+            if kidx is not None:
+                numpy.add.at(self.bykey, kidx, rows)
+        else:
+            cnts = numpy.bincount(idx.reshape(-1), minlength=nb)
+            self.total += cnts
+            if kidx is not None:
+                self.bykey[kidx[0]] += cnts
+        return
+
+
+    def merge(self, other, kidx, nkeys):
+        "Add counts from other _HistogramBins, kidx maps its key rows."
+        if other.auto and other.delta is None:
+            return
+        if self.auto:
+            self.cover(other.vmin, other.vmax, mindelta=other.delta)
+            other = other._rebinnedCopy(self.delta, self.start)
+        if (self.lo, self.hi) != (other.lo, other.hi):
+            raise ValueError("Cannot merge histograms with different bins.")
+        self._ensureKeyRows(nkeys)
+        if other.total.dtype.kind == 'f':
+            self._promote()
+        self.total += other.total
+        self.frames += [a.copy() for a in other.frames]
+        numpy.add.at(self.bykey, kidx, other.bykey[:len(kidx)])
+        return
+
+
+    def cover(self, vmin, vmax, mindelta=None):
+        """Adjust automatic range so that it contains [vmin, vmax].
+
+        vmin, vmax   -- extent of new values.  The range always includes
+                        also the extent of previous values.
+        mindelta     -- optional lower limit for the bin width.
+
+        Bins are shifted when possible and made wider when necessary.
+        """
+        if self.vmin is not None:
+            vmin = min(self.vmin, vmin)
+            vmax = max(self.vmax, vmax)
+        self.vmin, self.vmax = float(vmin), float(vmax)
+        delta = self.delta
+        if delta is None:
+            span = (vmax - vmin) or 1.0
+            delta = 2.0 ** float(numpy.ceil(numpy.log2(span / self.bins)))
+        delta = max(delta, mindelta or delta)
+        while (numpy.floor(vmax / delta) - numpy.floor(vmin / delta) >=
+                self.bins):
+            delta *= 2
+        i0 = int(numpy.floor(vmin / delta))
+        i1 = int(numpy.floor(vmax / delta))
+        if self.delta is None:
+            self.delta, self.start = delta, i0
+        else:
+            start = self.start // int(round(delta / self.delta))
+            start = min(start, i0)
+            start = max(start, i1 - self.bins + 1)
+            self._rebin(delta, start)
+        self.lo = float(self.start * self.delta)
+        self.hi = float((self.start + self.bins) * self.delta)
+        return
+
+
+    def used(self):
+        "Return number of bins up to the last automatic bin with values."
+        if not self.auto or self.delta is None:
+            return self.bins
+        return int(numpy.floor(self.vmax / self.delta)) - self.start + 1
+
+
+    def _rebin(self, delta, start):
+        "Move automatic bin counts to a grid of delta width from start."
+        args = (self.start, self.delta, start, delta, self.bins)
+        self.total = _rebinColumns(self.total, *args)
+        self.frames = [_rebinColumns(a, *args) for a in self.frames]
+        self.bykey = _rebinColumns(self.bykey, *args)
+        self.delta, self.start = delta, start
+        return
+
+
+    def _rebinnedCopy(self, delta, start):
+        "Return copy of automatic bins moved to another grid."
+        import copy
+        rv = copy.copy(self)
+        rv._rebin(delta, start)
+        rv.lo = start * delta
+        rv.hi = (start + rv.bins) * delta
+        return rv
+
+
+    def _promote(self):
+        "Convert integer counts to floating point for weighted counts."
+        if self.total.dtype.kind == 'f':
+            return
+        self.total = self.total.astype(float)
+        self.frames = [a.astype(float) for a in self.frames]
+        self.bykey = self.bykey.astype(float)
+        return
+
+
+    def _ensureKeyRows(self, nkeys):
+        "Make sure bykey has at least nkeys rows."
+        n = len(self.bykey)
+        if n < nkeys:
+            nrows = max(nkeys, 2 * n)
+            a = numpy.zeros((nrows, self.bins + 2), dtype=self.bykey.dtype)
+            a[:n] = self.bykey
+            self.bykey = a
+        return
+
+# End of class _HistogramBins
+
+
+def _rebinColumns(a, start0, delta0, start1, delta1, bins):
+    """Sum histogram columns from one automatic bin grid to another.
+
+    a    -- array with bins + 2 columns including underflow and overflow.
+    start0, delta0   -- first bin index and bin width of the source.
+    start1, delta1   -- first bin index and bin width of the target.
+                        delta1 must be delta0 times a power of 2.
+    bins -- number of bins in the histogram
+
+    Return new array of the same shape as a.
+    """
+    scale = int(round(delta1 / delta0))
+    rv = numpy.zeros_like(a)
+    rv[..., 0] = a[..., 0]
+    rv[..., -1] = a[..., -1]
+    dst = (start0 + numpy.arange(bins)) // scale - start1 + 1
+    inner = a[..., 1:-1]
+    ok = (1 <= dst) & (dst <= bins)
+    if numpy.any(inner[..., ~ok]):
+        raise ValueError("Rebinning would drop histogram counts.")
+    numpy.add.at(rv.T, dst[ok], inner[..., ok].T)
+    return rv
+
+# End of file
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+
+'''Radial and axis profiles of detector images.
+
+ProfileBins holds a precomputed lookup from image pixels to profile bins,
+so that frames are reduced to 1D profiles of per-bin means with a single
+bincount per frame or 3D block of frames.  The lookup is created once
+for a detector geometry:
+
+    bins = radialBins(ccd.toarray(0).shape, center=(512, 520))
+    acc = ccd.integrate(bins, keys=delays)
+    delays, profiles = acc.keyprofiles()
+
+The shape of the lookup must be the shape of the processed frames, i.e.,
+after the ROI and binning of CCDFrames.
+'''
+
+import numpy
+
+
+class ProfileBins(object):
+
+    """Lookup from image pixels to the bins of 1D profiles.
+
+    Data attributes:
+
+    shape    -- shape of the images.
+    centers  -- 1D array of bin centers, e.g., radii in pixels.
+    pixels   -- flat indices of the image pixels included in the bins.
+    bins     -- bin index of every included pixel.
+    npix     -- number of pixels in each bin.
+    """
+
+    def __init__(self, binmap, centers):
+        """Initialize new ProfileBins object.
+
+        binmap   -- integer array of the image shape with the bin index of
+                    every pixel.  Pixels with negative index or index past
+                    the last bin are excluded.
+        centers  -- sequence of the bin centers, which sets the number
+                    of bins.
+        """
+        binmap = numpy.asarray(binmap)
+        self.shape = binmap.shape
+        self.centers = numpy.asarray(centers, dtype=float)
+        flat = binmap.reshape(-1)
+        good = (flat >= 0) & (flat < len(self.centers))
+        self.pixels = numpy.flatnonzero(good)
+        self.bins = flat[self.pixels].astype(numpy.intp)
+        self.npix = numpy.bincount(self.bins, minlength=len(self))
+        self._blockindex = numpy.empty(0, dtype=numpy.intp)
+        return
+
+
+    def __len__(self):
+        return len(self.centers)
+
+
+    def profiles(self, frames):
+        """Return per-bin means of one frame or a block of frames.
+
+        frames   -- 2D array of one frame or 3D array of several frames
+                    stacked along the first axis.
+
+        Return 1D profile for a 2D frame or 2D array of profiles for
+        a 3D block.  Bins without pixels are NaN.
+        """
+        frames = numpy.asarray(frames)
+        single = frames.ndim == 2
+        if single:
+            frames = frames[numpy.newaxis]
+        if frames.shape[1:] != self.shape:
+            emsg = "Frame shape {} does not match profile bins {}.".format(
+                    frames.shape[1:], self.shape)
+            raise ValueError(emsg)
+        nfr, nb = len(frames), len(self)
+        values = frames.reshape(nfr, -1).take(self.pixels, axis=1)
+        sums = numpy.bincount(self._blockIndex(nfr),
+                weights=values.reshape(-1), minlength=nfr * nb)
+        sums = sums.reshape(nfr, nb)
+        rv = numpy.full(sums.shape, numpy.nan)
+        numpy.divide(sums, self.npix, out=rv, where=(self.npix > 0))
+        if single:
+            rv = rv[0]
+        return rv
+
+    # helper methods
+
+    def _blockIndex(self, nfr):
+        "Return flat bincount indices for a block of nfr frames."
+        n = nfr * len(self.bins)
+        if len(self._blockindex) < n:
+            offsets = len(self) * numpy.arange(nfr)
+            idx = self.bins + offsets[:, numpy.newaxis]
+            self._blockindex = idx.reshape(-1)
+        return self._blockindex[:n]
+
+# End of class ProfileBins
+
+
+class ProfileAccumulator(object):
+
+    """Accumulate 1D profiles of frames in a single pass.
+
+    The profiles are averaged over all frames and optionally per key and
+    kept for every frame.  Updates accept the keys, weight and scale
+    arguments of CCDFrames.accumulate.
+
+    Data attributes:
+
+    bins     -- ProfileBins used to compute the profiles.
+    perframe -- flag for keeping the profile of every frame.
+    nframes  -- number of frames processed so far.
+    keys     -- list of unique keys in the order of appearance.
+    """
+
+    nframes = 0
+
+    def __init__(self, bins, perframe=False):
+        """Initialize new ProfileAccumulator object.
+
+        bins     -- ProfileBins for the processed frames.
+        perframe -- keep profile of every frame when True.
+        """
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        self.bins = bins
+        self.perframe = bool(perframe)
+        self.keys = []
+        self._all = MeanVarianceAccumulator()
+        self._bykey = {}
+        self._frames = []
+        return
+
+
+    def update(self, frames, keys=None, weight=None, scale=None):
+        """Add profiles of one frame or a 3D block of frames.
+
+        frames   -- 2D array of one frame or 3D array of several frames
+                    stacked along the first axis.
+        keys     -- optional key for every frame, for example a delay bin.
+                    Must be a single value for a 2D frame.
+        weight, scale -- optional per-frame weights and normalization
+                    factors, see MeanVarianceAccumulator.update.
+
+        No return value.
+        """
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        frames = numpy.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[numpy.newaxis]
+            if keys is not None:
+                keys = [keys]
+        nfr = len(frames)
+        if keys is not None and len(keys) != nfr:
+            emsg = "keys must be of the same length as frames."
+            raise ValueError(emsg)
+        if not nfr:
+            return
+        # profiles are accumulated as 3D blocks of (nfr, bins, 1) shape
+        prof = self.bins.profiles(frames)[..., numpy.newaxis]
+        w, s = [None if x is None else
+                numpy.broadcast_to(numpy.asarray(x, dtype=float), (nfr,))
+                for x in (weight, scale)]
+        self._all.update(prof, w, s)
+        if self.perframe:
+            p = prof[..., 0]
+            self._frames.append(p if s is None else p * s[:, numpy.newaxis])
+        if keys is not None:
+            kidx = {}
+            for i, k in enumerate(keys):
+                kidx.setdefault(k, []).append(i)
+            for k, idx in kidx.items():
+                if k not in self._bykey:
+                    self.keys.append(k)
+                    self._bykey[k] = MeanVarianceAccumulator()
+                self._bykey[k].update(prof[idx],
+                        None if w is None else w[idx],
+                        None if s is None else s[idx])
+        self.nframes += nfr
+        return
+
+
+    def merge(self, other):
+        """Add profiles from another ProfileAccumulator.
+
+        other    -- ProfileAccumulator with the same bins and perframe
+                    flag.  Per-frame profiles of other are appended after
+                    the frames in this accumulator.
+
+        No return value.
+        """
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        if (self.bins.shape != other.bins.shape or
+                len(self.bins) != len(other.bins) or
+                self.perframe != other.perframe):
+            emsg = "Cannot merge accumulators with different configuration."
+            raise ValueError(emsg)
+        self._all.merge(other._all)
+        for k in other.keys:
+            if k not in self._bykey:
+                self.keys.append(k)
+                self._bykey[k] = MeanVarianceAccumulator()
+            self._bykey[k].merge(other._bykey[k])
+        self._frames += [p.copy() for p in other._frames]
+        self.nframes += other.nframes
+        return
+
+
+    def profile(self):
+        """Return mean profile of all frames.
+
+        Return 1D array, which is empty when no frames were processed.
+        """
+        acc = self._all
+        return acc.mean[:, 0].copy() if acc.count else numpy.zeros(0)
+
+
+    def variance(self, ddof=0):
+        """Return variance of the frame profiles in every bin.
+
+        ddof     -- delta degrees of freedom, see
+                    MeanVarianceAccumulator.variance.
+
+        Return 1D array.
+        """
+        acc = self._all
+        return acc.variance(ddof)[:, 0] if acc.count else numpy.zeros(0)
+
+
+    def frameprofiles(self):
+        """Return profiles of every processed frame.
+
+        Return 2D array of shape (nframes, bins).
+        """
+        if not self.perframe:
+            raise ValueError("Per-frame profiles are not accumulated.")
+        rv = numpy.concatenate(
+                [numpy.empty((0, len(self.bins)))] + self._frames)
+        return rv
+
+
+    def keyprofiles(self):
+        """Return mean profiles accumulated per each key.
+
+        Return a tuple of (keys, profiles), where profiles is a 2D array
+        of shape (len(keys), bins).
+        """
+        rv = numpy.empty((len(self.keys), len(self.bins)))
+        for i, k in enumerate(self.keys):
+            rv[i] = self._bykey[k].mean[:, 0]
+        return (list(self.keys), rv)
+
+# End of class ProfileAccumulator
+
+
+def radialBins(shape, center, binwidth=1.0, rmax=None, mask=None,
+        pixelsize=None, distance=None):
+    '''Create ProfileBins for azimuthal integration around a center.
+
+    shape        -- shape of the processed frames.
+    center       -- (row, column) position of the beam center in pixels,
+                    may lie outside of the image.
+    binwidth     -- width of the radial bins in pixels or in degrees
+                    of the scattering angle when distance is specified.
+    rmax         -- optional upper limit of the bins in the same units.
+                    Use the largest radius in the image when None.
+    mask         -- optional boolean array of the image shape, which
+                    is True for the pixels to be excluded.
+    pixelsize    -- pixel size in the same units as distance.
+    distance     -- sample to detector distance.  When specified, the
+                    bins are in the scattering angle 2-theta in degrees
+                    for a detector perpendicular to the beam.
+
+    Return ProfileBins with the bin centers in pixels or degrees.
+    '''
+    y, x = numpy.indices(shape, dtype=float)
+    r = numpy.hypot(y - center[0], x - center[1])
+    if distance is not None:
+        if pixelsize is None:
+            emsg = "pixelsize is required for bins in scattering angle."
+            raise ValueError(emsg)
+        r = numpy.degrees(numpy.arctan2(r * pixelsize, distance))
+    if rmax is None:
+        nbins = int(r.max() // binwidth) + 1
+    else:
+        nbins = max(1, int(numpy.ceil(rmax / binwidth)))
+    binmap = numpy.floor(r / binwidth).astype(numpy.intp)
+    if mask is not None:
+        binmap[numpy.asarray(mask, dtype=bool)] = -1
+    centers = (numpy.arange(nbins) + 0.5) * binwidth
+    rv = ProfileBins(binmap, centers)
+    return rv
+
+
+def axisBins(shape, axis=0, binwidth=1, mask=None):
+    '''Create ProfileBins for a profile along a detector axis.
+
+    shape        -- shape of the processed frames.
+    axis         -- 0 for a profile along rows, i.e., averaged over
+                    columns, or 1 for a profile along columns.
+    binwidth     -- integer number of rows or columns in one bin.
+    mask         -- optional boolean array of the image shape, which
+                    is True for the pixels to be excluded.
+
+    Return ProfileBins with the bin centers in pixels.
+    '''
+    if axis not in (0, 1):
+        emsg = "axis must be 0 or 1."
+        raise ValueError(emsg)
+    n = shape[axis]
+    nbins = -(-n // binwidth)
+    pos = numpy.indices(shape)[axis]
+    binmap = pos // binwidth
+    if mask is not None:
+        binmap[numpy.asarray(mask, dtype=bool)] = -1
+    centers = numpy.arange(nbins) * binwidth + (binwidth - 1) / 2.0
+    rv = ProfileBins(binmap, centers)
+    return rv
+
+# End of file
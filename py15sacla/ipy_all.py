@@ -4,10 +4,44 @@
 This can be used from IPython as
 
 from py15sacla.ipy_all import *
+
+The exported names are module attributes that are loaded on first use,
+so that "from py15sacla.ipy_all import findfiles" does not import the
+CCDFrames machinery with NumPy and h5py.  The star import binds all
+names and thus loads every module in the table below.
 '''
 
-from py15sacla.ccdframes import CCDFrames
-from py15sacla.hdfselection import HDFSelection
-from py15sacla.utils import getDetectorConfig, getHDFArray, getHDFDataset
-from py15sacla.utils import unique_ordered, ordered_unique
-from py15sacla.utils import eqbinhistogram, findfiles
+# Exported names and the modules that define them.
+_LAZY = {
+    'CCDFrames' : 'py15sacla.ccdframes',
+    'HDFSelection' : 'py15sacla.hdfselection',
+    'getDetectorConfig' : 'py15sacla.utils',
+    'getHDFArray' : 'py15sacla.utils',
+    'getHDFDataset' : 'py15sacla.utils',
+    'unique_ordered' : 'py15sacla.utils',
+    'ordered_unique' : 'py15sacla.utils',
+    'eqbinhistogram' : 'py15sacla.utils',
+    'findfiles' : 'py15sacla.utils',
+    'radialBins' : 'py15sacla.integration',
+    'axisBins' : 'py15sacla.integration',
+    'pumpProbeRun' : 'py15sacla.pumpprobe',
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    "Import and return a lazily loaded attribute of this module."
+    import importlib
+    if name not in _LAZY:
+        emsg = "module {!r} has no attribute {!r}".format(__name__, name)
+        raise AttributeError(emsg)
+    rv = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = rv
+    return rv
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+# End of file
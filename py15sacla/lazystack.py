@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+'''Lazily evaluated stack of processed frames.
+
+LazyFrameStack behaves like the 3D array from CCDFrames.toarray, but
+frames are processed only when needed and streamed in chunks, so that
+slicing and reductions work for runs that do not fit in memory:
+
+    stack = ccd.toarray(slice(None), lazy=True)
+    roi = stack[:, 100:120, 30:50]          # reads all frames, keeps ROI
+    profile = stack.sum(axis=(1, 2))        # one value per frame
+    image = stack.mean(axis=0)
+
+The stack can be also evaluated once into a memory-mapped .npy file,
+which is then used for all further operations.
+'''
+
+import numpy
+
+
+class LazyFrameStack(object):
+
+    """Stack of processed frames of CCDFrames evaluated on demand.
+
+    Indexing returns NumPy arrays.  The first index selects frames,
+    the remaining indices are applied to every chunk of frames, so that
+    only the selected values are kept in memory.
+
+    Data attributes:
+
+    ccd          -- CCDFrames that produce the frames.
+    indices      -- array of frame indices in the ccd selection.
+    chunksize    -- number of frames processed at once.
+    shape        -- shape of the stack as a tuple.
+    dtype        -- data type of the frames as in CCDFrames.toarray.
+    """
+
+    def __init__(self, ccd, indices, chunksize=64):
+        """Initialize new LazyFrameStack.
+
+        ccd          -- CCDFrames that produce the frames.
+        indices      -- integer indices of the stacked frames.
+        chunksize    -- number of frames processed at once.
+        """
+        from py15sacla.binning import binnedShape
+        if chunksize < 1:
+            emsg = "chunksize must be at least 1."
+            raise ValueError(emsg)
+        self.ccd = ccd
+        self.indices = numpy.asarray(indices, dtype=int).reshape(-1)
+        self.chunksize = chunksize
+        self.dtype = numpy.dtype(ccd.cdtype or float)
+        fshape = (0, 0)
+        if len(self.indices):
+            dd = ccd.selection[int(self.indices[0])]
+            fshape = numpy.empty(dd.shape, dtype=bool)[ccd.croislice].shape
+            fshape = binnedShape(fshape, ccd.cbinning)
+        self.shape = (len(self.indices),) + tuple(fshape)
+        self._spilled = None
+        return
+
+
+    def __len__(self):
+        return len(self.indices)
+
+
+    def __repr__(self):
+        rv = "<LazyFrameStack shape={} dtype={}{}>".format(
+                self.shape, self.dtype,
+                ' spilled' if self._spilled is not None else '')
+        return rv
+
+
+    def __iter__(self):
+        "Iterate over 2D frames of the stack."
+        for pos, block in self._blocks(numpy.arange(len(self))):
+            for a in block:
+                yield a
+        pass
+
+
+    def __array__(self, dtype=None, copy=None):
+        return numpy.asarray(self[:], dtype=dtype)
+
+
+    def __getitem__(self, key):
+        """Return frames or values selected by a NumPy-style index.
+
+        key      -- index of the 3D stack.  Integer, slice, integer array
+                    or boolean flags select the frames.  The remaining
+                    items of a tuple index are applied to each frame.
+
+        Return NumPy array.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis or k is None for k in key):
+            emsg = "Ellipsis and newaxis are not supported."
+            raise IndexError(emsg)
+        k0, rest = key[0], key[1:]
+        isadvanced = lambda k: not isinstance(k, (slice, int, numpy.integer))
+        if isadvanced(k0) and any(isadvanced(k) for k in rest):
+            emsg = ("Array indices of frames cannot be combined with "
+                    "array indices of pixels.")
+            raise IndexError(emsg)
+        if isinstance(k0, (int, numpy.integer)):
+            pos = numpy.arange(len(self))[[k0]]
+            block = next(self._blocks(pos))[1]
+            return block[(0,) + rest]
+        pos = numpy.arange(len(self))[k0]
+        parts = [block[(slice(None),) + rest]
+                for p, block in self._blocks(pos)]
+        if not parts:
+            empty = numpy.empty((0,) + self.shape[1:], dtype=self.dtype)
+            return empty[(slice(None),) + rest]
+        return numpy.concatenate(parts)
+
+
+    def sum(self, axis=None, dtype=None):
+        """Sum of stacked values over the given axes.
+
+        axis     -- None, integer or tuple of integers as in numpy.sum.
+        dtype    -- optional type of the accumulator.
+
+        Return NumPy array or scalar.
+        """
+        rv = self._reduce(lambda b, ax: b.sum(axis=ax, dtype=dtype),
+                numpy.add, axis)
+        return rv
+
+
+    def mean(self, axis=None):
+        """Mean of stacked values over the given axes.
+
+        axis     -- None, integer or tuple of integers as in numpy.mean.
+
+        Return NumPy array or scalar.
+        """
+        axes = self._axes(axis)
+        n = int(numpy.prod([self.shape[i] for i in axes]))
+        rv = self.sum(axis=axis, dtype=float)
+        return rv / n if n else rv * numpy.nan
+
+
+    def min(self, axis=None):
+        "Minimum of stacked values over the given axes."
+        return self._reduce(lambda b, ax: b.min(axis=ax),
+                numpy.minimum, axis)
+
+
+    def max(self, axis=None):
+        "Maximum of stacked values over the given axes."
+        return self._reduce(lambda b, ax: b.max(axis=ax),
+                numpy.maximum, axis)
+
+
+    def spill(self, filename):
+        """Evaluate all frames into a memory-mapped .npy file.
+
+        filename -- path to the output file, which is overwritten.
+                    All further operations read from that file.
+
+        No return value.
+        """
+        from numpy.lib.format import open_memmap
+        mm = open_memmap(filename, mode='w+', dtype=self.dtype,
+                shape=self.shape)
+        self._spilled = None
+        for pos, block in self._blocks(numpy.arange(len(self))):
+            mm[pos] = block
+        mm.flush()
+        del mm
+        self._spilled = numpy.load(filename, mmap_mode='r')
+        return
+
+    # helper methods
+
+    def _axes(self, axis):
+        "Return tuple of non-negative axes for a reduction."
+        if axis is None:
+            return (0, 1, 2)
+        if not isinstance(axis, tuple):
+            axis = (axis,)
+        rv = set()
+        for a in axis:
+            if not -3 <= a < 3:
+                emsg = "axis {} is out of bounds for 3D stack.".format(a)
+                raise ValueError(emsg)
+            rv.add(a % 3)
+        return tuple(sorted(rv))
+
+
+    def _reduce(self, fchunk, fcombine, axis):
+        """Reduce chunks with fchunk and combine the partial results.
+
+        Partial results along the frame axis are combined by fcombine,
+        otherwise concatenated.
+        """
+        axes = self._axes(axis)
+        parts = [fchunk(block, axes)
+                for pos, block in self._blocks(numpy.arange(len(self)))]
+        if not parts:
+            return fchunk(numpy.empty(self.shape, dtype=self.dtype), axes)
+        if 0 not in axes:
+            return numpy.concatenate(parts)
+        rv = parts[0]
+        for p in parts[1:]:
+            rv = fcombine(rv, p)
+        return rv
+
+
+    def _blocks(self, positions):
+        """Generate processed frames at positions of the stack in chunks.
+
+        positions    -- array of positions in this stack.
+
+        Frames in increasing order are streamed from a single generate
+        pass.  Other orders process a new subset for every chunk.
+
+        Yield tuples of (positions_chunk, 3D_array).
+        """
+        n = self.chunksize
+        findices = self.indices[positions]
+        ordered = not numpy.any(numpy.diff(findices) < 0)
+        if self._spilled is None and ordered:
+            for rv in self._streamBlocks(positions):
+                yield rv
+            return
+        for i in range(0, len(positions), n):
+            pos = positions[i:i + n]
+            if self._spilled is not None:
+                yield pos, numpy.asarray(self._spilled[pos])
+                continue
+            uidx, inverse = numpy.unique(findices[i:i + n],
+                    return_inverse=True)
+            frames = numpy.array(list(self.ccd._subset(uidx).generate()),
+                    dtype=self.dtype)
+            yield pos, frames[inverse.reshape(-1)]
+        pass
+
+
+    def _streamBlocks(self, positions):
+        """Generate chunks of frames in increasing order from one pass.
+
+        positions    -- array of positions in this stack, where the frame
+                        indices do not decrease.
+
+        Yield tuples of (positions_chunk, 3D_array).
+        """
+        n = self.chunksize
+        uidx, inverse = numpy.unique(self.indices[positions],
+                return_inverse=True)
+        inverse = inverse.reshape(-1)
+        frames = self.ccd._subset(uidx).generate()
+        done = 0
+        last = None
+        try:
+            for i in range(0, len(positions), n):
+                inv = inverse[i:i + n]
+                lo = inv[0]
+                # the first frame may repeat the last one of previous chunk
+                chunk = [] if lo == done else [last]
+                chunk += [next(frames) for k in range(done, inv[-1] + 1)]
+                done = inv[-1] + 1
+                last = chunk[-1]
+                block = numpy.array(chunk, dtype=self.dtype)
+                yield positions[i:i + n], block[inv - lo]
+        finally:
+            frames.close()
+        pass
+
+# End of class LazyFrameStack
+
+# End of file
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+'''Machine-readable throughput metrics of compressed runs.
+
+Every processed run appends one JSON object per line to a metrics log,
+by default "metrics.jsonl" in the log directory of the batch.  A record
+has the keys
+
+    run, ok, error      run number and outcome
+    host, pid           machine and process that wrote the record
+    started             local start time as "YYYY-MM-DDTHH:MM:SS"
+    walltime            wall time of the run in seconds
+    infile, insize      input file and its size in bytes
+    nframes, bytes      number of frames and bytes of frames read
+    frames_per_s        nframes / walltime
+    mb_per_s            bytes read in MB per second of walltime
+    peak_rss_mb         peak resident memory of the processing process
+    stages              dictionary of seconds spent in processing stages,
+                        see py15sacla.profiling
+
+The records from many jobs are aggregated with summarizeMetrics, which
+is also available as the "py15sacla metrics" command.
+'''
+
+import os
+import json
+
+# Name of the metrics log in the batch log directory.
+METRICS_FILE = 'metrics.jsonl'
+
+
+def runRecord(run, infile, stats, walltime, ok=True, error=None,
+        started=None):
+    '''Create metrics record of one processed run.
+
+    run          -- run number.
+    infile       -- input HDF5 file of the run.
+    stats        -- ProfileStats collected while processing the run.
+    walltime     -- wall time of the run in seconds.
+    ok           -- True when the run was processed successfully.
+    error        -- error message of a failed run.
+    started      -- start time in seconds since the epoch.  Use now
+                    minus walltime when None.
+
+    Return dictionary with plain Python values.
+    '''
+    import time
+    import socket
+    if started is None:
+        started = time.time() - walltime
+    nframes = stats.counters.get('frames', 0)
+    nbytes = stats.counters.get('bytes', 0)
+    rate = 1.0 / walltime if walltime > 0 else 0.0
+    rss = stats.peaks.get('rss', peakRSS())
+    rv = {
+        'run' : run,
+        'ok' : bool(ok),
+        'error' : error,
+        'host' : socket.gethostname(),
+        'pid' : os.getpid(),
+        'started' : time.strftime('%Y-%m-%dT%H:%M:%S',
+                                  time.localtime(started)),
+        'walltime' : walltime,
+        'infile' : infile,
+        'insize' : os.path.getsize(infile) if os.path.isfile(infile) else 0,
+        'nframes' : nframes,
+        'bytes' : nbytes,
+        'frames_per_s' : nframes * rate,
+        'mb_per_s' : nbytes / 1e6 * rate,
+        'peak_rss_mb' : rss / 1e6,
+        'stages' : dict(stats.times),
+    }
+    return rv
+
+
+def appendMetrics(filename, record):
+    '''Append metrics record as one line to a JSON-lines log.
+
+    filename     -- path to the metrics log, which is created if needed.
+    record       -- dictionary from runRecord.
+
+    The line is written with a single call in the append mode, so that
+    records of concurrent processes do not interleave.
+
+    No return value.
+    '''
+    line = json.dumps(record, sort_keys=True) + '\n'
+    fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+    return
+
+
+def readMetrics(filenames):
+    '''Read metrics records from JSON-lines logs.
+
+    filenames    -- list of metrics log files or a single filename.
+                    Lines that are not valid JSON objects are skipped,
+                    for example a partial line of a killed job.
+
+    Return a list of record dictionaries in the file order.
+    '''
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    rv = []
+    for fn in filenames:
+        with open(fn) as fp:
+            for line in fp:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and 'run' in rec:
+                    rv.append(rec)
+    return rv
+
+
+def summarizeMetrics(records, by='host', slow=0.5):
+    '''Return printable summary of metrics records.
+
+    records      -- list of record dictionaries from readMetrics.
+    by           -- record key for grouping, e.g., "host" or "infile".
+                    The input directory is used for "indir".
+    slow         -- fraction of the median frame rate below which
+                    successful runs are listed as slow.
+
+    Return string with a table of per-group throughput, percentages of
+    time in the stages of the main and read-ahead threads, and a list of
+    slow and failed runs.
+    '''
+    import collections
+    import numpy
+    groups = collections.OrderedDict()
+    for rec in records:
+        key = (os.path.dirname(rec.get('infile') or '') if by == 'indir'
+               else rec.get(by))
+        groups.setdefault(key, []).append(rec)
+    fmt = '{:24s} {:>5s} {:>6s} {:>9s} {:>9s} {:>8s} {:>9s}'
+    lines = [fmt.format(by, 'runs', 'failed', 'frames',
+                        'frames/s', 'MB/s', 'peak MB')]
+    fmt = '{:24s} {:>5d} {:>6d} {:>9d} {:>9.1f} {:>8.1f} {:>9.0f}'
+    for key, recs in groups.items():
+        good = [r for r in recs if r['ok']]
+        nframes = sum(r['nframes'] for r in good)
+        walltime = sum(r['walltime'] for r in good)
+        nbytes = sum(r['bytes'] for r in good)
+        rate = 1.0 / walltime if walltime > 0 else 0.0
+        lines.append(fmt.format(str(key)[-24:], len(recs),
+            len(recs) - len(good), nframes, nframes * rate,
+            nbytes / 1e6 * rate,
+            max([r['peak_rss_mb'] for r in recs] or [0])))
+    # stages of the read-ahead thread overlap with the main thread
+    stages = collections.Counter()
+    for rec in records:
+        stages.update(rec.get('stages', {}))
+    threads = [('time in stages:', collections.Counter()),
+               ('time in prefetch thread stages:', collections.Counter())]
+    for name, t in stages.items():
+        threads[name.startswith('prefetch ')][1][name] = t
+    for title, tstages in threads:
+        if not tstages:
+            continue
+        total = sum(tstages.values()) or 1.0
+        lines.append('')
+        lines.append(title)
+        for name, t in tstages.most_common():
+            lines.append('  {:22s} {:10.1f} s {:6.1f}%'.format(
+                name, t, 100.0 * t / total))
+    good = [r for r in records if r['ok'] and r['nframes']]
+    if good:
+        median = numpy.median([r['frames_per_s'] for r in good])
+        slowruns = [r for r in good if r['frames_per_s'] < slow * median]
+        if slowruns:
+            lines.append('')
+            lines.append('slow runs below {:.0%} of median {:.1f} '
+                         'frames/s:'.format(slow, median))
+        for r in slowruns:
+            lines.append('  run {} on {}: {:.1f} frames/s, {}'.format(
+                r['run'], r['host'], r['frames_per_s'], r['infile']))
+    failed = [r for r in records if not r['ok']]
+    if failed:
+        lines.append('')
+        lines.append('failed runs:')
+    for r in failed:
+        lines.append('  run {} on {}: {}'.format(
+            r['run'], r['host'], r['error']))
+    return '\n'.join(lines)
+
+
+def peakRSS():
+    '''Return peak resident memory of this process in bytes.
+
+    Return 0 when not available on this platform.
+    '''
+    import sys
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    rv = rss if sys.platform == 'darwin' else rss * 1024
+    return rv
+
+# End of file
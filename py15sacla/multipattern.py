@@ -95,7 +95,7 @@ class MultiPattern(object):
             # apply validators while things are matching
             validators = self.re_validators.get(rx, [])
             for validate in validators:
-                anymatchvalid = filter(validate, mxlist)
+                anymatchvalid = any(validate(mx) for mx in mxlist)
                 ismatch = ismatch and anymatchvalid
         return bool(ismatch)
 
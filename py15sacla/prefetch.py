@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+'''Read-ahead of detector frames on a background thread.
+
+FramePrefetcher reads the next few frames of a selection on a thread
+while the caller processes the current one, so that file system latency
+overlaps with NumPy computations.  Frames are read into a small pool of
+reusable buffers, which are recycled when the caller requests the next
+frame.  The detector configuration is looked up on the same thread, so
+that the caller does not access the HDF file at all.
+'''
+
+import threading
+
+# Timeout in seconds for waiting on the queues before checking if the
+# prefetcher was closed.
+_POLL = 0.1
+
+
+class FramePrefetcher(object):
+
+    """Iterator over raw frames of a selection that reads ahead.
+
+    Every item is a tuple of (name, shape, config, data), where name is
+    the dataset name, shape the full shape of the frame, config the
+    dictionary from getDetectorConfig and data the array of frame values
+    in the region of interest.  The data array is reused after the next
+    item is requested and must be copied if needed for longer.
+
+    Data attributes:
+
+    selection    -- HDFSelection of the frames.
+    roi          -- tuple of slices for the region of interest.
+    depth        -- maximum number of frames read ahead.
+    """
+
+    def __init__(self, selection, roi=(), depth=4, start=0, prof=None):
+        """Start reading frames on a background thread.
+
+        selection    -- HDFSelection of the frames.
+        roi          -- tuple of slices for the region of interest.
+        depth        -- maximum number of frames read ahead, at least 1.
+        start        -- index of the first frame to be read.
+        prof         -- optional ProfileStats for timing the reads on
+                        the background thread.
+        """
+        import queue
+        if depth < 1:
+            emsg = "depth must be at least 1."
+            raise ValueError(emsg)
+        self.selection = selection
+        self.roi = roi
+        self.depth = depth
+        self._prof = prof
+        self._names = selection.names[start:]
+        self._ready = queue.Queue(depth)
+        self._free = queue.Queue()
+        self._current = None
+        self._nbuffers = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._readFrames)
+        self._thread.daemon = True
+        self._thread.start()
+        return
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        """Return the next (name, shape, config, data) tuple.
+
+        Recycle the data buffer of the previous item.
+        """
+        self._release()
+        item = self._get(self._ready)
+        if item is None:
+            self.close()
+            raise StopIteration
+        if isinstance(item, BaseException):
+            self.close()
+            raise item
+        self._current = item
+        return item
+
+
+    def close(self):
+        "Stop the background thread and release its buffers."
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._current = None
+        return
+
+    # helper methods
+
+    def _release(self):
+        "Return the data buffer of the current item to the pool."
+        if self._current is not None:
+            self._free.put(self._current[3])
+            self._current = None
+        return
+
+
+    def _get(self, q):
+        "Get item from a queue, return None if closed while waiting."
+        import queue
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                pass
+        return None
+
+
+    def _put(self, item):
+        "Put item to the ready queue, return False if closed meanwhile."
+        import queue
+        while not self._stop.is_set():
+            try:
+                self._ready.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+    def _readFrames(self):
+        "Read frames into pooled buffers until done or closed."
+        import time
+        import numpy
+        from py15sacla.utils import getDetectorConfig
+        hdffile = self.selection.hdffile
+        prof = self._prof
+        shape0 = None
+        try:
+            for name in self._names:
+                t = prof and time.perf_counter()
+                dd = hdffile[name]
+                if prof is not None:
+                    t = prof.lap('prefetch open', t)
+                if shape0 is None:
+                    shape0, dtype0 = dd.shape, dd.dtype
+                    bshape = numpy.empty(shape0, dtype=bool)[self.roi].shape
+                if dd.shape != shape0 or dd.dtype != dtype0:
+                    buf = dd[self.roi]
+                else:
+                    buf = self._buffer(bshape, dtype0)
+                    if buf is None:
+                        return
+                    if prof is not None:
+                        t = prof.lap('prefetch idle', t)
+                    dd.read_direct(buf, source_sel=self.roi or None)
+                if prof is not None:
+                    t = prof.lap('prefetch read', t)
+                item = (name, dd.shape, getDetectorConfig(dd), buf)
+                if prof is not None:
+                    t = prof.lap('prefetch config', t)
+                if not self._put(item):
+                    return
+                if prof is not None:
+                    prof.lap('prefetch idle', t)
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(None)
+        return
+
+
+    def _buffer(self, shape, dtype):
+        """Return a free buffer from the pool or allocate a new one.
+
+        Return None if closed while waiting.
+        """
+        import numpy
+        if self._nbuffers <= self.depth:
+            self._nbuffers += 1
+            return numpy.empty(shape, dtype=dtype)
+        buf = self._get(self._free)
+        if buf is not None and (buf.shape != shape or buf.dtype != dtype):
+            buf = numpy.empty(shape, dtype=dtype)
+        return buf
+
+# End of class FramePrefetcher
+
+# End of file
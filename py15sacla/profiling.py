@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+'''Optional timing breakdown of HDFSelection and CCDFrames operations.
+
+Instrumentation is active only inside the profile context manager, which
+collects timings of the processing stages and event counters into
+a ProfileStats object:
+
+    with ccd.profile() as stats:
+        ccd.mean()
+    print(stats)
+
+The stages measured in the calling thread do not overlap, so that their
+times add up to at most the elapsed wall time.  Stages that run on the
+read-ahead thread of FramePrefetcher have the "prefetch" prefix and
+overlap with the stages of the calling thread.  When profiling is not
+active, every instrumented operation only checks that active() is None.
+'''
+
+import time
+import threading
+import contextlib
+
+# ProfileStats of the active profile context or None.
+_active = None
+
+
+class ProfileStats(object):
+
+    """Timings of processing stages and event counters.
+
+    Data attributes:
+
+    times        -- dictionary of total seconds spent in each stage.
+    calls        -- dictionary of the number of calls of each stage.
+    counters     -- dictionary of event counts, for example the number
+                    of processed frames or bytes read from the files.
+    peaks        -- dictionary of maximum values, e.g., of memory use.
+    elapsed      -- wall time in seconds of the profile context.
+    """
+
+    def __init__(self):
+        import collections
+        self.times = collections.OrderedDict()
+        self.calls = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+        self.peaks = collections.OrderedDict()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        return
+
+
+    def __str__(self):
+        return self.report()
+
+
+    def __getstate__(self):
+        rv = self.__dict__.copy()
+        del rv['_lock']
+        return rv
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        return
+
+
+    def add(self, stage, seconds):
+        """Add time spent in a processing stage.
+
+        stage    -- name of the stage.
+        seconds  -- time in seconds.
+
+        No return value.
+        """
+        with self._lock:
+            self.times[stage] = self.times.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+        return
+
+
+    def lap(self, stage, t0):
+        """Add time from t0 until now to a stage.
+
+        stage    -- name of the stage.
+        t0       -- start time from time.perf_counter.
+
+        Return the current time for timing the next stage.
+        """
+        now = time.perf_counter()
+        self.add(stage, now - t0)
+        return now
+
+
+    def count(self, name, n=1):
+        """Increment an event counter.
+
+        name     -- name of the counter.
+        n        -- increment, by default 1.
+
+        No return value.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        return
+
+
+    def peak(self, name, value):
+        """Record maximum of a quantity.
+
+        name     -- name of the quantity.
+        value    -- observed value, which is kept if it is the largest.
+
+        No return value.
+        """
+        with self._lock:
+            self.peaks[name] = max(value, self.peaks.get(name, value))
+        return
+
+
+    def merge(self, other):
+        """Add timings and counters of another ProfileStats.
+
+        other    -- ProfileStats, for example from a worker process.
+                    Its elapsed time is added to elapsed.
+
+        No return value.
+        """
+        with self._lock:
+            for stage, t in other.times.items():
+                self.times[stage] = self.times.get(stage, 0.0) + t
+                self.calls[stage] = (self.calls.get(stage, 0) +
+                        other.calls[stage])
+            for name, n in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for name, value in other.peaks.items():
+                self.peaks[name] = max(value, self.peaks.get(name, value))
+            self.elapsed += other.elapsed
+        return
+
+
+    def report(self):
+        "Return string table of the stage timings and counters."
+        lines = ["elapsed {:.4f} s".format(self.elapsed)]
+        wall = self.elapsed or sum(self.times.values()) or 1.0
+        fmt = "  {:20s} {:10.4f} s {:6.1f}% {:10d} calls"
+        for stage in sorted(self.times, key=self.times.get, reverse=True):
+            t = self.times[stage]
+            lines.append(fmt.format(stage, t, 100.0 * t / wall,
+                self.calls[stage]))
+        for name, n in self.counters.items():
+            lines.append("  {:20s} {:10d}".format(name, n))
+        for name, value in self.peaks.items():
+            lines.append("  {:20s} {:10g} peak".format(name, value))
+        rv = '\n'.join(lines)
+        return rv
+
+# End of class ProfileStats
+
+
+def active():
+    "Return ProfileStats of the active profile context or None."
+    return _active
+
+
+@contextlib.contextmanager
+def profile(stats=None):
+    '''Activate instrumentation in a with block.
+
+    stats    -- optional ProfileStats to be updated, for example, to
+                accumulate several blocks.  Use a new ProfileStats
+                when None.
+
+    The context value is ProfileStats, which is updated by all
+    instrumented operations in the block including those in other
+    threads.  Nested contexts collect into the innermost stats only.
+    '''
+    global _active
+    stats = ProfileStats() if stats is None else stats
+    outer = _active
+    _active = stats
+    t0 = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.elapsed += time.perf_counter() - t0
+        _active = outer
+    pass
+
+# End of file
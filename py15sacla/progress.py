@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+'''Progress reports and early stopping of long reductions.
+
+A reduction over processed frames updates an accumulator and reports
+a Progress snapshot to a callback at regular time intervals.  A stop
+criterion is a function of the same snapshot that ends the reduction
+early when it returns True, for example
+
+    ccd.mean(callback=print, stop=relativeErrorBelow(0.05))
+'''
+
+import time
+
+
+class Progress(object):
+
+    """Snapshot of a running reduction.
+
+    Data attributes:
+
+    acc          -- accumulator of the processed frames.
+    nframes      -- number of frames processed so far.
+    total        -- number of frames in the complete reduction.
+    elapsed      -- wall time in seconds since the start.
+    stopped      -- True when the stop criterion ended the reduction.
+    """
+
+    def __init__(self, acc, total):
+        """Initialize Progress at the start of a reduction.
+
+        acc          -- accumulator of the processed frames.
+        total        -- number of frames in the complete reduction.
+        """
+        self.acc = acc
+        self.nframes = 0
+        self.total = total
+        self.elapsed = 0.0
+        self.stopped = False
+        self._t0 = time.time()
+        self._reported = None
+        return
+
+
+    def __str__(self):
+        rv = "{}/{} frames, {:.1f} s elapsed, ETA {:.1f} s".format(
+                self.nframes, self.total, self.elapsed, self.eta)
+        if self.stopped:
+            rv += ", stopped"
+        return rv
+
+
+    def tick(self, interval):
+        """Count one processed frame and check if a report is due.
+
+        interval     -- minimum time in seconds between reports.
+
+        Return True when interval has passed since the last report.
+        """
+        self.nframes += 1
+        self.elapsed = time.time() - self._t0
+        last = 0.0 if self._reported is None else self._reported[1]
+        rv = self.elapsed - last >= interval
+        if rv:
+            self._reported = (self.nframes, self.elapsed)
+        return rv
+
+
+    def isreported(self):
+        "Return True when the current state was already reported."
+        return (self._reported is not None and
+                self._reported[0] == self.nframes)
+
+    # properties
+
+    @property
+    def fraction(self):
+        "Fraction of the frames processed so far."
+        return self.nframes / max(1, self.total)
+
+
+    @property
+    def eta(self):
+        "Estimated time in seconds until all frames are processed."
+        if not self.nframes:
+            return float('inf')
+        return self.elapsed / self.nframes * (self.total - self.nframes)
+
+# End of class Progress
+
+
+def relativeErrorBelow(limit, fraction=1.0, minframes=10):
+    '''Create stop criterion for the relative error of per-pixel means.
+
+    limit        -- maximum relative standard error of the mean, i.e.,
+                    sqrt(variance / nframes) / abs(mean).
+    fraction     -- fraction of pixels that must be below limit.  Only
+                    pixels with a nonzero mean are considered.
+    minframes    -- minimum number of frames before stopping.
+
+    Return function of Progress for reductions with
+    MeanVarianceAccumulator.
+    '''
+    import numpy
+    def stop(progress):
+        acc = progress.acc
+        if acc.count < max(2, minframes):
+            return False
+        mean = numpy.fabs(acc.mean)
+        nonzero = mean > 0
+        if not nonzero.any():
+            return False
+        sem = numpy.sqrt(acc.variance(ddof=1)[nonzero] /
+                acc.effectiveCount())
+        good = numpy.count_nonzero(sem <= limit * mean[nonzero])
+        return good >= fraction * numpy.count_nonzero(nonzero)
+    return stop
+
+# End of file
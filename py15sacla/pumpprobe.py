@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+'''Laser-on minus laser-off differences of interleaved pump-probe shots.
+
+PumpProbeAccumulator keeps per-pixel means and variances of laser-on and
+laser-off frames for every delay bin, so that both states are reduced
+in a single pass over the run:
+
+    pp = ccd.pumpProbe(laser, delays)
+    delays, diff, err = pp.difference()
+
+The error estimate is the standard error of the difference of the two
+means, i.e., it assumes independent shots.
+'''
+
+import numpy
+from py15sacla.compression import BACKGROUND_FILE, THRESHOLD
+
+
+class PumpProbeAccumulator(object):
+
+    """Per-pixel statistics of laser-on and laser-off frames per delay.
+
+    The accumulator is updated with (delay, laser) keys, where a nonzero
+    laser flag marks the pumped shots.  Accumulators from separate
+    subsets of frames can be merged exactly.
+
+    Data attributes:
+
+    delays   -- list of unique delay keys in the order of appearance.
+    on       -- dictionary of MeanVarianceAccumulator of the laser-on
+                frames at each delay.
+    off      -- dictionary of MeanVarianceAccumulator of the laser-off
+                frames at each delay.
+    """
+
+    def __init__(self):
+        """Initialize empty PumpProbeAccumulator.
+        """
+        self.delays = []
+        self.on = {}
+        self.off = {}
+        return
+
+
+    def update(self, frames, keys, weight=None, scale=None):
+        """Add one frame or a 3D block of frames.
+
+        frames   -- 2D array of one frame or 3D array of several frames
+                    stacked along the first axis.
+        keys     -- (delay, laser) tuple for a 2D frame or a list of such
+                    tuples of the same length as the 3D block.
+        weight, scale -- optional per-frame weights and normalization
+                    factors, see MeanVarianceAccumulator.update.
+
+        No return value.
+        """
+        frames = numpy.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[numpy.newaxis]
+            keys = [keys]
+        keys = list(keys)
+        if len(keys) != len(frames):
+            emsg = "keys must be of the same length as frames."
+            raise ValueError(emsg)
+        nfr = len(frames)
+        ws = [numpy.broadcast_to(numpy.asarray(x, dtype=object), (nfr,))
+              for x in (weight, scale)]
+        for a, (delay, laser), w, s in zip(frames, keys, *ws):
+            self._state(delay, laser).update(a, w, s)
+        return
+
+
+    def merge(self, other):
+        """Add statistics from another PumpProbeAccumulator.
+
+        No return value.
+        """
+        for delay in other.delays:
+            for laser, accs in ((True, other.on), (False, other.off)):
+                if delay in accs:
+                    self._state(delay, laser).merge(accs[delay])
+        return
+
+
+    def counts(self):
+        """Return numbers of laser-on and laser-off frames per delay.
+
+        Return a tuple of (delays, non, noff) with integer arrays.
+        """
+        non = [self._count(self.on, d) for d in self.delays]
+        noff = [self._count(self.off, d) for d in self.delays]
+        return (list(self.delays), numpy.array(non), numpy.array(noff))
+
+
+    def means(self):
+        """Return mean laser-on and laser-off images per delay.
+
+        Return a tuple of (delays, on, off), where on and off are 3D
+        arrays with the delay along the first axis.  Images of a laser
+        state without frames are filled with NaN.
+        """
+        on, _ = self._stack(self.on, 1)
+        off, _ = self._stack(self.off, 1)
+        return (list(self.delays), on, off)
+
+
+    def difference(self, ddof=1):
+        """Return laser-on minus laser-off images with error estimates.
+
+        ddof     -- delta degrees of freedom of the per-pixel variances.
+
+        Return a tuple of (delays, diff, err), where diff and err are 3D
+        arrays with the delay along the first axis.  err is the standard
+        error of diff.  The images are NaN for delays without frames in
+        either laser state.
+        """
+        on, seon = self._stack(self.on, ddof)
+        off, seoff = self._stack(self.off, ddof)
+        diff = on - off
+        err = numpy.sqrt(seon + seoff)
+        return (list(self.delays), diff, err)
+
+    # helper methods
+
+    def _state(self, delay, laser):
+        "Return accumulator of the laser state at delay, create if needed."
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        accs = self.on if laser else self.off
+        if delay not in accs:
+            if delay not in self.on and delay not in self.off:
+                self.delays.append(delay)
+            accs[delay] = MeanVarianceAccumulator()
+        return accs[delay]
+
+
+    @staticmethod
+    def _count(accs, delay):
+        "Return number of frames at delay in accs."
+        return accs[delay].count if delay in accs else 0
+
+
+    def _stack(self, accs, ddof):
+        """Stack means and squared standard errors of accs over delays.
+
+        Return a tuple of two 3D arrays.
+        """
+        shape = None
+        for acc in list(self.on.values()) + list(self.off.values()):
+            if acc.count:
+                shape = acc.mean.shape
+                break
+        if shape is None:
+            empty = numpy.zeros((len(self.delays), 0, 0))
+            return (empty, empty.copy())
+        mean = numpy.full((len(self.delays),) + shape, numpy.nan)
+        se2 = numpy.full_like(mean, numpy.nan)
+        for i, delay in enumerate(self.delays):
+            acc = accs.get(delay)
+            if acc is None or not acc.count:
+                continue
+            mean[i] = acc.mean
+            if acc.count > ddof:
+                se2[i] = acc.variance(ddof) / acc.effectiveCount()
+        return (mean, se2)
+
+# End of class PumpProbeAccumulator
+
+
+def pumpProbeRun(infile, background=BACKGROUND_FILE, threshold=THRESHOLD,
+        roi=(), delaystep=None, callback=None, interval=1.0):
+    '''Reduce laser-on and laser-off frames of a run in a single pass.
+
+    infile       -- input HDF5 file of the run.
+    background, threshold, roi -- processing options, see
+                    compression.compressRun.
+    delaystep    -- optional width of the delay bins.  The opt_delay
+                    values are rounded to its multiples when specified.
+    callback, interval -- optional progress reports, see
+                    CCDFrames.accumulate.
+
+    Return PumpProbeAccumulator.  Raise ValueError if the run file
+    has no laser_pulse_selector_status data.
+    '''
+    from py15sacla.hdfselection import HDFSelection
+    from py15sacla import compression
+    run_info = HDFSelection(infile)
+    events = dict(compression.readEventColumns(run_info))
+    run_info.hdffile.close()
+    if 'laser_selector' not in events:
+        emsg = "No laser selector data in {}.".format(infile)
+        raise ValueError(emsg)
+    delays = events.get('opt_delay')
+    if delays is not None and delaystep:
+        delays = numpy.round(delays / delaystep) * delaystep
+    signal = compression.signalFrames(infile, background, threshold, roi)
+    try:
+        rv = signal.pumpProbe(events['laser_selector'], delays,
+                callback=callback, interval=interval)
+    finally:
+        signal.hdffile.close()
+    return rv
+
+# End of file
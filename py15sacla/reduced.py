@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+
+'''Output format of reduced runs and a consolidated multi-run store.
+
+A reduced run file has the following layout, where all arrays are
+chunked and compressed:
+
+    /image              mean processed image of the run
+    /variance           per-pixel variance of the processed frames
+    /nframes            number of accumulated frames
+    /run                run number
+    /<event>            per-shot scalar arrays such as opt_delay or I0
+    /keys/values        optional unique keys of the per-key images
+    /keys/means         optional 3D array of per-key mean images
+    /histogram/counts   optional histogram of pixel values
+    /histogram/edges    bin edges of the histogram
+    /features/<name>    optional per-shot feature columns, see
+                        py15sacla.features
+    /provenance         group with attributes describing the reduction
+    /pyramid/<factor>   mean image binned by factors 2, 4, 8, etc.
+                        for quick previews, see loadPreview
+
+The root attributes "format" and "version" identify the schema.  Files
+written by the former comp1file.py script are read as version 0.
+
+ReducedStore collects many reduced runs in one HDF5 file with an index
+of per-run averages of the event scalars and a stack of the mean images,
+so that a scan over many runs is loaded with a single read.
+'''
+
+import numpy
+from py15sacla.binning import buildPyramid
+from py15sacla.compression import COMPRESSION
+
+REDUCED_FORMAT = 'py15sacla-reduced'
+REDUCED_VERSION = 1
+STORE_FORMAT = 'py15sacla-store'
+STORE_VERSION = 1
+
+# Names in the root group that are not per-shot event scalars.
+_RESERVED = ('image', 'variance', 'nframes', 'run',
+             'keys', 'histogram', 'provenance', 'pyramid', 'features')
+
+# Default maximum size of preview images.
+PREVIEW_MAXSIZE = 256
+
+
+class ReducedRun(object):
+
+    """Reduced data of one run.
+
+    Data attributes:
+
+    run          -- run number.
+    image        -- 2D array of the mean processed image.
+    variance     -- 2D array of per-pixel variances or None when unknown.
+    nframes      -- number of accumulated frames.
+    events       -- OrderedDict of per-shot scalar arrays.
+    keys         -- 1D array of keys for keyimages or None.
+    keyimages    -- 3D array of mean images per key or None.
+    histogram    -- tuple of (counts, edges) arrays or None.
+    provenance   -- dictionary of strings and numbers that describe
+                    the reduction, for example infile or threshold.
+    features     -- OrderedDict of per-shot feature arrays, which may
+                    be empty.
+    """
+
+    def __init__(self, run, image, variance=None, nframes=0, events=(),
+            keys=None, keyimages=None, histogram=None, provenance=None,
+            features=()):
+        """Initialize new ReducedRun.
+
+        run          -- run number.
+        image        -- 2D array of the mean processed image.
+        variance     -- optional 2D array of per-pixel variances.
+        nframes      -- number of accumulated frames.
+        events       -- dictionary or sequence of (name, array) pairs
+                        of per-shot scalars.
+        keys         -- optional 1D array of keys for keyimages.
+        keyimages    -- optional 3D array of mean images per key.
+        histogram    -- optional tuple of (counts, edges).
+        provenance   -- optional dictionary that describes the reduction.
+        features     -- dictionary or sequence of (name, array) pairs
+                        of per-shot features, for example the table
+                        of FeatureAccumulator.
+        """
+        import collections
+        self.run = run
+        self.image = numpy.asarray(image, dtype=float)
+        self.variance = (None if variance is None
+                else numpy.asarray(variance, dtype=float))
+        self.nframes = int(nframes)
+        self.events = collections.OrderedDict(events)
+        for name in self.events:
+            if name in _RESERVED:
+                emsg = "Event name {0!r} is reserved.".format(name)
+                raise ValueError(emsg)
+        if (keys is None) != (keyimages is None):
+            emsg = "keys and keyimages must be both specified."
+            raise ValueError(emsg)
+        self.keys = None if keys is None else numpy.asarray(keys)
+        self.keyimages = (None if keyimages is None
+                else numpy.asarray(keyimages))
+        if self.keys is not None and len(self.keys) != len(self.keyimages):
+            emsg = "keys and keyimages must have the same length."
+            raise ValueError(emsg)
+        self.histogram = histogram
+        self.provenance = dict(provenance or {})
+        self.features = collections.OrderedDict(
+                (name, numpy.asarray(value))
+                for name, value in collections.OrderedDict(features).items())
+        lengths = set(len(value) for value in self.features.values())
+        if len(lengths) > 1:
+            emsg = "features must have the same length."
+            raise ValueError(emsg)
+        return
+
+
+    def save(self, filename, compression=COMPRESSION):
+        """Write this run to a reduced HDF5 file.
+
+        filename     -- path to the output file, which is overwritten.
+        compression  -- HDF5 compression filter, e.g., "lzf" or "gzip".
+                        No compression when None.
+
+        No return value.
+        """
+        import h5py
+        with h5py.File(filename, 'w') as fp:
+            fp.attrs['format'] = REDUCED_FORMAT
+            fp.attrs['version'] = REDUCED_VERSION
+            _writeRunGroup(fp, self, compression)
+        return
+
+# End of class ReducedRun
+
+
+def loadReduced(filename):
+    '''Read ReducedRun from a reduced HDF5 file.
+
+    filename -- path to a file written by ReducedRun.save or a legacy
+                file of the comp1file.py script.
+
+    Return ReducedRun object.
+    '''
+    import h5py
+    with h5py.File(filename, 'r') as fp:
+        fmt = fp.attrs.get('format')
+        if isinstance(fmt, bytes):
+            fmt = fmt.decode()
+        if fmt is None and 'image' in fp:
+            return _readRunGroup(fp)
+        if fmt != REDUCED_FORMAT:
+            emsg = "{0!r} is not a reduced run file.".format(filename)
+            raise ValueError(emsg)
+        version = int(fp.attrs['version'])
+        if version > REDUCED_VERSION:
+            emsg = "Unsupported reduced file version {0}.".format(version)
+            raise ValueError(emsg)
+        rv = _readRunGroup(fp)
+    return rv
+
+
+def loadPreview(filename, maxsize=PREVIEW_MAXSIZE):
+    '''Read binned mean image of a reduced run for a quick preview.
+
+    filename -- path to a reduced run file.
+    maxsize  -- maximum number of rows and columns of the preview.
+
+    Only the selected pyramid level is read from the file.  The binned
+    values are averages of the image pixels.  Files without a pyramid
+    are binned after reading the full image.
+
+    Return a tuple of (factor, image), where factor is the binning
+    factor of the returned image.
+    '''
+    import h5py
+    with h5py.File(filename, 'r') as fp:
+        rv = _readPreview(fp, maxsize)
+    return rv
+
+
+class ReducedStore(object):
+
+    """Consolidated HDF5 store of many reduced runs.
+
+    Every run is kept in the "runs/<run>" group with the same layout as
+    a reduced run file.  The "index" group holds one row per run with
+    the run number, the number of frames and the mean of every event
+    scalar, which is NaN for runs without that event.  The "images"
+    dataset stacks the mean images in the same row order, where runs
+    without any frames are filled with NaN.
+
+    Data attributes:
+
+    filename     -- path to the store file.
+    hdffile      -- open h5py.File of the store.
+    compression  -- HDF5 compression filter for newly added runs.
+    """
+
+    def __init__(self, filename, mode='a', compression=COMPRESSION):
+        """Open or create a ReducedStore.
+
+        filename     -- path to the store file.
+        mode         -- h5py file mode, by default "a" for read and write.
+        compression  -- compression filter used for added runs.
+        """
+        import h5py
+        self.filename = filename
+        self.compression = compression
+        self.hdffile = h5py.File(filename, mode)
+        fmt = self.hdffile.attrs.get('format')
+        if isinstance(fmt, bytes):
+            fmt = fmt.decode()
+        if fmt is None and not len(self.hdffile) and mode != 'r':
+            self.hdffile.attrs['format'] = STORE_FORMAT
+            self.hdffile.attrs['version'] = STORE_VERSION
+            self.hdffile.create_group('runs')
+            idx = self.hdffile.create_group('index')
+            idx.create_dataset('run', shape=(0,), maxshape=(None,),
+                    dtype=numpy.int64, chunks=(1024,))
+            idx.create_dataset('nframes', shape=(0,), maxshape=(None,),
+                    dtype=numpy.int64, chunks=(1024,))
+        elif fmt != STORE_FORMAT:
+            self.hdffile.close()
+            emsg = "{0!r} is not a reduced run store.".format(filename)
+            raise ValueError(emsg)
+        elif int(self.hdffile.attrs['version']) > STORE_VERSION:
+            self.hdffile.close()
+            emsg = "Unsupported store version {0}.".format(
+                    int(self.hdffile.attrs['version']))
+            raise ValueError(emsg)
+        return
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return
+
+
+    def __len__(self):
+        return len(self.hdffile['index/run'])
+
+
+    def __contains__(self, run):
+        return int(run) in self.runs
+
+
+    @property
+    def runs(self):
+        "Array of run numbers in the index order."
+        return self.hdffile['index/run'][()]
+
+
+    def add(self, reduced):
+        """Add or replace a reduced run in this store.
+
+        reduced  -- ReducedRun object or path to a reduced run file.
+
+        No return value.
+        """
+        if not isinstance(reduced, ReducedRun):
+            reduced = loadReduced(reduced)
+        hasimage = bool(reduced.image.size)
+        images = self.hdffile.get('images')
+        if hasimage and images is not None and (
+                reduced.image.shape != images.shape[1:]):
+            emsg = "Image shape {} of run {} differs from {}.".format(
+                    reduced.image.shape, reduced.run, images.shape[1:])
+            raise ValueError(emsg)
+        idx = self.hdffile['index']
+        runs = list(self.runs)
+        if reduced.run in runs:
+            row = runs.index(reduced.run)
+            del self.hdffile['runs'][str(reduced.run)]
+        else:
+            row = len(runs)
+            for name in idx:
+                _appendRows(idx[name], 1)
+        if hasimage and images is None:
+            ny, nx = reduced.image.shape
+            images = self.hdffile.create_dataset('images',
+                    shape=(len(runs), ny, nx), maxshape=(None, ny, nx),
+                    dtype=float, chunks=(1, ny, nx), fillvalue=numpy.nan,
+                    compression=self.compression)
+        if images is not None and len(images) <= row:
+            _appendRows(images, row + 1 - len(images))
+        grp = self.hdffile['runs'].create_group(str(reduced.run))
+        _writeRunGroup(grp, reduced, self.compression)
+        if images is not None:
+            images[row] = reduced.image if hasimage else numpy.nan
+        idx['run'][row] = reduced.run
+        idx['nframes'][row] = reduced.nframes
+        for name in idx:
+            if name not in ('run', 'nframes'):
+                idx[name][row] = numpy.nan
+        for name, value in reduced.events.items():
+            if name not in idx:
+                idx.create_dataset(name, shape=(len(idx['run']),),
+                        maxshape=(None,), dtype=float, chunks=(1024,),
+                        fillvalue=numpy.nan)
+            value = numpy.asarray(value, dtype=float)
+            idx[name][row] = numpy.nanmean(value) if value.size else numpy.nan
+        self.hdffile.flush()
+        return
+
+
+    def column(self, name):
+        """Return per-run values of an index column.
+
+        name     -- "run", "nframes" or the name of an event scalar,
+                    which gives its mean value in every run.
+
+        Return 1D array in the index order.
+        """
+        return self.hdffile['index'][name][()]
+
+
+    def columnnames(self):
+        "Return a list of the index column names."
+        return list(self.hdffile['index'])
+
+
+    def images(self, roi=()):
+        """Return mean images of all runs in the index order.
+
+        roi      -- optional tuple of slices applied to every image.
+                    Only this region is read from the file.
+
+        Return 3D array.
+        """
+        if 'images' not in self.hdffile:
+            return numpy.zeros((0, 0, 0))
+        sl = (slice(None),) + tuple(roi)
+        return self.hdffile['images'][sl]
+
+
+    def read(self, run):
+        """Return ReducedRun of one run in this store.
+
+        run      -- run number.
+
+        Return ReducedRun object.
+        """
+        key = str(int(run))
+        if key not in self.hdffile['runs']:
+            emsg = "Run {} is not in the store.".format(run)
+            raise KeyError(emsg)
+        return _readRunGroup(self.hdffile['runs'][key])
+
+
+    def preview(self, run, maxsize=PREVIEW_MAXSIZE):
+        """Return binned mean image of one run for a quick preview.
+
+        run      -- run number.
+        maxsize  -- maximum number of rows and columns of the preview.
+
+        Return a tuple of (factor, image) as loadPreview.
+        """
+        key = str(int(run))
+        if key not in self.hdffile['runs']:
+            emsg = "Run {} is not in the store.".format(run)
+            raise KeyError(emsg)
+        return _readPreview(self.hdffile['runs'][key], maxsize)
+
+
+    def close(self):
+        "Close the store file."
+        self.hdffile.close()
+        return
+
+# End of class ReducedStore
+
+# Local Helpers --------------------------------------------------------------
+
+def _createArray(group, name, data, compression):
+    "Create dataset in group, chunked and compressed for non-scalar data."
+    data = numpy.asarray(data)
+    if data.ndim == 0 or not data.size:
+        return group.create_dataset(name, data=data)
+    chunks = True
+    if data.ndim >= 2:
+        # chunk by whole images for fast reads of a single frame
+        chunks = (1,) * (data.ndim - 2) + data.shape[-2:]
+    return group.create_dataset(name, data=data, chunks=chunks,
+            compression=compression,
+            shuffle=compression is not None)
+
+
+def _writeRunGroup(group, reduced, compression):
+    "Write ReducedRun to an HDF5 group."
+    group.create_dataset('run', data=reduced.run)
+    group.create_dataset('nframes', data=reduced.nframes)
+    _createArray(group, 'image', reduced.image, compression)
+    if reduced.variance is not None:
+        _createArray(group, 'variance', reduced.variance, compression)
+    for name, value in reduced.events.items():
+        _createArray(group, name, value, compression)
+    if reduced.keys is not None:
+        g = group.create_group('keys')
+        _createArray(g, 'values', reduced.keys, compression)
+        _createArray(g, 'means', reduced.keyimages, compression)
+    if reduced.histogram is not None:
+        counts, edges = reduced.histogram
+        g = group.create_group('histogram')
+        _createArray(g, 'counts', counts, compression)
+        _createArray(g, 'edges', edges, compression)
+    if reduced.features:
+        g = group.create_group('features')
+        for name, value in reduced.features.items():
+            _createArray(g, name, value, compression)
+        g.attrs['columns'] = list(reduced.features)
+    g = group.create_group('provenance')
+    for name, value in reduced.provenance.items():
+        g.attrs[name] = value
+    if reduced.image.ndim == 2:
+        g = group.create_group('pyramid')
+        for factor, level in buildPyramid(reduced.image):
+            _createArray(g, str(factor), level, compression)
+    return
+
+
+def _readRunGroup(group):
+    "Return ReducedRun read from an HDF5 group."
+    import h5py
+    events = [(name, group[name][()]) for name in group
+            if name not in _RESERVED and isinstance(group[name], h5py.Dataset)]
+    keys = keyimages = histogram = None
+    if 'keys' in group:
+        keys = group['keys/values'][()]
+        keyimages = group['keys/means'][()]
+    if 'histogram' in group:
+        histogram = (group['histogram/counts'][()],
+                     group['histogram/edges'][()])
+    provenance = {}
+    if 'provenance' in group:
+        provenance = dict(group['provenance'].attrs.items())
+    features = []
+    if 'features' in group:
+        g = group['features']
+        columns = [name.decode() if isinstance(name, bytes) else str(name)
+                for name in g.attrs.get('columns', list(g))]
+        features = [(name, g[name][()]) for name in columns]
+    variance = group['variance'][()] if 'variance' in group else None
+    nframes = group['nframes'][()] if 'nframes' in group else 0
+    run = group['run'][()] if 'run' in group else None
+    rv = ReducedRun(run, group['image'][()], variance=variance,
+            nframes=nframes, events=events, keys=keys, keyimages=keyimages,
+            histogram=histogram, provenance=provenance, features=features)
+    return rv
+
+
+def _readPreview(group, maxsize):
+    "Return (factor, image) of the finest pyramid level within maxsize."
+    image = group['image']
+    if image.ndim != 2 or max(image.shape) <= maxsize:
+        return (1, image[()])
+    if 'pyramid' in group:
+        levels = sorted((int(f), group['pyramid'][f])
+                for f in group['pyramid'])
+    else:
+        levels = buildPyramid(image[()], minsize=maxsize)
+    if not levels:
+        return (1, image[()])
+    for factor, level in levels:
+        if max(level.shape) <= maxsize:
+            break
+    return (factor, level[()])
+
+
+def _appendRows(dataset, n):
+    "Extend resizable dataset by n rows along the first axis."
+    dataset.resize(len(dataset) + n, axis=0)
+    return
+
+# End of file
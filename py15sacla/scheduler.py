@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+
+'''Work-stealing scheduler for compressing many runs on one machine.
+
+Every run is split into chunks of consecutive frames.  Runs are first
+assigned to worker processes so that the workers have similar numbers
+of frames, and each worker processes the chunks from the front of its
+own queue.  A worker whose queue is empty steals a chunk from the back
+of the queue with the most remaining frames, so that no cores are left
+idle when run sizes differ.  Partial accumulators of the chunks are
+merged per run, and the run output is written once all of its chunks
+are done.
+'''
+
+import os
+import collections
+
+
+def runChunked(runs, jobs=1, chunksize=500, retries=1, logdir='.',
+        metricsfile=None, **options):
+    '''Compress runs split into chunks of frames over local workers.
+
+    runs         -- list of run numbers.
+    jobs         -- number of worker processes.
+    chunksize    -- maximum number of frames in one chunk.
+    retries      -- number of times a failed chunk is attempted again.
+    logdir       -- directory for the per-run log files "run_{run}.log".
+    metricsfile  -- optional JSON-lines log for the throughput metrics
+                    of every run, see py15sacla.metrics.
+    options      -- keyword arguments for compressRun, i.e., infile,
+                    outfile, background, threshold, roi and compression.
+
+    Return a list of batch.RunResult objects in the order of runs.
+    '''
+    import time
+    from py15sacla.batch import RunResult
+    if not os.path.isdir(logdir):
+        os.makedirs(logdir)
+    logfiles = [os.path.join(logdir, 'run_{}.log'.format(run))
+            for run in runs]
+    results = collections.OrderedDict(
+            (run, RunResult(run, fn)) for run, fn in zip(runs, logfiles))
+    # split runs into chunks
+    states = {}
+    for run, r in results.items():
+        _logRun(r, "# run {} started {}".format(run, time.ctime()))
+        try:
+            states[run] = _RunState(run, options, chunksize)
+        except Exception as e:
+            r.attempts = 1
+            r.error = '{}: {}'.format(type(e).__name__, e)
+            _logRun(r, "# run {} failed: {}".format(run, r.error))
+    queues = _assignRuns(list(states.values()), max(1, jobs))
+    scheduler = _Scheduler(queues, states, results, options, retries)
+    scheduler.metricsfile = metricsfile
+    scheduler.run()
+    return list(results.values())
+
+# Local Helpers --------------------------------------------------------------
+
+class _RunState(object):
+    '''Bookkeeping of the chunks and partial results of one run.
+
+    Data:
+
+    run      -- run number.
+    infile   -- input file of the run.
+    outfile  -- output file of the run.
+    nframes  -- number of frames in the run.
+    chunks   -- list of (run, start, stop) tuples.
+    pending  -- number of chunks that are not yet done.
+    acc      -- MeanVarianceAccumulator merged from finished chunks.
+    stats    -- ProfileStats merged from finished chunks.
+    failed   -- flag for a run with a chunk that failed all attempts.
+    t0       -- start time of the run.
+    '''
+
+    def __init__(self, run, options, chunksize):
+        import time
+        from py15sacla.hdfselection import HDFSelection
+        from py15sacla.accumulators import MeanVarianceAccumulator
+        from py15sacla.compression import INPUT_TEMPLATE, OUTPUT_TEMPLATE
+        from py15sacla.profiling import ProfileStats
+        self.run = run
+        self.infile = (options.get('infile') or
+                INPUT_TEMPLATE).format(run=run)
+        self.outfile = (options.get('outfile') or
+                OUTPUT_TEMPLATE).format(run=run)
+        sel = HDFSelection(self.infile, 'detector_2d_1 detector_data$')
+        self.nframes = len(sel)
+        sel.hdffile.close()
+        bounds = list(range(0, self.nframes, chunksize)) + [self.nframes]
+        self.chunks = [(run, lo, hi)
+                for lo, hi in zip(bounds[:-1], bounds[1:])]
+        if not self.chunks:
+            self.chunks = [(run, 0, 0)]
+        self.pending = len(self.chunks)
+        self.acc = MeanVarianceAccumulator()
+        self.stats = ProfileStats()
+        self.failed = False
+        self.t0 = time.time()
+        return
+
+# End of class _RunState
+
+
+def _assignRuns(states, jobs):
+    '''Distribute run chunks to worker queues with balanced frame counts.
+
+    Return a list of deques of chunks, one per worker.
+    '''
+    queues = [collections.deque() for i in range(jobs)]
+    loads = [0] * jobs
+    for st in sorted(states, key=lambda s: -s.nframes):
+        i = loads.index(min(loads))
+        queues[i].extend(st.chunks)
+        loads[i] += st.nframes
+    return queues
+
+
+class _Scheduler(object):
+    '''Coordinator of worker processes that hands out chunks on request.
+
+    Workers report finished chunks to the coordinator, which replies with
+    the next chunk from the worker's own queue or a stolen one.  Every
+    worker has its own pipe, so that a worker process that dies while
+    sending cannot block the others.  A dead worker is replaced by a new
+    process with a new pipe.
+    '''
+
+    metricsfile = None
+
+    def __init__(self, queues, states, results, options, retries):
+        self.queues = queues
+        self.states = states
+        self.results = results
+        self.options = options
+        self.retries = retries
+        self.attempts = collections.Counter()
+        return
+
+
+    def run(self):
+        "Process all queued chunks and write outputs of finished runs."
+        from multiprocessing.connection import wait
+        jobs = len(self.queues)
+        if jobs == 1:
+            self._runInline()
+            return
+        workers = [None] * jobs
+        conns = [None] * jobs
+        busy = [None] * jobs
+        for wid in range(jobs):
+            workers[wid], conns[wid] = self._startWorker(wid)
+            busy[wid] = self._dispatch(wid, conns[wid])
+        while any(c is not None for c in busy):
+            ready = wait([c for c, b in zip(conns, busy) if b is not None],
+                    timeout=1)
+            for wid in range(jobs):
+                if busy[wid] is None:
+                    continue
+                if conns[wid] in ready:
+                    try:
+                        chunk, ok, payload, walltime = conns[wid].recv()
+                    except (EOFError, OSError):
+                        chunk = None
+                    if chunk is not None:
+                        self._finishChunk(wid, chunk, ok, payload, walltime)
+                        busy[wid] = self._dispatch(wid, conns[wid])
+                        continue
+                elif workers[wid].is_alive():
+                    continue
+                # restart dead worker and count its chunk as failed
+                self._finishChunk(wid, busy[wid], False,
+                        "worker process died", 0.0)
+                conns[wid].close()
+                workers[wid].join()
+                workers[wid], conns[wid] = self._startWorker(wid)
+                busy[wid] = self._dispatch(wid, conns[wid])
+        for conn in conns:
+            conn.send(None)
+        for w, conn in zip(workers, conns):
+            w.join()
+            conn.close()
+        return
+
+
+    def _runInline(self):
+        "Process all chunks sequentially in this process."
+        worker = _ChunkWorker(self.options)
+        chunk = self._nextChunk(0)
+        while chunk is not None:
+            self._finishChunk(0, chunk, *worker.process(chunk))
+            chunk = self._nextChunk(0)
+        worker.close()
+        return
+
+
+    def _startWorker(self, wid):
+        """Start worker process that receives chunks over a new pipe.
+
+        Return a tuple of (process, connection).
+        """
+        import multiprocessing
+        conn, wconn = multiprocessing.Pipe()
+        w = multiprocessing.Process(target=_workerLoop,
+                args=(wconn, self.options))
+        w.daemon = True
+        w.start()
+        wconn.close()
+        return (w, conn)
+
+
+    def _dispatch(self, wid, conn):
+        "Send the next chunk to worker wid, return the chunk or None."
+        chunk = self._nextChunk(wid)
+        if chunk is not None:
+            conn.send(chunk)
+        return chunk
+
+
+    def _nextChunk(self, wid):
+        """Pop chunk from the front of own queue or steal from the back
+        of the queue with the most remaining frames.
+        """
+        own = self.queues[wid]
+        while own:
+            chunk = own.popleft()
+            if not self.states[chunk[0]].failed:
+                return chunk
+        loads = [sum(hi - lo for run, lo, hi in q) for q in self.queues]
+        while any(loads):
+            victim = loads.index(max(loads))
+            chunk = self.queues[victim].pop()
+            loads[victim] -= chunk[2] - chunk[1]
+            if not self.states[chunk[0]].failed:
+                return chunk
+        return None
+
+
+    def _finishChunk(self, wid, chunk, ok, payload, walltime):
+        "Merge or retry a processed chunk, write output of finished run."
+        import time
+        from py15sacla.compression import writeCompressed
+        from py15sacla.compression import reductionProvenance
+        from py15sacla.compression import BACKGROUND_FILE, THRESHOLD
+        from py15sacla.compression import COMPRESSION
+        run, lo, hi = chunk
+        st = self.states[run]
+        r = self.results[run]
+        self.attempts[chunk] += 1
+        if st.failed:
+            return
+        if not ok:
+            _logRun(r, "# frames {}:{} failed on worker {}:\n{}".format(
+                lo, hi, wid, payload))
+            r.error = payload.strip().split('\n')[-1]
+            if self.attempts[chunk] <= self.retries:
+                self.queues[wid].appendleft(chunk)
+            else:
+                st.failed = True
+                self._closeRun(st, False)
+            return
+        _logRun(r, "# frames {}:{} done on worker {} in {:.1f} s".format(
+            lo, hi, wid, walltime))
+        acc, stats = payload
+        st.acc.merge(acc)
+        st.stats.merge(stats)
+        st.pending -= 1
+        if st.pending:
+            return
+        import contextlib
+        from py15sacla.profiling import profile
+        with open(r.logfile, 'a') as fp, contextlib.redirect_stdout(fp), \
+                profile(st.stats) as stats:
+            t = time.perf_counter()
+            try:
+                opts = self.options
+                provenance = reductionProvenance(st.infile,
+                        opts.get('background', BACKGROUND_FILE),
+                        opts.get('threshold', THRESHOLD), opts.get('roi', ()))
+                writeCompressed(run, st.infile, st.outfile, st.acc,
+                        provenance, opts.get('compression', COMPRESSION))
+                stats.lap('write', t)
+                ok = True
+            except Exception as e:
+                r.error = '{}: {}'.format(type(e).__name__, e)
+                print(r.error)
+                ok = False
+        self._closeRun(st, ok)
+        return
+
+
+    def _closeRun(self, st, ok):
+        "Record the outcome of a run in its RunResult and log."
+        import time
+        r = self.results[st.run]
+        r.ok = ok
+        r.error = None if ok else r.error
+        r.attempts = max(self.attempts[c] for c in st.chunks)
+        r.walltime = time.time() - st.t0
+        _logRun(r, "# run {} {} after {:.1f} s".format(
+            st.run, 'finished' if ok else 'failed', r.walltime))
+        if self.metricsfile is not None:
+            from py15sacla import metrics
+            rec = metrics.runRecord(st.run, st.infile, st.stats,
+                    r.walltime, ok, r.error, started=st.t0)
+            metrics.appendMetrics(self.metricsfile, rec)
+        return
+
+# End of class _Scheduler
+
+
+class _ChunkWorker(object):
+    '''Processing of chunks that keeps the last input file open.
+    '''
+
+    def __init__(self, options):
+        self.options = dict(options)
+        self.infile = None
+        self.signal = None
+        return
+
+
+    def process(self, chunk):
+        """Accumulate frames of a chunk.
+
+        Return a tuple of (ok, payload, walltime), where payload is
+        a tuple of (accumulator, ProfileStats) or the error traceback.
+        """
+        import time
+        import traceback
+        from py15sacla import compression
+        from py15sacla.profiling import profile
+        from py15sacla.metrics import peakRSS
+        run, lo, hi = chunk
+        t0 = time.time()
+        try:
+            infile = (self.options.get('infile') or
+                    compression.INPUT_TEMPLATE).format(run=run)
+            if infile != self.infile:
+                self.close()
+                kw = dict((k, self.options[k]) for k in
+                        ('background', 'threshold', 'roi')
+                        if k in self.options)
+                self.signal = compression.signalFrames(infile, **kw)
+                self.infile = infile
+            with profile() as stats:
+                acc = compression.accumulateFrames(self.signal, lo, hi)
+            stats.peak('rss', peakRSS())
+            rv = (True, (acc, stats), time.time() - t0)
+        except Exception:
+            rv = (False, traceback.format_exc(), time.time() - t0)
+        return rv
+
+
+    def close(self):
+        "Close the currently open input file."
+        if self.signal is not None:
+            self.signal.hdffile.close()
+        self.infile = None
+        self.signal = None
+        return
+
+# End of class _ChunkWorker
+
+
+def _workerLoop(conn, options):
+    "Process chunks received over conn until None is received."
+    worker = _ChunkWorker(options)
+    for chunk in iter(conn.recv, None):
+        ok, payload, walltime = worker.process(chunk)
+        conn.send((chunk, ok, payload, walltime))
+    worker.close()
+    conn.close()
+    return
+
+
+def _logRun(result, message):
+    "Append message to the log file of a run."
+    with open(result.logfile, 'a') as fp:
+        fp.write(message + '\n')
+    return
+
+# End of file
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+'''Streaming summaries of value distributions in detector frames.
+
+ExtremaSketch keeps exact minimum and maximum of all processed values.
+QuantileSketch keeps a bounded random sample of values for estimating
+quantiles, for example for histogram ranges or display limits.  Both can
+be updated frame by frame and merged from separately processed subsets.
+'''
+
+import numpy
+
+
+class ExtremaSketch(object):
+
+    """Running minimum and maximum of processed values.
+
+    Data attributes:
+
+    count    -- number of values processed so far.
+    vmin     -- minimum value or None when nothing was processed.
+    vmax     -- maximum value or None when nothing was processed.
+    """
+
+    count = 0
+    vmin = None
+    vmax = None
+
+    def update(self, a):
+        """Include values from array a.
+
+        a    -- array-like object of arbitrary dimensions.
+
+        No return value.
+        """
+        a = numpy.asarray(a)
+        if not a.size:
+            return
+        lo, hi = a.min(), a.max()
+        self.vmin = lo if self.vmin is None else min(self.vmin, lo)
+        self.vmax = hi if self.vmax is None else max(self.vmax, hi)
+        self.count += a.size
+        return
+
+
+    def merge(self, other):
+        """Include extrema from another ExtremaSketch.
+
+        No return value.
+        """
+        if other.count:
+            self.update([other.vmin, other.vmax])
+            self.count += other.count - 2
+        return
+
+# End of class ExtremaSketch
+
+
+class QuantileSketch(object):
+
+    """Approximate quantiles from a bounded random sample of values.
+
+    Every update draws at most persample random values, which are kept
+    with probability proportional to the number of values they stand for.
+    The sketch keeps at most capacity values.  Quantile estimates have
+    rank error of about 1 / sqrt(capacity).  Minimum and maximum are exact.
+
+    Data attributes:
+
+    capacity     -- maximum number of sampled values kept in the sketch.
+    persample    -- maximum number of values drawn from each update.
+    extrema      -- ExtremaSketch with exact extrema of all values.
+    values       -- array of the sampled values.
+    """
+
+    capacity = 4096
+    persample = 256
+
+    def __init__(self, capacity=None, persample=None, seed=None):
+        """Initialize new QuantileSketch object.
+
+        capacity     -- maximum number of kept values, by default 4096.
+        persample    -- maximum number of values drawn from each update,
+                        by default 256.
+        seed         -- optional seed for the random number generator.
+        """
+        if capacity is not None:
+            self.capacity = int(capacity)
+        if persample is not None:
+            self.persample = int(persample)
+        self.extrema = ExtremaSketch()
+        self.values = numpy.empty(0, dtype=float)
+        self._keys = numpy.empty(0, dtype=float)
+        self._rng = numpy.random.RandomState(seed)
+        return
+
+
+    def update(self, a):
+        """Include values from array a.
+
+        a    -- array-like object of arbitrary dimensions.
+
+        No return value.
+        """
+        a = numpy.asarray(a).reshape(-1)
+        if not a.size:
+            return
+        self.extrema.update(a)
+        m = min(a.size, self.persample)
+        if m == a.size:
+            sample = a
+        else:
+            sample = a[self._rng.randint(0, a.size, m)]
+        weight = float(a.size) / m
+        # weighted sampling keys of Efraimidis and Spirakis in log scale
+        keys = numpy.log(self._rng.random_sample(m)) / weight
+        self._keep(numpy.concatenate([self.values, sample]),
+                numpy.concatenate([self._keys, keys]))
+        return
+
+
+    def merge(self, other):
+        """Include values sampled by another QuantileSketch.
+
+        No return value.
+        """
+        self.extrema.merge(other.extrema)
+        self._keep(numpy.concatenate([self.values, other.values]),
+                numpy.concatenate([self._keys, other._keys]))
+        return
+
+
+    def scale(self, factor):
+        """Multiply all sketched values by a positive factor.
+
+        factor   -- positive scale, for example a unit conversion.
+
+        No return value.
+        """
+        if not factor > 0:
+            emsg = "factor must be positive."
+            raise ValueError(emsg)
+        self.values = self.values * factor
+        ex = self.extrema
+        if ex.count:
+            ex.vmin = ex.vmin * factor
+            ex.vmax = ex.vmax * factor
+        return
+
+
+    def quantile(self, q):
+        """Return estimated quantiles of the processed values.
+
+        q    -- quantile or a sequence of quantiles between 0 and 1.
+                Quantiles 0 and 1 return exact minimum and maximum.
+
+        Return float or an array of floats.
+        """
+        if not self.count:
+            raise ValueError("Cannot estimate quantiles without any data.")
+        qa = numpy.asarray(q, dtype=float)
+        rv = numpy.quantile(self.values, qa)
+        rv = numpy.clip(rv, self.vmin, self.vmax)
+        rv = numpy.where(qa <= 0, self.vmin, rv)
+        rv = numpy.where(qa >= 1, self.vmax, rv)
+        return rv[()] if rv.ndim == 0 else rv
+
+
+    def percentile(self, p):
+        "Same as quantile, but for percentiles p between 0 and 100."
+        return self.quantile(numpy.asarray(p, dtype=float) / 100.0)
+
+    # properties
+
+    @property
+    def count(self):
+        "Number of values processed so far."
+        return self.extrema.count
+
+
+    @property
+    def vmin(self):
+        "Exact minimum of processed values."
+        return self.extrema.vmin
+
+
+    @property
+    def vmax(self):
+        "Exact maximum of processed values."
+        return self.extrema.vmax
+
+    # helper methods
+
+    def _keep(self, values, keys):
+        "Keep at most capacity values with the largest sampling keys."
+        if len(values) > self.capacity:
+            idx = numpy.argpartition(keys, -self.capacity)[-self.capacity:]
+            values = values[idx]
+            keys = keys[idx]
+        self.values = values
+        self._keys = keys
+        return
+
+# End of class QuantileSketch
+
+# End of file
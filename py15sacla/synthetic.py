@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+'''Synthetic run files with the layout of SACLA HDF5 data.
+
+The generated files are meant for tests and benchmarks when the beamtime
+data are not available.  A file with one run has the datasets
+
+    /file_info/run_number_list
+    /run_N/detector_2d_1/detector_info/absolute_gain
+    /run_N/detector_2d_1/tag_T/detector_data
+    /run_N/run_info/sacla_config/photon_energy_in_eV
+    /run_N/event_info/tag_number_list
+    /run_N/event_info/...       per-shot scalars for EVENT_COLUMNS
+
+Detector frames hold Poisson distributed photon hits converted to raw
+detector units plus Gaussian read-out noise.  Shots with the laser on
+have a higher photon rate in a square spot at the frame center.
+'''
+
+import numpy
+
+# Default detector configuration, which gives tophotons of about 0.0078.
+ABSOLUTE_GAIN = 2.0
+PHOTON_ENERGY = 930.0
+
+# Tag number of the first shot, of a similar size as at the beamtime.
+FIRST_TAG = 200000000
+
+# Paths of per-shot event scalars under the event_info group, which match
+# the patterns in compression.EVENT_COLUMNS and I0_COLUMNS.
+EVENT_PATHS = {
+    'opt_delay' : 'bl_3/eh_2/opt_delay',
+    'accelerator' : 'acc/accelerator_status',
+    'xfel_selector' : 'bl_3/eh_1/xfel_pulse_selector_status',
+    'laser_selector' : 'bl_3/lh_1/laser_pulse_selector_status',
+    'user_4' : 'bl_3/eh_2/photodiode/photodiode_user_4_in_volt',
+    'user_5' : 'bl_3/eh_2/photodiode/photodiode_user_5_in_volt',
+}
+
+
+def writeSyntheticRun(filename, run=1, nframes=10, shape=(64, 64),
+        rate=0.01, noise=1.0, ndelays=5, dtype=numpy.float32, seed=0,
+        firsttag=FIRST_TAG):
+    '''Write HDF5 file with one run of synthetic SACLA data.
+
+    filename     -- path to the output file, which is overwritten.
+    run          -- run number.
+    nframes      -- number of detector frames, i.e., shots.
+    shape        -- shape of the detector frames.
+    rate         -- mean number of photons per pixel in one shot.
+    noise        -- standard deviation of read-out noise in photons.
+    ndelays      -- number of distinct values of opt_delay, which
+                    cycle over consecutive pairs of laser on and off
+                    shots.
+    dtype        -- data type of the detector frames.  Integer types
+                    give rounded frames.
+    seed         -- seed of the random number generator.
+    firsttag     -- tag number of the first shot.  Tags increase by 2
+                    and should have the same number of digits so that
+                    the frames sort in the order of shots.
+
+    Return list of the tag numbers.
+    '''
+    import h5py
+    from py15sacla.utils import SILICON_GAP
+    rs = numpy.random.RandomState(seed)
+    e_per_ph = PHOTON_ENERGY / (SILICON_GAP * ABSOLUTE_GAIN)
+    tags = list(range(firsttag, firsttag + 2 * nframes, 2))
+    events = syntheticEvents(nframes, ndelays, rs)
+    ny, nx = shape
+    spot = numpy.s_[ny // 4:ny - ny // 4, nx // 4:nx - nx // 4]
+    with h5py.File(filename, 'w') as fp:
+        fp['file_info/run_number_list'] = [run]
+        grun = fp.create_group('run_{}'.format(run))
+        gdet = grun.create_group('detector_2d_1')
+        gdet['detector_info/absolute_gain'] = ABSOLUTE_GAIN
+        grun['run_info/sacla_config/photon_energy_in_eV'] = PHOTON_ENERGY
+        grun['event_info/tag_number_list'] = tags
+        for name, value in events.items():
+            grun['event_info/' + EVENT_PATHS[name]] = value
+        for tag, laser in zip(tags, events['laser_selector']):
+            mu = numpy.full(shape, rate, dtype=float)
+            mu[spot] *= 1.5 if laser else 1.0
+            photons = rs.poisson(mu) + rs.normal(0, noise, shape)
+            adu = photons * e_per_ph
+            if numpy.issubdtype(dtype, numpy.integer):
+                adu = numpy.rint(adu)
+            dsname = 'tag_{}/detector_data'.format(tag)
+            gdet[dsname] = adu.astype(dtype)
+    return tags
+
+
+def syntheticEvents(nframes, ndelays=5, rs=numpy.random):
+    '''Return per-shot event scalars for synthetic runs.
+
+    nframes      -- number of shots.
+    ndelays      -- number of distinct opt_delay values.
+    rs           -- RandomState used for the I0 photodiode values.
+
+    Return dictionary of 1D arrays keyed by EVENT_PATHS names.
+    '''
+    shot = numpy.arange(nframes)
+    rv = {
+        'opt_delay' : (shot // 2 % max(1, ndelays)) * 0.5,
+        'accelerator' : numpy.ones(nframes, dtype=int),
+        'xfel_selector' : numpy.ones(nframes, dtype=int),
+        'laser_selector' : (shot % 2 == 0).astype(int),
+        'user_4' : rs.uniform(0.9, 1.1, nframes),
+        'user_5' : rs.uniform(0.9, 1.1, nframes),
+    }
+    return rv
+
+# End of file
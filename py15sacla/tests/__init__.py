@@ -9,14 +9,39 @@ def testsuite():
     Return a unittest.TestSuite object.
     '''
     import unittest
+    import importlib
     modulenames = '''
+        py15sacla.tests.testaccumulators
+        py15sacla.tests.testasyncframes
+        py15sacla.tests.testbackground
+        py15sacla.tests.testbatch
+        py15sacla.tests.testbinning
         py15sacla.tests.testccdframes
+        py15sacla.tests.testcli
+        py15sacla.tests.testcompression
+        py15sacla.tests.testfeatures
+        py15sacla.tests.testfindfiles
+        py15sacla.tests.testframecache
+        py15sacla.tests.testgroupstats
         py15sacla.tests.testhdfselection
+        py15sacla.tests.testhistogram
+        py15sacla.tests.testintegration
+        py15sacla.tests.testipy_all
+        py15sacla.tests.testlazystack
+        py15sacla.tests.testmetrics
+        py15sacla.tests.testprefetch
+        py15sacla.tests.testprofiling
+        py15sacla.tests.testprogress
+        py15sacla.tests.testpumpprobe
+        py15sacla.tests.testreduced
+        py15sacla.tests.testscheduler
+        py15sacla.tests.testsketches
+        py15sacla.tests.testsynthetic
     '''.split()
     suite = unittest.TestSuite()
     loader = unittest.defaultTestLoader
     for mname in modulenames:
-        exec ('import %s as mobj' % mname)
+        mobj = importlib.import_module(mname)
         suite.addTests(loader.loadTestsFromModule(mobj))
     return suite
 
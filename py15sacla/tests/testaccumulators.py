@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.accumulators
+"""
+
+import unittest
+import numpy
+
+from py15sacla.accumulators import MeanVarianceAccumulator
+
+##############################################################################
+class TestMeanVarianceAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(5)
+        self.frames = rs.normal(100.0, 3.0, size=(9, 4, 3))
+        return
+
+
+    def test_update(self):
+        """check MeanVarianceAccumulator.update()
+        """
+        acc = MeanVarianceAccumulator()
+        for a in self.frames[:4]:
+            acc.update(a)
+        acc.update(self.frames[4:])
+        self.assertEqual(9, acc.count)
+        self.assertTrue(numpy.allclose(self.frames.mean(axis=0), acc.mean))
+        self.assertTrue(numpy.allclose(self.frames.var(axis=0, ddof=1),
+            acc.variance(ddof=1)))
+        return
+
+
+    def test_merge(self):
+        """check MeanVarianceAccumulator.merge()
+        """
+        acc1 = MeanVarianceAccumulator()
+        acc1.update(self.frames[:2])
+        acc2 = MeanVarianceAccumulator()
+        acc2.update(self.frames[2:])
+        acc1.merge(acc2)
+        acc1.merge(MeanVarianceAccumulator())
+        self.assertEqual(9, acc1.count)
+        self.assertTrue(numpy.allclose(self.frames.mean(axis=0), acc1.mean))
+        self.assertTrue(numpy.allclose(self.frames.std(axis=0), acc1.std()))
+        return
+
+
+    def test_weighted(self):
+        """check weighted MeanVarianceAccumulator.update()
+        """
+        rs = numpy.random.RandomState(7)
+        w = rs.uniform(0.5, 2, 9)
+        w[3] = 0
+        s = 1.0 / rs.uniform(0.8, 1.2, 9)
+        x = self.frames * s[:, None, None]
+        acc = MeanVarianceAccumulator()
+        for a, wi, si in zip(self.frames[:4], w, s):
+            acc.update(a, wi, si)
+        acc.update(self.frames[4:], w[4:], s[4:])
+        self.assertEqual(9, acc.count)
+        self.assertAlmostEqual(w.sum(), acc.weight)
+        self.assertAlmostEqual(numpy.dot(w, w), acc.weight2)
+        mean = numpy.average(x, axis=0, weights=w)
+        var = numpy.average((x - mean) ** 2, axis=0, weights=w)
+        self.assertTrue(numpy.allclose(mean, acc.mean))
+        self.assertTrue(numpy.allclose(var, acc.variance()))
+        neff = w.sum() ** 2 / numpy.dot(w, w)
+        self.assertAlmostEqual(neff, acc.effectiveCount())
+        self.assertTrue(numpy.allclose(var * neff / (neff - 1),
+            acc.variance(ddof=1)))
+        acc1 = MeanVarianceAccumulator()
+        acc1.update(self.frames[:5], w[:5], s[:5])
+        acc2 = MeanVarianceAccumulator()
+        acc2.update(self.frames[5:], w[5:], s[5:])
+        acc1.merge(acc2)
+        self.assertTrue(numpy.allclose(acc.mean, acc1.mean))
+        self.assertTrue(numpy.allclose(acc.m2, acc1.m2))
+        # unit weights are the same as unweighted updates
+        acc3 = MeanVarianceAccumulator()
+        acc3.update(self.frames, numpy.ones(9))
+        acc4 = MeanVarianceAccumulator()
+        acc4.update(self.frames)
+        self.assertTrue(numpy.allclose(acc4.mean, acc3.mean))
+        self.assertTrue(numpy.allclose(acc4.variance(1), acc3.variance(1)))
+        return
+
+# End of class TestMeanVarianceAccumulator
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.asyncframes
+"""
+
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+import numpy
+import h5py
+
+from py15sacla.ccdframes import CCDFrames
+from py15sacla.accumulators import MeanVarianceAccumulator
+from py15sacla.asyncframes import batches, accumulate
+
+##############################################################################
+class TestAsyncFrames(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(7)
+        with h5py.File(h5file, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(11):
+                dd = rs.poisson(0.5, (5, 4)).astype(numpy.float32) * 10
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = dd
+        self.ccd = CCDFrames(h5file)
+        self.ccd.setThreshold(0.5, 4)
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_batches(self):
+        """check asynchronous generation of frame batches
+        """
+        async def collect():
+            return [b async for b in batches(self.ccd, 4)]
+        blocks = asyncio.run(collect())
+        self.assertEqual([4, 4, 3], [len(b) for b in blocks])
+        a = numpy.concatenate(blocks)
+        self.assertTrue(numpy.array_equal(self.ccd.toarray(slice(None)), a))
+        return
+
+
+    def test_meanAsync(self):
+        """check CCDFrames.meanAsync() and its partial results
+        """
+        partial = []
+        cb = lambda n, m: partial.append((n, m.copy()))
+        m = asyncio.run(self.ccd.meanAsync(batchsize=3, interval=0,
+            callback=cb))
+        self.assertTrue(numpy.allclose(self.ccd.mean(), m))
+        self.assertEqual([3, 6, 9, 11], [n for n, pm in partial])
+        self.assertTrue(numpy.allclose(self.ccd.toarray(slice(3)).mean(0),
+            partial[0][1]))
+        return
+
+
+    def test_histogramAsync(self):
+        """check CCDFrames.histogramAsync()
+        """
+        ccd1 = CCDFrames(self.ccd.selection)
+        ccd1.setThreshold(0.5, 4)
+        c1 = ccd1.histogram()
+        c0 = asyncio.run(self.ccd.histogramAsync(batchsize=5))
+        self.assertTrue(numpy.array_equal(c1, c0))
+        self.assertEqual(ccd1.chistbins, self.ccd.chistbins)
+        return
+
+
+    def test_integer(self):
+        """check asynchronous reductions of integer frames in photons
+        """
+        self.ccd.setComputeType(numpy.int32)
+        m = asyncio.run(self.ccd.meanAsync(batchsize=4))
+        self.assertTrue(numpy.allclose(self.ccd.mean(), m))
+        ccd1 = CCDFrames(self.ccd.selection)
+        ccd1.setThreshold(0.5, 4)
+        ccd1.setComputeType(numpy.int32)
+        c1 = ccd1.histogram()
+        c0 = asyncio.run(self.ccd.histogramAsync(batchsize=4))
+        self.assertEqual(ccd1.chistbins, self.ccd.chistbins)
+        self.assertTrue(numpy.array_equal(c1, c0))
+        return
+
+
+    def test_cancel(self):
+        """check cancellation of an asynchronous reduction
+        """
+        counts = []
+        async def reduce():
+            acc = MeanVarianceAccumulator()
+            async for acc in accumulate(self.ccd, acc, 1, 0):
+                counts.append(acc.count)
+                if acc.count == 2:
+                    asyncio.current_task().cancel()
+                await asyncio.sleep(0)
+        async def run():
+            task = asyncio.ensure_future(reduce())
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual([1, 2], counts)
+        return
+
+# End of class TestAsyncFrames
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.background
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla.background import BackgroundModel, loadBackground
+
+##############################################################################
+class TestBackgroundModel(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(11)
+        self.mean = rs.normal(50.0, 1.0, size=(6, 5))
+        self.mean[2, 3] = 90
+        self.variance = rs.uniform(3.5, 4.5, size=(6, 5))
+        self.model = BackgroundModel(self.mean, self.variance,
+                nframes=20, tophotons=0.25, run_number=7)
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_image(self):
+        """check BackgroundModel.image() and noise()
+        """
+        bm = self.model
+        self.assertTrue(numpy.allclose(0.25 * self.mean, bm.image()))
+        self.assertTrue(numpy.allclose(self.mean, bm.image(photons=False)))
+        self.assertTrue(numpy.allclose(0.25 * numpy.sqrt(self.variance),
+            bm.noise()))
+        return
+
+
+    def test_findHotPixels(self):
+        """check BackgroundModel.findHotPixels()
+        """
+        self.assertFalse(self.model.hotpixels.any())
+        self.model.findHotPixels()
+        self.assertEqual([(2, 3)], list(zip(*self.model.hotpixels.nonzero())))
+        return
+
+
+    def test_save(self):
+        """check BackgroundModel.save() and loadBackground()
+        """
+        fn = os.path.join(self.tmpdir, 'dark.h5')
+        self.model.findHotPixels()
+        self.model.save(fn)
+        bm = loadBackground(fn)
+        self.assertTrue(numpy.array_equal(self.mean, bm.mean))
+        self.assertTrue(numpy.array_equal(self.variance, bm.variance))
+        self.assertTrue(numpy.array_equal(self.model.hotpixels, bm.hotpixels))
+        self.assertEqual((20, 0.25, 7),
+                (bm.nframes, bm.tophotons, bm.run_number))
+        import h5py
+        with h5py.File(fn, 'a') as fp:
+            fp.attrs['format'] = 'something-else'
+        self.assertRaises(ValueError, loadBackground, fn)
+        return
+
+# End of class TestBackgroundModel
+
+##############################################################################
+class TestBuildBackground(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        writeSyntheticRun(self.filename, nframes=8, shape=(12, 10), seed=3)
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_ccdframes_source(self):
+        """check buildBackground() from CCDFrames and from a filename
+        """
+        from py15sacla.background import buildBackground
+        from py15sacla.ccdframes import CCDFrames
+        ccd = CCDFrames(self.filename)
+        bm0 = buildBackground(self.filename)
+        bm1 = buildBackground(ccd)
+        self.assertTrue(numpy.allclose(bm0.mean, bm1.mean, atol=1e-5))
+        self.assertTrue(numpy.allclose(bm0.variance, bm1.variance,
+                                       rtol=1e-4))
+        self.assertTrue(numpy.allclose(ccd.mean(), bm1.image(), atol=1e-5))
+        ccd.setComputeType(numpy.int32)
+        bm2 = buildBackground(ccd)
+        self.assertTrue(numpy.allclose(bm0.mean, bm2.mean, atol=0.5))
+        return
+
+# End of class TestBuildBackground
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.batch
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla import batch
+from py15sacla.metrics import readMetrics
+
+##############################################################################
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_parseRunList(self):
+        """check parseRunList()
+        """
+        self.assertEqual([5], batch.parseRunList('5'))
+        self.assertEqual([3, 4, 5, 9, 1],
+                batch.parseRunList(['3-5', '9,1', '4']))
+        self.assertEqual([], batch.parseRunList([]))
+        return
+
+
+    def test_runBatch(self):
+        """check runBatch() retries and summary for missing input.
+        """
+        infile = os.path.join(self.tmpdir, 'run_{run}_sig.h5')
+        logdir = os.path.join(self.tmpdir, 'logs')
+        metricsfile = os.path.join(logdir, 'metrics.jsonl')
+        results = batch.runBatch([7], retries=2, logdir=logdir,
+                metricsfile=metricsfile, infile=infile, background=None)
+        r, = results
+        self.assertFalse(r.ok)
+        self.assertEqual(3, r.attempts)
+        self.assertTrue(os.path.isfile(r.logfile))
+        with open(r.logfile) as fp:
+            self.assertEqual(3, fp.read().count('# run 7 failed'))
+        records = readMetrics(metricsfile)
+        self.assertEqual([7, 7, 7], [rec['run'] for rec in records])
+        self.assertFalse(records[0]['ok'])
+        summary = batch.formatSummary(results)
+        self.assertTrue(summary.endswith('1 runs, 0 succeeded, 1 failed'))
+        return
+
+
+    def test_runBatch_outputs(self):
+        """check runBatch() images and variances of several runs.
+        """
+        from py15sacla.synthetic import writeSyntheticRun
+        from py15sacla.compression import signalFrames
+        from py15sacla.reduced import loadReduced
+        infile = os.path.join(self.tmpdir, 'run_{run}_sig.h5')
+        outfile = os.path.join(self.tmpdir, 'comp_{run}.h5')
+        logdir = os.path.join(self.tmpdir, 'logs')
+        runs = [3, 4, 5]
+        for run in runs:
+            writeSyntheticRun(infile.format(run=run), run=run,
+                    nframes=4 + run, shape=(8, 6), seed=run)
+        results = batch.runBatch(runs, jobs=2, logdir=logdir,
+                infile=infile, outfile=outfile, background=None)
+        self.assertEqual(runs, [r.run for r in results])
+        self.assertTrue(all(r.ok and r.attempts == 1 for r in results))
+        for run in runs:
+            signal = signalFrames(infile.format(run=run), background=None)
+            a = signal.toarray(slice(None))
+            signal.hdffile.close()
+            reduced = loadReduced(outfile.format(run=run))
+            self.assertEqual(4 + run, reduced.nframes)
+            self.assertTrue(numpy.allclose(a.mean(axis=0), reduced.image))
+            self.assertTrue(numpy.allclose(a.var(axis=0), reduced.variance))
+        summary = batch.formatSummary(results)
+        self.assertTrue(summary.endswith('3 runs, 3 succeeded, 0 failed'))
+        return
+
+
+    def test_runBatch_dead_worker(self):
+        """check runBatch() keeps runs finished before a worker died.
+        """
+        import time
+        from unittest import mock
+        from py15sacla import compression
+        from py15sacla.synthetic import writeSyntheticRun
+        infile = os.path.join(self.tmpdir, 'run_{run}_sig.h5')
+        outfile = os.path.join(self.tmpdir, 'comp_{run}.h5')
+        logdir = os.path.join(self.tmpdir, 'logs')
+        for run in (3, 4):
+            writeSyntheticRun(infile.format(run=run), run=run,
+                    nframes=5, shape=(8, 6), seed=run)
+        compressRun = compression.compressRun
+        marker = os.path.join(self.tmpdir, 'died')
+        def crash(run, **options):
+            if run == 4 and not os.path.exists(marker):
+                open(marker, 'w').close()
+                # let run 3 finish and report its result first
+                while not os.path.exists(outfile.format(run=3)):
+                    time.sleep(0.01)
+                time.sleep(0.5)
+                os._exit(1)
+            return compressRun(run, **options)
+        with mock.patch.object(compression, 'compressRun', crash):
+            results = batch.runBatch([3, 4], jobs=2, logdir=logdir,
+                    infile=infile, outfile=outfile, background=None)
+        self.assertTrue(os.path.exists(marker))
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([1, 2], [r.attempts for r in results])
+        with open(results[0].logfile) as fp:
+            self.assertEqual(1, fp.read().count('# run 3 finished'))
+        return
+
+
+    def test_jobArrayScript(self):
+        """check jobArrayScript()
+        """
+        script = batch.jobArrayScript([11, 12, 13], ['--input=a b'])
+        self.assertTrue('#PBS -J 0-2' in script)
+        self.assertTrue('RUNS=(11 12 13)' in script)
+        self.assertTrue("'--input=a b'" in script)
+        return
+
+# End of class TestBatch
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
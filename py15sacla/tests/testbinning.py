@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.binning
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import h5py
+
+from py15sacla.binning import binFrame, binnedShape, buildPyramid
+from py15sacla.ccdframes import CCDFrames
+
+##############################################################################
+class TestBinning(unittest.TestCase):
+
+    def test_binFrame(self):
+        """check binFrame()
+        """
+        a = numpy.arange(35, dtype=numpy.int32).reshape(5, 7)
+        b = binFrame(a, 2)
+        self.assertEqual((2, 3), b.shape)
+        self.assertEqual(numpy.int32, b.dtype)
+        self.assertEqual(a[:2, :2].sum(), b[0, 0])
+        self.assertEqual(a[2:4, 4:6].sum(), b[1, 2])
+        b = binFrame(a, (1, 3), mean=True)
+        self.assertEqual((5, 2), b.shape)
+        self.assertEqual(a[4, 3:6].mean(), b[4, 1])
+        stack = numpy.array([a, 2 * a])
+        self.assertTrue(numpy.array_equal(2 * binFrame(a, 2),
+            binFrame(stack, 2)[1]))
+        self.assertTrue(binFrame(a, 1) is a)
+        a16 = numpy.full((4, 4), 30000, dtype=numpy.int16)
+        b = binFrame(a16, 2)
+        self.assertEqual(numpy.int64, b.dtype)
+        self.assertEqual(120000, b[0, 0])
+        self.assertRaises(ValueError, binFrame, a, 0)
+        self.assertRaises(ValueError, binFrame, a, 1.5)
+        return
+
+
+    def test_binnedShape(self):
+        """check binnedShape()
+        """
+        self.assertEqual((2, 3), binnedShape((5, 7), 2))
+        self.assertEqual((5, 2), binnedShape((5, 7), (1, 3)))
+        self.assertEqual((0, 0), binnedShape((5, 7), 8))
+        return
+
+
+    def test_buildPyramid(self):
+        """check buildPyramid()
+        """
+        image = numpy.ones((300, 20))
+        levels = buildPyramid(image)
+        self.assertEqual([2, 4, 8], [f for f, a in levels])
+        self.assertEqual((37, 2), levels[-1][1].shape)
+        self.assertTrue(numpy.all(levels[-1][1] == 1))
+        self.assertEqual([], buildPyramid(numpy.ones((64, 64))))
+        self.assertEqual([2], [f for f, a in buildPyramid(image[:3], 1)])
+        return
+
+# End of class TestBinning
+
+
+class TestCCDFramesBinning(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(5)
+        with h5py.File(h5file, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(6):
+                dd = rs.poisson(0.5, (9, 8)).astype(numpy.float32) * 10
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = dd
+        self.ccd = CCDFrames(h5file)
+        self.ccd.setROI(numpy.s_[1:, :7])
+        self.ccd.setBackground(0.2)
+        self.ccd.setThreshold(0.5, None)
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_setBinning(self):
+        """check CCDFrames.setBinning()
+        """
+        ccd = self.ccd
+        a = ccd.toarray(slice(None))
+        m = ccd.mean()
+        ccd.setBinning(2)
+        self.assertEqual((4, 3), ccd.mean().shape)
+        self.assertTrue(numpy.allclose(binFrame(m, 2), ccd.mean()))
+        self.assertTrue(numpy.allclose(binFrame(a, 2),
+            ccd.toarray(slice(None))))
+        vmax = ccd.sketch().vmax
+        self.assertTrue(numpy.allclose(binFrame(a, 2).max(), vmax))
+        stack = ccd.toarray(slice(None), lazy=True)
+        self.assertEqual((6, 4, 3), stack.shape)
+        self.assertTrue(numpy.allclose(binFrame(a, 2).sum(0), stack.sum(0)))
+        self.assertRaises(ValueError, ccd.setBinning, 0)
+        return
+
+# End of class TestCCDFramesBinning
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
-"""Unit tests for py15sacla.hdfselection
+"""Unit tests for py15sacla.ccdframes
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 import numpy
 import h5py
@@ -30,6 +33,433 @@ class TestCCDFrames(unittest.TestCase):
 
 # End of class TestCCDFrames
 
+##############################################################################
+class TestCCDFramesComputeType(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(17)
+        with h5py.File(self.filename, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(12):
+                dd = rs.poisson(2, (6, 5)) * 10 + rs.randint(45, 56, (6, 5))
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = (
+                        dd.astype(numpy.int16))
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _ccd(self, dtype):
+        ccd = CCDFrames(self.filename)
+        ccd.setBackground(5.03)
+        ccd.setThreshold(0.5, 4)
+        ccd.setComputeType(dtype)
+        return ccd
+
+
+    def test_float32(self):
+        """check processing in single precision
+        """
+        c64 = self._ccd(None)
+        c32 = self._ccd(numpy.float32)
+        self.assertEqual(numpy.float64, c64.toarray(0).dtype)
+        self.assertEqual(numpy.float32, c32.toarray(0).dtype)
+        self.assertEqual(numpy.float32, c32.toarray([1, 2]).dtype)
+        self.assertTrue(numpy.allclose(c64.mean(), c32.mean(), rtol=1e-6))
+        self.assertTrue(numpy.allclose(c64.total(), c32.total(), rtol=1e-6))
+        return
+
+
+    def test_integer(self):
+        """check processing in integer detector units
+        """
+        c64 = self._ccd(None)
+        cint = self._ccd(numpy.int32)
+        a = cint.toarray(slice(None))
+        self.assertEqual(numpy.int32, a.dtype)
+        # background 5.03 photons is rounded to 50 ADU
+        a64 = c64.toarray(slice(None))
+        both = (a != 0) & (a64 != 0)
+        self.assertTrue(both.sum() > 100)
+        self.assertTrue(numpy.all(numpy.fabs(a * 0.1 - a64)[both] < 0.051))
+        c64.setBackground(5.0)
+        cint.setBackground(5.0)
+        self.assertTrue(numpy.allclose(c64.mean(), cint.mean()))
+        self.assertTrue(numpy.allclose(c64.atotal(), cint.atotal()))
+        self.assertTrue(numpy.allclose(c64.amax(), cint.amax()))
+        self.assertTrue(numpy.array_equal(c64.histogram(), cint.histogram()))
+        self.assertEqual(c64.chistbins, cint.chistbins)
+        self.assertEqual(c64.sketch().vmax, cint.sketch().vmax)
+        return
+
+
+    def test_integer_background(self):
+        """check integer processing with a large background
+        """
+        from py15sacla.synthetic import writeSyntheticRun
+        fn = os.path.join(self.tmpdir, 'run_2.h5')
+        writeSyntheticRun(fn, run=2, nframes=6, shape=(8, 6), seed=3)
+        c64 = CCDFrames(fn)
+        cint = CCDFrames(fn)
+        for ccd in (c64, cint):
+            ccd.setBackground(50)
+        cint.setComputeType(numpy.int32)
+        self.assertTrue(numpy.all(c64.mean() < -45))
+        self.assertTrue(numpy.allclose(c64.mean(), cint.mean(), atol=0.1))
+        cint.setBinning(2)
+        c64.setBinning(2)
+        self.assertTrue(numpy.allclose(c64.mean(), cint.mean(), atol=0.4))
+        for dtype in (numpy.uint16, numpy.uint32, numpy.int16, 'int8'):
+            self.assertRaises(ValueError, cint.setComputeType, dtype)
+        self.assertEqual(numpy.int32, cint.cdtype)
+        cint.setComputeType(numpy.int64)
+        self.assertEqual(numpy.int64, cint.toarray(0).dtype)
+        return
+
+
+    def test_hedges(self):
+        """check default histogram bins are the same before histogram()
+        """
+        c0 = self._ccd(None)
+        c1 = self._ccd(None)
+        e0 = c0.hedges
+        self.assertEqual(c0.chistbins[2] + 1, len(e0))
+        counts = c1.histogram()
+        self.assertTrue(numpy.array_equal(e0, c1.hedges))
+        self.assertTrue(numpy.array_equal(c0.histogram(), counts))
+        a = c0.toarray(slice(None))
+        self.assertTrue(e0[0] <= a.min() < e0[1])
+        self.assertTrue(e0[-2] <= a.max() < e0[-1])
+        return
+
+# End of class TestCCDFramesComputeType
+
+##############################################################################
+class TestCCDFramesCompress(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.sigfile = os.path.join(self.tmpdir, 'run_1.h5')
+        self.bgfile = os.path.join(self.tmpdir, 'run_2.h5')
+        writeSyntheticRun(self.sigfile, nframes=12, shape=(16, 12), seed=1)
+        writeSyntheticRun(self.bgfile, run=2, nframes=8, shape=(16, 12),
+                          seed=2)
+        self.keys = numpy.arange(12) % 2
+        self.bgkeys = numpy.arange(8) % 2
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _bgmap(self, roi=()):
+        bg = CCDFrames(self.bgfile)
+        bg.setROI(roi)
+        rv = dict(bg.groupbyitems(self.bgkeys))
+        for k in rv:
+            rv[k] = rv[k].mean()
+        return rv
+
+
+    def test_compress_bgframes(self):
+        """check CCDFrames.compress() with per-key background frames
+        """
+        ccd = CCDFrames(self.sigfile)
+        bg = CCDFrames(self.bgfile)
+        bgmap = self._bgmap()
+        for method in ('mean', 'sum', 'total'):
+            k0, c0 = ccd.compress(self.keys, method, bgmap)
+            k1, c1 = ccd.compress(self.keys, method, bgframes=bg,
+                                  bgkeys=self.bgkeys)
+            self.assertEqual(list(k0), list(k1))
+            self.assertTrue(numpy.allclose(c0, c1, atol=1e-5))
+        # ROI and binning are applied to the background frames
+        ccd.setROI(numpy.s_[2:10, :8])
+        ccd.setBinning(2)
+        k0, c0 = ccd.compress(self.keys, 'mean', self._bgmap(ccd.croislice))
+        k1, c1 = ccd.compress(self.keys, 'mean', bgframes=bg,
+                              bgkeys=self.bgkeys)
+        self.assertEqual((2, 4, 4), c1.shape)
+        self.assertTrue(numpy.allclose(c0, c1, atol=1e-5))
+        # threshold uses per-key background means as bgmap
+        ccd.setThreshold(0.5, None)
+        k0, c0 = ccd.compress(self.keys, 'sum', self._bgmap(ccd.croislice))
+        k1, c1 = ccd.compress(self.keys, 'sum', bgframes=bg,
+                              bgkeys=self.bgkeys)
+        self.assertTrue(numpy.allclose(c0, c1, atol=1e-5))
+        return
+
+
+    def test_compress_bgframes_errors(self):
+        """check CCDFrames.compress() errors with background frames
+        """
+        ccd = CCDFrames(self.sigfile)
+        bg = CCDFrames(self.bgfile)
+        self.assertRaises(ValueError, ccd.compress, self.keys, 'mean',
+                          {0 : 0, 1 : 0}, bg, self.bgkeys)
+        self.assertRaises(ValueError, ccd.compress, self.keys, 'mean',
+                          bgframes=bg, bgkeys=self.bgkeys[:3])
+        self.assertRaises(ValueError, ccd.compress, numpy.arange(12) % 3,
+                          'mean', bgframes=bg, bgkeys=self.bgkeys)
+        ccd.setThreshold(0.5, None)
+        self.assertRaises(ValueError, ccd.compress, numpy.arange(12) % 3,
+                          'mean', bgframes=bg, bgkeys=self.bgkeys)
+        return
+
+
+    def test_compress_bgframes_arrays(self):
+        """check CCDFrames.compress() background frames with own settings
+        """
+        ccd = CCDFrames(self.sigfile)
+        bg = CCDFrames(self.bgfile)
+        bgmap = self._bgmap()
+        # per-pixel threshold arrays use the bgmap path
+        shape = ccd.toarray(0).shape
+        ccd.setNoiseThreshold(numpy.ones(shape), -3, 3)
+        k0, c0 = ccd.compress(self.keys, 'mean', bgmap)
+        k1, c1 = ccd.compress(self.keys, 'mean', bgframes=bg,
+                              bgkeys=self.bgkeys)
+        self.assertTrue(numpy.allclose(c0, c1, atol=1e-5))
+        # per-key background replaces the background of the signal
+        ccd.setThreshold(None, None)
+        k2, c2 = ccd.compress(self.keys, 'mean', bgframes=bg,
+                              bgkeys=self.bgkeys)
+        ccd.setBackground(0.3)
+        k3, c3 = ccd.compress(self.keys, 'mean', bgframes=bg,
+                              bgkeys=self.bgkeys)
+        self.assertTrue(numpy.allclose(c2, c3, atol=1e-5))
+        ccd.setThreshold(-1e6, None)
+        k4, c4 = ccd.compress(self.keys, 'mean', bgframes=bg,
+                              bgkeys=self.bgkeys)
+        self.assertTrue(numpy.allclose(c3, c4, atol=1e-5))
+        return
+
+# End of class TestCCDFramesCompress
+
+##############################################################################
+class TestCCDFramesThreshold(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        writeSyntheticRun(self.filename, nframes=6, shape=(16, 12),
+                          rate=0.2, dtype=numpy.int16, seed=4)
+        self.ccd = CCDFrames(self.filename)
+        self.raw = self.ccd.toarray(slice(None))
+        rs = numpy.random.RandomState(5)
+        self.lo = rs.uniform(-2, 0, size=(16, 12))
+        self.hi = rs.uniform(0.5, 3, size=(16, 12))
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _thresholded(self, roi=numpy.s_[:, :]):
+        "Return raw frames thresholded with lo and hi arrays."
+        lo, hi = self.lo[roi], self.hi[roi]
+        rv = self.raw[(slice(None),) + roi].copy()
+        rv[(rv < lo) | (rv > hi)] = 0
+        return rv
+
+
+    def test_setThreshold(self):
+        """check CCDFrames.setThreshold() with per-pixel arrays
+        """
+        ccd = self.ccd
+        ccd.setThreshold(self.lo, self.hi)
+        a = ccd.toarray(slice(None))
+        self.assertTrue(numpy.array_equal(self._thresholded(), a))
+        # full-frame arrays are cropped to ROI
+        roi = numpy.s_[3:11, 2:9]
+        ccd.setROI(roi)
+        a = ccd.toarray(slice(None))
+        self.assertEqual((6, 8, 7), a.shape)
+        self.assertTrue(numpy.array_equal(self._thresholded(roi), a))
+        # arrays of the ROI shape are used as they are
+        ccd.setThreshold(self.lo[roi], self.hi[roi])
+        self.assertTrue(numpy.array_equal(a, ccd.toarray(slice(None))))
+        # uniform arrays are equivalent to scalar bounds
+        ccd.setThreshold(numpy.full((16, 12), -0.5), None)
+        a0 = ccd.toarray(slice(None))
+        ccd.setThreshold(-0.5, None)
+        self.assertTrue(numpy.array_equal(a0, ccd.toarray(slice(None))))
+        return
+
+
+    def test_setNoiseThreshold(self):
+        """check CCDFrames.setNoiseThreshold() from a dark background
+        """
+        from py15sacla.background import buildBackground
+        ccd = self.ccd
+        bm = buildBackground(self.filename)
+        noise = bm.noise()
+        ccd.setNoiseThreshold(bm, -2, 3)
+        self.assertTrue(numpy.allclose(-2 * noise, ccd.cthreshold[0]))
+        self.assertTrue(numpy.allclose(3 * noise, ccd.cthreshold[1]))
+        a = ccd.toarray(slice(None))
+        ccd.setNoiseThreshold(bm, None, 3)
+        self.assertIsNone(ccd.cthreshold[0])
+        fn = os.path.join(self.tmpdir, 'dark.h5')
+        bm.save(fn)
+        ccd.setNoiseThreshold(fn, -2, 3)
+        self.assertTrue(numpy.array_equal(a, ccd.toarray(slice(None))))
+        # raw units without normalization
+        ccd.cnormalize = False
+        ccd.setNoiseThreshold(fn, -2, 3)
+        self.assertTrue(numpy.allclose(-2 * bm.noise(photons=False),
+                                       ccd.cthreshold[0]))
+        return
+
+
+    def test_integer(self):
+        """check per-pixel threshold arrays with integer compute type
+        """
+        ccd = self.ccd
+        ccd.setThreshold(self.lo, self.hi)
+        m = ccd.mean()
+        ccd.setComputeType(numpy.int32)
+        self.assertTrue(numpy.allclose(m, ccd.mean()))
+        roi = numpy.s_[3:11, 2:9]
+        ccd.setROI(roi)
+        self.assertTrue(numpy.allclose(m[roi], ccd.mean()))
+        ccd.setThreshold(numpy.full((16, 12), 0.5), None)
+        a0 = ccd.toarray(slice(None))
+        ccd.setThreshold(0.5, None)
+        self.assertTrue(numpy.array_equal(a0, ccd.toarray(slice(None))))
+        return
+
+
+    def test_compress(self):
+        """check thresholded CCDFrames.compress() with per-pixel arrays
+        """
+        ccd = self.ccd
+        keys = numpy.arange(6) % 3
+        ccd.setThreshold(self.lo, self.hi)
+        k, c = ccd.compress(keys, 'sum')
+        a = self._thresholded()
+        self.assertEqual([0, 1, 2], list(k))
+        for i in k:
+            self.assertTrue(numpy.allclose(a[keys == i].sum(0), c[i]))
+        bgmap = {0 : 0.25, 1 : 0.5, 2 : 0}
+        k, c = ccd.compress(keys, 'mean', bgmap)
+        for i in k:
+            b = self.raw[keys == i] - bgmap[i]
+            b[(b < self.lo) | (b > self.hi)] = 0
+            self.assertTrue(numpy.allclose(b.mean(0), c[i]))
+        return
+
+# End of class TestCCDFramesThreshold
+
+##############################################################################
+class TestCCDFramesWeights(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        writeSyntheticRun(self.filename, nframes=12, shape=(8, 6),
+                          rate=1.0, noise=0.1, seed=3)
+        with h5py.File(self.filename, 'r') as fp:
+            ev = fp['run_1/event_info/bl_3/eh_2/photodiode']
+            self.i0 = (ev['photodiode_user_4_in_volt'][:] +
+                       ev['photodiode_user_5_in_volt'][:])
+        self.ccd = CCDFrames(self.filename)
+        self.frames = self.ccd.toarray(slice(None))
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_cached(self):
+        """check event weights and normalizer of cached frames
+        """
+        npyfile = os.path.join(self.tmpdir, 'run_1.npy')
+        ccd = self.ccd.cached(npyfile)
+        ccd.setNormalizer(('user_4', 'user_5'))
+        self.assertTrue(numpy.allclose(self.i0, ccd.cnormalizer))
+        norm = self.frames / self.i0[:, None, None]
+        self.assertTrue(numpy.allclose(norm.mean(0), ccd.mean()))
+        ccd.setWeights('user_4')
+        self.assertEqual(12, len(ccd.cweights))
+        self.assertRaises(ValueError, ccd.setNormalizer, 'no_such_data')
+        ccd.hdffile.close()
+        return
+
+
+    def test_setNormalizer(self):
+        """check CCDFrames.setNormalizer()
+        """
+        ccd = self.ccd
+        ccd.setNormalizer(('user_4', 'user_5'))
+        self.assertTrue(numpy.allclose(self.i0, ccd.cnormalizer))
+        norm = self.frames / self.i0[:, None, None]
+        self.assertTrue(numpy.allclose(norm.mean(0), ccd.mean()))
+        self.assertTrue(numpy.allclose(norm.sum(0), ccd.sum()))
+        self.assertTrue(numpy.allclose(norm.sum(), ccd.total()))
+        self.assertTrue(numpy.allclose(norm.sum(axis=(1, 2)), ccd.atotal()))
+        slow = ccd.mean(callback=lambda p: None)
+        self.assertTrue(numpy.allclose(norm.mean(0), slow))
+        # normalized sum and weights give sum(frames) / sum(I0)
+        ccd.setWeights(self.i0)
+        expect = self.frames.sum(0) / self.i0.sum()
+        self.assertTrue(numpy.allclose(expect, ccd.mean()))
+        self.assertTrue(numpy.allclose(expect, ccd.mean(stop=lambda p: 0)))
+        # zero normalizer excludes the frame
+        i0 = self.i0.copy()
+        i0[0] = 0
+        ccd.setWeights(None)
+        ccd.setNormalizer(i0)
+        self.assertTrue(numpy.allclose(norm[1:].mean(0), ccd.mean()))
+        self.assertRaises(ValueError, ccd.setNormalizer, i0[:3])
+        self.assertRaises(ValueError, ccd.setNormalizer, 'no_such_data')
+        return
+
+
+    def test_weighted_reductions(self):
+        """check weighted groupby, compress, histogram and meanAsync
+        """
+        import asyncio
+        ccd = self.ccd
+        ccd.setNormalizer(self.i0)
+        norm = self.frames / self.i0[:, None, None]
+        i0bins = numpy.round(self.i0 * 10).astype(int)
+        ukeys, sums = ccd.compress(i0bins, 'sum')
+        for k, a in zip(ukeys, sums):
+            self.assertTrue(numpy.allclose(norm[i0bins == k].sum(0), a))
+        sub = ccd._subset([2, 5])
+        self.assertTrue(numpy.allclose(norm[[2, 5]].mean(0), sub.mean()))
+        ccd.setHistBins(0, 6, 6)
+        expect = sum(numpy.histogram(a, 6, (0, 6))[0] / i0
+                     for a, i0 in zip(self.frames, self.i0))
+        self.assertTrue(numpy.allclose(expect, ccd.histogram()))
+        amean = asyncio.run(ccd.meanAsync(batchsize=5))
+        self.assertTrue(numpy.allclose(norm.mean(0), amean))
+        ccd.setComputeType(numpy.float32)
+        self.assertTrue(numpy.allclose(norm.mean(0), ccd.mean()))
+        return
+
+# End of class TestCCDFramesWeights
+
 if __name__ == '__main__':
     unittest.main()
 
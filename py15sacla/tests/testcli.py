@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.cli
+"""
+
+import io
+import os
+import shlex
+import shutil
+import tempfile
+import unittest
+import contextlib
+import numpy
+
+from py15sacla import cli
+from py15sacla.reduced import loadReduced, ReducedStore
+
+##############################################################################
+class TestCLI(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.tmpdir, 'run_{run}_sig.h5')
+        self.outfile = os.path.join(self.tmpdir, 'comp_{run}.h5')
+        self.logdir = os.path.join(self.tmpdir, 'logs')
+        for run in (3, 4):
+            writeSyntheticRun(self.infile.format(run=run), run=run,
+                    nframes=7, shape=(8, 6), seed=run)
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _main(self, *args):
+        "Return exit status and standard output of a compress command."
+        argv = ['compress', '--input=' + self.infile,
+                '--output=' + self.outfile, '--logdir=' + self.logdir,
+                '--background='] + list(args)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            rv = cli.main(argv)
+        return rv, out.getvalue()
+
+
+    def _expected(self, run):
+        "Return reduced run compressed directly with compressRun."
+        from py15sacla.compression import compressRun
+        outfile = os.path.join(self.tmpdir, 'expected_{run}.h5')
+        compressRun(run, infile=self.infile, outfile=outfile,
+                background=None)
+        return loadReduced(outfile.format(run=run))
+
+
+    def test_compress(self):
+        """check compress command on local runs
+        """
+        rv, out = self._main('3-4')
+        self.assertEqual(0, rv)
+        self.assertTrue('2 runs, 2 succeeded, 0 failed' in out)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.logdir, 'metrics.jsonl')))
+        for run in (3, 4):
+            reduced = loadReduced(self.outfile.format(run=run))
+            expected = self._expected(run)
+            self.assertEqual(7, reduced.nframes)
+            self.assertTrue(numpy.allclose(expected.image, reduced.image))
+        rv, out = self._main('5')
+        self.assertEqual(1, rv)
+        self.assertTrue('1 runs, 0 succeeded, 1 failed' in out)
+        return
+
+
+    def test_compress_chunksize(self):
+        """check compress command with chunks shared between workers
+        """
+        rv, out = self._main('3', '4', '--chunksize=3', '--jobs=2',
+                '--metrics=none')
+        self.assertEqual(0, rv)
+        self.assertTrue('2 runs, 2 succeeded, 0 failed' in out)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.logdir, 'metrics.jsonl')))
+        for run in (3, 4):
+            reduced = loadReduced(self.outfile.format(run=run))
+            expected = self._expected(run)
+            self.assertEqual(7, reduced.nframes)
+            self.assertTrue(numpy.allclose(expected.image, reduced.image))
+            self.assertTrue(numpy.allclose(
+                expected.variance, reduced.variance))
+        return
+
+
+    def test_compress_store(self):
+        """check compress command adding runs to a store
+        """
+        storefile = os.path.join(self.tmpdir, 'store.h5')
+        rv, out = self._main('3-5', '--store=' + storefile)
+        self.assertEqual(1, rv)
+        self.assertTrue('Added 2 runs to ' + storefile in out)
+        with ReducedStore(storefile, mode='r') as store:
+            self.assertEqual([3, 4], list(store.runs))
+        return
+
+
+    def test_compress_jobarray(self):
+        """check job array script of the compress command
+        """
+        scriptfile = os.path.join(self.tmpdir, 'jobs.sh')
+        rv, out = self._main('3-4', '--threshold=1,2',
+                '--emit-jobarray=' + scriptfile)
+        self.assertEqual(0, rv)
+        self.assertTrue('Wrote job array for 2 runs' in out)
+        self.assertFalse(os.path.exists(self.outfile.format(run=3)))
+        with open(scriptfile) as fp:
+            script = fp.read()
+        self.assertTrue('#PBS -J 0-1' in script)
+        self.assertTrue('RUNS=(3 4)' in script)
+        command = shlex.split(script.splitlines()[-1])
+        self.assertEqual(['exec', 'py15sacla', 'compress', '--jobs=1'],
+                command[:4])
+        self.assertTrue('--input=' + self.infile in command)
+        self.assertTrue('--threshold=1.0,2.0' in command)
+        # empty background must be passed to the array tasks
+        self.assertTrue('--background=' in command)
+        self.assertEqual('${RUNS[$IDX]}', command[-1])
+        return
+
+# End of class TestCLI
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
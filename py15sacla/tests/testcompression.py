@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.compression
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla import compression
+
+##############################################################################
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.tmpdir, 'run_1_sig.h5')
+        writeSyntheticRun(self.infile, nframes=11, shape=(8, 6), seed=5)
+        self.signal = compression.signalFrames(self.infile, background=0.1)
+        return
+
+
+    def tearDown(self):
+        self.signal.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_accumulateFrames(self):
+        """check accumulateFrames() in blocks of frames
+        """
+        a = self.signal.toarray(slice(None))
+        for batchsize in (1, 4, 16):
+            acc = compression.accumulateFrames(self.signal,
+                    batchsize=batchsize)
+            self.assertEqual(11, acc.count)
+            self.assertTrue(numpy.allclose(a.mean(axis=0), acc.mean))
+            self.assertTrue(numpy.allclose(a.var(axis=0), acc.variance()))
+        acc = compression.accumulateFrames(self.signal, 2, 9, batchsize=3)
+        self.assertEqual(7, acc.count)
+        self.assertTrue(numpy.allclose(a[2:9].mean(axis=0), acc.mean))
+        self.assertTrue(numpy.allclose(a[2:9].var(axis=0), acc.variance()))
+        return
+
+# End of class TestCompression
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
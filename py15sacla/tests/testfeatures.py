@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.features
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla.features import FeatureAccumulator, FEATURE_COLUMNS
+
+##############################################################################
+class TestFeatureAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(13)
+        self.frames = rs.poisson(2.0, size=(5, 9, 7)).astype(float)
+        self.frames[2] = 0
+        self.frames[2, 3, 4] = 5
+        self.rois = [('top', numpy.s_[:3, :]), ('spot', numpy.s_[2:4, 3:5])]
+        return
+
+
+    def test_update(self):
+        """check FeatureAccumulator.update()
+        """
+        acc = FeatureAccumulator(self.rois)
+        acc.update(self.frames[0])
+        acc.update(self.frames[1:])
+        tbl = acc.table()
+        names = list(FEATURE_COLUMNS) + ['roi_top', 'roi_spot']
+        self.assertEqual(names, list(tbl))
+        self.assertEqual(names, acc.columnnames())
+        self.assertEqual(5, acc.nframes)
+        f = self.frames
+        self.assertTrue(numpy.allclose(f.sum(axis=(1, 2)), tbl['total']))
+        self.assertTrue(numpy.allclose(f.max(axis=(1, 2)), tbl['max']))
+        self.assertTrue(numpy.allclose(f[:, :3].sum(axis=(1, 2)),
+            tbl['roi_top']))
+        self.assertTrue(numpy.allclose(f[:, 2:4, 3:5].sum(axis=(1, 2)),
+            tbl['roi_spot']))
+        y, x = numpy.indices((9, 7))
+        com = (f[1] * y).sum() / f[1].sum()
+        self.assertAlmostEqual(com, tbl['com_row'][1])
+        wx = numpy.sqrt((f[1] * x * x).sum() / f[1].sum() -
+            ((f[1] * x).sum() / f[1].sum()) ** 2)
+        self.assertAlmostEqual(wx, tbl['width_col'][1])
+        self.assertEqual((3, 4), (tbl['peak_row'][2], tbl['peak_col'][2]))
+        self.assertEqual((3.0, 4.0), (tbl['com_row'][2], tbl['com_col'][2]))
+        self.assertEqual(0, tbl['width_row'][2])
+        self.assertEqual(int, tbl['peak_row'].dtype)
+        return
+
+
+    def test_scale(self):
+        """check FeatureAccumulator.update() with scale factors
+        """
+        s = numpy.array([1, 2, 0.5, 1, 3])
+        acc = FeatureAccumulator(self.rois)
+        acc.update(self.frames, scale=s)
+        ref = FeatureAccumulator(self.rois)
+        ref.update(self.frames * s[:, None, None])
+        for name, a in ref.table().items():
+            self.assertTrue(numpy.allclose(a, acc.table()[name]), name)
+        empty = FeatureAccumulator()
+        empty.update(numpy.zeros((1, 2, 2)))
+        self.assertTrue(numpy.isnan(empty.table()['com_row'][0]))
+        return
+
+
+    def test_merge(self):
+        """check FeatureAccumulator.merge()
+        """
+        acc = FeatureAccumulator(self.rois)
+        acc.tags = numpy.arange(2)
+        acc.update(self.frames[:2])
+        acc2 = FeatureAccumulator(self.rois)
+        acc2.tags = numpy.arange(2, 5)
+        acc2.update(self.frames[2:])
+        acc.merge(acc2)
+        self.assertEqual(5, acc.nframes)
+        self.assertEqual(list(range(5)), list(acc.table()['tag']))
+        self.assertEqual(5, len(acc.table()['total']))
+        self.assertRaises(ValueError, acc.merge, FeatureAccumulator())
+        return
+
+# End of class TestFeatureAccumulator
+
+##############################################################################
+class TestCCDFramesFeatures(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        self.tags = writeSyntheticRun(self.filename, nframes=7,
+                                      shape=(12, 10), rate=0.5)
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_features(self):
+        """check CCDFrames.features()
+        """
+        from py15sacla.ccdframes import CCDFrames
+        ccd = CCDFrames(self.filename)
+        ccd.setThreshold(0.5, None)
+        rois = {'spot' : numpy.s_[3:9, 2:8]}
+        acc = ccd.features(rois, batchsize=3)
+        tbl = acc.table()
+        self.assertEqual(self.tags, list(tbl['tag']))
+        self.assertTrue(numpy.allclose(ccd.atotal(), tbl['total']))
+        self.assertTrue(numpy.allclose(ccd.amax(), tbl['max']))
+        frames = ccd.toarray(slice(None))
+        self.assertTrue(numpy.allclose(
+            frames[:, 3:9, 2:8].sum(axis=(1, 2)), tbl['roi_spot']))
+        i0 = numpy.linspace(1, 2, 7)
+        ccd.setNormalizer(i0)
+        tbl1 = ccd.features(rois).table()
+        self.assertTrue(numpy.allclose(tbl['total'] / i0, tbl1['total']))
+        self.assertTrue(numpy.allclose(tbl['com_col'], tbl1['com_col']))
+        return
+
+# End of class TestCCDFramesFeatures
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""Unit tests for findfiles in py15sacla.utils
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+##############################################################################
+class TestFindFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_findfiles(self):
+        """check findfiles()
+        """
+        from py15sacla.utils import findfiles
+        for n in (2, 10, 1):
+            fn = os.path.join(self.tmpdir, 'run_{}.h5'.format(n))
+            open(fn, 'w').close()
+        os.mkdir(os.path.join(self.tmpdir, 'run_3.h5'))
+        rv = findfiles('run_<2-> h5$', self.tmpdir)
+        self.assertEqual(['run_2.h5', 'run_10.h5'],
+                [os.path.basename(f) for f in rv])
+        self.assertEqual(3, len(findfiles('run_', [self.tmpdir])))
+        return
+
+
+    def test_findfiles_cache(self):
+        """check cached directory listings of findfiles()
+        """
+        from py15sacla.utils import findfiles
+        d = self.tmpdir
+        open(os.path.join(d, 'run_1.h5'), 'w').close()
+        os.utime(d, (1e9, 1e9))
+        self.assertEqual(1, len(findfiles('run_', d)))
+        # new file is not seen when mtime stays the same
+        open(os.path.join(d, 'run_2.h5'), 'w').close()
+        os.utime(d, (1e9, 1e9))
+        self.assertEqual(1, len(findfiles('run_', d)))
+        self.assertEqual(2, len(findfiles('run_', d, cache=False)))
+        os.utime(d, (1e9 + 1, 1e9 + 1))
+        self.assertEqual(2, len(findfiles('run_', d)))
+        # recently modified directories are not cached
+        open(os.path.join(d, 'run_3.h5'), 'w').close()
+        self.assertEqual(3, len(findfiles('run_', d)))
+        open(os.path.join(d, 'run_4.h5'), 'w').close()
+        self.assertEqual(4, len(findfiles('run_', [d, d, 'not/a/dir'])))
+        return
+
+# End of class TestFindFiles
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
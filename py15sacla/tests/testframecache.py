@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.framecache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import h5py
+
+from py15sacla.ccdframes import CCDFrames
+from py15sacla.hdfselection import HDFSelection
+from py15sacla.framecache import FrameCache, exportFrameCache
+from py15sacla.framecache import isCacheCurrent, indexPath
+
+##############################################################################
+class TestFrameCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(3)
+        with h5py.File(self.h5file, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(6):
+                dd = rs.poisson(0.5, (5, 4)).astype(numpy.float32) * 10
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = dd
+        self.ccd = CCDFrames(self.h5file)
+        self.npyfile = os.path.join(self.tmpdir, 'run_1.npy')
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_exportFrameCache(self):
+        """check exportFrameCache() and FrameCache
+        """
+        fc = exportFrameCache(self.ccd, self.npyfile)
+        self.assertTrue(os.path.isfile(indexPath(self.npyfile)))
+        self.assertEqual((6, 5, 4), fc.frames.shape)
+        self.assertEqual(self.ccd.selection.names, fc.names)
+        fr = fc[fc.names[2]]
+        self.assertTrue(numpy.array_equal(self.ccd.selection[2][()], fr[()]))
+        # frames are views of the read-only memory map
+        self.assertTrue(numpy.shares_memory(fc.frames, fr[1:3]))
+        self.assertFalse(fr[()].flags.writeable)
+        self.assertAlmostEqual(0.1, fr.config()['tophotons'])
+        self.assertFalse(fc.frames.flags.writeable)
+        fc = FrameCache(self.npyfile)
+        self.assertEqual(1, len(HDFSelection(fc, 'tag_103/')))
+        sel = HDFSelection(fc, 'tag_<101-103> detector_data$')
+        self.assertEqual(3, len(sel))
+        self.assertEqual(self.ccd.selection.names[1:4], sel.names)
+        return
+
+
+    def test_cached(self):
+        """check CCDFrames.cached()
+        """
+        self.ccd.setROI(numpy.s_[1:4, 1:])
+        self.ccd.setThreshold(0.5, 4)
+        self.assertFalse(isCacheCurrent(self.npyfile, self.ccd.selection))
+        ccd1 = self.ccd.cached(self.npyfile)
+        self.assertTrue(isCacheCurrent(self.npyfile, self.ccd.selection))
+        self.assertIsInstance(ccd1.hdffile, FrameCache)
+        self.assertEqual(self.ccd.croislice, ccd1.croislice)
+        self.assertEqual(0, ccd1.cprefetch)
+        m0 = self.ccd.mean()
+        self.assertTrue(numpy.array_equal(m0, ccd1.mean()))
+        # processing must not modify the cached frames
+        self.assertTrue(numpy.array_equal(m0, ccd1.mean()))
+        a0 = self.ccd.toarray([1, 4])
+        self.assertTrue(numpy.array_equal(a0, ccd1.toarray([1, 4])))
+        ccd2 = self.ccd.cached(self.npyfile)
+        self.assertEqual(ccd1.hdffile.names, ccd2.hdffile.names)
+        sub = self.ccd.selection[:3]
+        self.assertFalse(isCacheCurrent(self.npyfile, sub))
+        return
+
+# End of class TestFrameCache
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.groupstats
+"""
+
+import unittest
+import numpy
+
+from py15sacla.groupstats import unique_ordered, multiplicities
+from py15sacla.groupstats import unique_inverse_ordered
+
+##############################################################################
+class TestGroupStats(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = numpy.array([3, 1, 3, 2, 1, 3, 7])
+        return
+
+
+    def test_unique_ordered(self):
+        """check unique_ordered()
+        """
+        self.assertEqual([3, 1, 2, 7], unique_ordered(self.keys).tolist())
+        self.assertEqual(['b', 'a'], unique_ordered(list('bab')).tolist())
+        self.assertEqual(0, len(unique_ordered([])))
+        return
+
+
+    def test_multiplicities(self):
+        """check multiplicities()
+        """
+        self.assertEqual([3, 2, 1, 1], multiplicities(self.keys).tolist())
+        self.assertEqual([4], multiplicities(numpy.zeros((2, 2))).tolist())
+        return
+
+
+    def test_unique_inverse_ordered(self):
+        """check unique_inverse_ordered()
+        """
+        u, inv = unique_inverse_ordered(self.keys)
+        self.assertEqual([3, 1, 2, 7], u.tolist())
+        self.assertEqual([0, 1, 0, 2, 1, 0, 3], inv.tolist())
+        self.assertTrue(numpy.array_equal(self.keys, u[inv]))
+        return
+
+# End of class TestGroupStats
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.histogram
+"""
+
+import unittest
+import numpy
+
+from py15sacla.histogram import HistogramAccumulator, autoBins
+from py15sacla.utils import eqbinhistogram
+
+##############################################################################
+class TestHistogramAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(7)
+        self.frames = rs.normal(1.0, 0.8, size=(6, 5, 4))
+        self.keys = [2, 1, 2, 2, 3, 1]
+        return
+
+
+    def test_update(self):
+        """check HistogramAccumulator.update()
+        """
+        acc = HistogramAccumulator((0, 2, 10), perframe=True)
+        for a in self.frames:
+            acc.update(a)
+        acc.update(self.frames)
+        expect = numpy.array([eqbinhistogram(a, bins=10, range=(0, 2))[0]
+            for a in self.frames])
+        self.assertTrue(numpy.array_equal(2 * expect.sum(axis=0),
+            acc.counts()))
+        self.assertTrue(numpy.array_equal(expect, acc.framecounts()[6:]))
+        nout = 2 * numpy.sum(self.frames < 0)
+        self.assertEqual(nout, acc.underflow())
+        self.assertEqual(2 * self.frames.size,
+            acc.underflow() + acc.counts().sum() + acc.overflow())
+        return
+
+
+    def test_weighted(self):
+        """check weighted HistogramAccumulator.update()
+        """
+        w = numpy.array([1, 0.5, 2, 0, 1, 3])
+        acc = HistogramAccumulator((0, 2, 10), perframe=True)
+        acc.update(self.frames[:2], self.keys[:2], weight=w[:2])
+        acc.update(self.frames[2], self.keys[2], scale=w[2])
+        acc.update(self.frames[3:], self.keys[3:], w[3:], 1.0)
+        plain = numpy.array([eqbinhistogram(a, bins=10, range=(0, 2))[0]
+            for a in self.frames])
+        expect = plain * w[:, None]
+        self.assertEqual(float, acc.counts().dtype)
+        self.assertTrue(numpy.allclose(expect.sum(axis=0), acc.counts()))
+        self.assertTrue(numpy.allclose(expect, acc.framecounts()))
+        keys, kc = acc.keycounts()
+        self.assertTrue(numpy.allclose(expect[[0, 2, 3]].sum(axis=0), kc[0]))
+        acc1 = HistogramAccumulator((0, 2, 10), perframe=True)
+        acc1.update(self.frames)
+        acc1.merge(acc)
+        self.assertTrue(numpy.allclose((plain + expect).sum(axis=0),
+            acc1.counts()))
+        self.assertTrue(numpy.allclose(expect, acc1.framecounts()[6:]))
+        return
+
+
+    def test_keycounts(self):
+        """check per-key counts for several bin specifications.
+        """
+        acc = HistogramAccumulator([(0, 2, 10), (-1, 3, 4)])
+        acc.update(self.frames, self.keys)
+        keys, kc = acc.keycounts(1)
+        self.assertEqual([2, 1, 3], keys)
+        k1 = numpy.array(self.keys) == 1
+        c1 = eqbinhistogram(self.frames[k1], bins=4, range=(-1, 3))[0]
+        self.assertTrue(numpy.array_equal(c1, kc[1]))
+        self.assertTrue(numpy.array_equal(acc.counts(1), kc.sum(axis=0)))
+        return
+
+
+    def test_auto_range(self):
+        """check automatic range selection and merging.
+        """
+        acc = HistogramAccumulator((None, None, 20))
+        acc.update(self.frames)
+        lo, hi, bins = acc.range()
+        self.assertTrue(lo <= self.frames.min())
+        self.assertTrue(self.frames.max() < hi)
+        self.assertEqual(self.frames.size, acc.counts().sum())
+        acc1 = HistogramAccumulator((None, None, 20))
+        acc1.update(self.frames[:1] / 4)
+        acc2 = HistogramAccumulator((None, None, 20))
+        acc2.update(self.frames[1:])
+        acc1.merge(acc2)
+        lo1, hi1, bins1 = acc1.range()
+        c1 = eqbinhistogram(numpy.r_[self.frames[:1].ravel() / 4,
+            self.frames[1:].ravel()], bins=bins1, range=(lo1, hi1))[0]
+        self.assertTrue(numpy.array_equal(c1, acc1.counts()))
+        self.assertEqual((lo1, hi1, bins1), autoBins(self.frames.min(),
+            self.frames.max(), 20))
+        self.assertRaises(ValueError, HistogramAccumulator, (None, None, 1))
+        return
+
+
+    def test_autoBins(self):
+        """check autoBins() range for the extent of values.
+        """
+        vmin, vmax = self.frames.min(), self.frames.max()
+        lo, hi, bins = autoBins(vmin, vmax, 20)
+        delta = (hi - lo) / bins
+        self.assertTrue(bins <= 20)
+        self.assertTrue(lo <= vmin < lo + delta)
+        self.assertTrue(hi - delta <= vmax < hi)
+        self.assertEqual((0.0, 2.0, 2), autoBins(0, 1.5, 2))
+        self.assertEqual((0.0, 0.5, 4), autoBins(0, 0.4, 5))
+        acc = HistogramAccumulator((None, None, 20), perframe=True)
+        acc.update(self.frames, self.keys)
+        self.assertEqual((lo, hi, bins), acc.range())
+        self.assertEqual((bins,), acc.counts().shape)
+        self.assertEqual((6, bins), acc.framecounts().shape)
+        self.assertEqual((3, bins), acc.keycounts()[1].shape)
+        self.assertTrue(numpy.array_equal(acc.edges(),
+            numpy.linspace(lo, hi, bins + 1)))
+        return
+
+# End of class TestHistogramAccumulator
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.integration
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla.integration import ProfileBins, ProfileAccumulator
+from py15sacla.integration import radialBins, axisBins
+
+##############################################################################
+class TestProfileBins(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(11)
+        self.frames = rs.poisson(3.0, size=(5, 9, 7)).astype(float)
+        return
+
+
+    def test_profiles(self):
+        """check ProfileBins.profiles()
+        """
+        binmap = numpy.zeros((9, 7), dtype=int)
+        binmap[:3] = 2
+        binmap[-1] = -1
+        bins = ProfileBins(binmap, [0, 1, 2])
+        self.assertEqual([5 * 7, 0, 3 * 7], list(bins.npix))
+        p = bins.profiles(self.frames[0])
+        self.assertEqual((3,), p.shape)
+        self.assertAlmostEqual(self.frames[0, 3:8].mean(), p[0])
+        self.assertTrue(numpy.isnan(p[1]))
+        self.assertAlmostEqual(self.frames[0, :3].mean(), p[2])
+        pp = bins.profiles(self.frames)
+        self.assertTrue(numpy.allclose(p, pp[0], equal_nan=True))
+        self.assertTrue(numpy.allclose(self.frames[:, :3].mean(axis=(1, 2)),
+            pp[:, 2]))
+        self.assertTrue(numpy.allclose(pp[:2], bins.profiles(
+            self.frames[:2]), equal_nan=True))
+        self.assertRaises(ValueError, bins.profiles, self.frames[:, :5])
+        return
+
+
+    def test_radialBins(self):
+        """check radialBins()
+        """
+        bins = radialBins((9, 7), (4, 3), binwidth=2)
+        self.assertEqual(3, len(bins))
+        self.assertEqual([1, 3, 5], list(bins.centers))
+        self.assertEqual(63, bins.npix.sum())
+        self.assertEqual(9, bins.npix[0])
+        mask = numpy.zeros((9, 7), dtype=bool)
+        mask[4, 3] = True
+        bins = radialBins((9, 7), (4, 3), binwidth=2, rmax=2, mask=mask)
+        self.assertEqual([8], list(bins.npix))
+        tth = radialBins((9, 7), (4, 3), binwidth=5, pixelsize=1,
+                         distance=10)
+        self.assertEqual(6, len(tth))
+        r = numpy.degrees(numpy.arctan(numpy.hypot(4, 3) / 10.0))
+        self.assertTrue(tth.centers[-1] + 2.5 > r)
+        self.assertRaises(ValueError, radialBins, (9, 7), (4, 3),
+                          distance=10)
+        return
+
+
+    def test_axisBins(self):
+        """check axisBins()
+        """
+        bins = axisBins((9, 7), axis=0, binwidth=2)
+        self.assertEqual(5, len(bins))
+        self.assertEqual([14, 14, 14, 14, 7], list(bins.npix))
+        p = bins.profiles(self.frames[0])
+        self.assertAlmostEqual(self.frames[0, 8].mean(), p[-1])
+        bins = axisBins((9, 7), axis=1)
+        p = bins.profiles(self.frames[1])
+        self.assertTrue(numpy.allclose(self.frames[1].mean(axis=0), p))
+        self.assertRaises(ValueError, axisBins, (9, 7), 2)
+        return
+
+# End of class TestProfileBins
+
+##############################################################################
+class TestProfileAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(12)
+        self.frames = rs.poisson(3.0, size=(6, 9, 7)).astype(float)
+        self.bins = axisBins((9, 7), axis=0)
+        self.keys = [2, 1, 2, 2, 3, 1]
+        return
+
+
+    def test_update(self):
+        """check ProfileAccumulator.update()
+        """
+        acc = ProfileAccumulator(self.bins, perframe=True)
+        acc.update(self.frames[0], self.keys[0])
+        acc.update(self.frames[1:], self.keys[1:])
+        expect = self.frames.mean(axis=2)
+        self.assertEqual(6, acc.nframes)
+        self.assertTrue(numpy.allclose(expect, acc.frameprofiles()))
+        self.assertTrue(numpy.allclose(expect.mean(0), acc.profile()))
+        self.assertTrue(numpy.allclose(expect.var(0), acc.variance()))
+        keys, kp = acc.keyprofiles()
+        self.assertEqual([2, 1, 3], keys)
+        self.assertTrue(numpy.allclose(expect[[1, 5]].mean(0), kp[1]))
+        self.assertRaises(ValueError, acc.update, self.frames[:2], [1])
+        nokeep = ProfileAccumulator(self.bins)
+        self.assertRaises(ValueError, nokeep.frameprofiles)
+        self.assertEqual(0, len(nokeep.profile()))
+        return
+
+
+    def test_weighted(self):
+        """check weighted ProfileAccumulator.update()
+        """
+        w = numpy.array([1, 2, 0.5, 1, 3, 1])
+        s = numpy.array([1, 0.5, 2, 1, 1, 4])
+        acc = ProfileAccumulator(self.bins, perframe=True)
+        acc.update(self.frames, self.keys, w, s)
+        expect = self.frames.mean(axis=2) * s[:, None]
+        self.assertTrue(numpy.allclose(expect, acc.frameprofiles()))
+        self.assertTrue(numpy.allclose(
+            numpy.average(expect, axis=0, weights=w), acc.profile()))
+        keys, kp = acc.keyprofiles()
+        self.assertTrue(numpy.allclose(
+            numpy.average(expect[[1, 5]], axis=0, weights=w[[1, 5]]), kp[1]))
+        return
+
+
+    def test_merge(self):
+        """check ProfileAccumulator.merge()
+        """
+        acc = ProfileAccumulator(self.bins, perframe=True)
+        acc.update(self.frames, self.keys)
+        acc1 = ProfileAccumulator(self.bins, perframe=True)
+        acc1.update(self.frames[:2], self.keys[:2])
+        acc2 = ProfileAccumulator(self.bins, perframe=True)
+        acc2.update(self.frames[2:], self.keys[2:])
+        acc1.merge(acc2)
+        self.assertEqual(acc.keys, acc1.keys)
+        self.assertTrue(numpy.allclose(acc.profile(), acc1.profile()))
+        self.assertTrue(numpy.allclose(acc.keyprofiles()[1],
+            acc1.keyprofiles()[1]))
+        self.assertTrue(numpy.allclose(acc.frameprofiles(),
+            acc1.frameprofiles()))
+        other = ProfileAccumulator(axisBins((9, 7), axis=1))
+        self.assertRaises(ValueError, acc.merge, other)
+        return
+
+# End of class TestProfileAccumulator
+
+##############################################################################
+class TestCCDFramesIntegrate(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        writeSyntheticRun(self.filename, nframes=8, shape=(16, 12))
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_integrate(self):
+        """check CCDFrames.integrate()
+        """
+        from py15sacla.ccdframes import CCDFrames
+        ccd = CCDFrames(self.filename)
+        ccd.setROI(numpy.s_[2:14, :])
+        ccd.setBinning(2)
+        frames = ccd.toarray(slice(None))
+        bins = radialBins(frames.shape[1:], (3, 3))
+        keys = numpy.arange(8) % 2
+        acc = ccd.integrate(bins, keys, perframe=True)
+        expect = bins.profiles(frames)
+        self.assertTrue(numpy.allclose(expect, acc.frameprofiles()))
+        self.assertTrue(numpy.allclose(expect.mean(0), acc.profile()))
+        self.assertTrue(numpy.allclose(expect[1::2].mean(0),
+            acc.keyprofiles()[1][1]))
+        self.assertRaises(ValueError, ccd.integrate, radialBins((3, 3),
+            (1, 1)))
+        return
+
+# End of class TestCCDFramesIntegrate
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.ipy_all
+"""
+
+import sys
+import unittest
+import subprocess
+
+import py15sacla.ipy_all
+
+##############################################################################
+class TestIpyAll(unittest.TestCase):
+
+    def _loaded(self, statement):
+        "Return heavy modules loaded by statement in a new process."
+        script = ('import sys\n{}\nprint(" ".join(m for m in '
+                  '("numpy", "h5py", "IPython") if m in sys.modules))')
+        out = subprocess.check_output(
+                [sys.executable, '-c', script.format(statement)])
+        return out.decode().split()
+
+
+    def test_lazy_import(self):
+        """check lazy attributes of ipy_all
+        """
+        self.assertEqual([], self._loaded(
+            'from py15sacla.ipy_all import findfiles'))
+        self.assertEqual([], self._loaded(
+            'from py15sacla.cli import _buildParser; _buildParser()'))
+        self.assertEqual(['numpy', 'h5py'], self._loaded(
+            'from py15sacla.ipy_all import *'))
+        from py15sacla.ccdframes import CCDFrames
+        self.assertTrue(py15sacla.ipy_all.CCDFrames is CCDFrames)
+        self.assertTrue('findfiles' in dir(py15sacla.ipy_all))
+        self.assertRaises(AttributeError, getattr, py15sacla.ipy_all, 'x')
+        return
+
+# End of class TestIpyAll
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
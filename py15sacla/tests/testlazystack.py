@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.lazystack
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import h5py
+
+from py15sacla.ccdframes import CCDFrames
+
+##############################################################################
+class TestLazyFrameStack(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(19)
+        with h5py.File(h5file, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(15):
+                dd = rs.poisson(0.5, (7, 6)).astype(numpy.float32) * 10
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = dd
+        self.ccd = CCDFrames(h5file)
+        self.ccd.setROI(numpy.s_[1:, :5])
+        self.ccd.setThreshold(0.5, 4)
+        self.indices = [4, 1, 13, 1, 7, 0, 9, 10]
+        self.a = self.ccd.toarray(self.indices)
+        self.stack = self.ccd.toarray(self.indices, lazy=True, chunksize=3)
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test___getitem__(self):
+        """check indexing of LazyFrameStack
+        """
+        a, stack = self.a, self.stack
+        self.assertEqual(a.shape, stack.shape)
+        self.assertEqual(a.dtype, stack.dtype)
+        keys = [2, -1, slice(None), numpy.s_[5:1:-2, 1:3],
+                numpy.s_[:, 2, [1, 3]], numpy.s_[[6, 0, 0]],
+                a.sum(axis=(1, 2)) > 1]
+        for k in keys:
+            self.assertTrue(numpy.array_equal(a[k], stack[k]))
+        self.assertEqual((0, 6, 5), stack[3:3].shape)
+        self.assertRaises(IndexError, stack.__getitem__, ([1, 2], [0, 1]))
+        self.assertTrue(numpy.array_equal(a, numpy.asarray(stack)))
+        self.assertTrue(numpy.array_equal(a, numpy.array(list(stack))))
+        return
+
+
+    def test_reductions(self):
+        """check reductions of LazyFrameStack
+        """
+        a, stack = self.a, self.stack
+        for axis in [None, 0, 2, (1, 2), (0, -1)]:
+            self.assertTrue(numpy.allclose(a.sum(axis), stack.sum(axis)))
+            self.assertTrue(numpy.allclose(a.mean(axis), stack.mean(axis)))
+            self.assertTrue(numpy.array_equal(a.min(axis), stack.min(axis)))
+            self.assertTrue(numpy.array_equal(a.max(axis), stack.max(axis)))
+        self.assertRaises(ValueError, stack.sum, 3)
+        return
+
+
+    def test_stream(self):
+        """check LazyFrameStack of ordered frames in a single pass
+        """
+        from unittest import mock
+        indices = [0, 2, 5, 9, 14]
+        a = self.ccd.toarray(indices)
+        stack = self.ccd.toarray(indices, lazy=True, chunksize=3)
+        generate = mock.patch.object(CCDFrames, 'generate', autospec=True,
+                side_effect=CCDFrames.generate)
+        with self.ccd.profile() as stats, generate as g:
+            self.assertTrue(numpy.array_equal(a, numpy.array(list(stack))))
+            # repeated frames within and across chunks
+            k = [0, 1, 1, 1, 2, 2, 3, 4]
+            self.assertTrue(numpy.array_equal(a[k], stack[k]))
+        self.assertEqual(2, g.call_count)
+        self.assertEqual(10, stats.counters['frames'])
+        self.assertTrue(numpy.allclose(a.sum((1, 2)), stack.sum((1, 2))))
+        self.assertTrue(numpy.array_equal(a[1:4:2], stack[1:4:2]))
+        self.assertTrue(numpy.array_equal(a[-1], stack[-1]))
+        return
+
+
+    def test_spill(self):
+        """check evaluation of LazyFrameStack to a memory-mapped file
+        """
+        fn = os.path.join(self.tmpdir, 'stack.npy')
+        self.stack.spill(fn)
+        self.assertTrue(numpy.array_equal(self.a, numpy.load(fn)))
+        self.ccd.hdffile.close()
+        self.assertTrue(numpy.allclose(self.a.mean(0), self.stack.mean(0)))
+        self.assertTrue(numpy.array_equal(self.a[3, 2:], self.stack[3, 2:]))
+        return
+
+# End of class TestLazyFrameStack
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
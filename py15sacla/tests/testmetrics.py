@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.metrics
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from py15sacla import metrics
+from py15sacla.profiling import ProfileStats
+
+##############################################################################
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmpdir, 'metrics.jsonl')
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _record(self, run, nframes, walltime, host='node1', ok=True):
+        stats = ProfileStats()
+        stats.count('frames', nframes)
+        stats.count('bytes', nframes * 10**6)
+        stats.add('read', walltime / 2)
+        stats.peak('rss', 2e8)
+        rv = metrics.runRecord(run, 'run_{}.h5'.format(run), stats,
+                walltime, ok=ok, error=None if ok else 'IOError: bad')
+        rv['host'] = host
+        return rv
+
+
+    def test_runRecord(self):
+        """check runRecord()
+        """
+        rec = self._record(5, 100, 4.0)
+        self.assertEqual(5, rec['run'])
+        self.assertEqual(25.0, rec['frames_per_s'])
+        self.assertEqual(25.0, rec['mb_per_s'])
+        self.assertEqual(200.0, rec['peak_rss_mb'])
+        self.assertEqual({'read' : 2.0}, rec['stages'])
+        self.assertEqual(0, rec['insize'])
+        self.assertTrue(metrics.peakRSS() > 0)
+        return
+
+
+    def test_readMetrics(self):
+        """check appendMetrics() and readMetrics()
+        """
+        metrics.appendMetrics(self.logfile, self._record(5, 100, 4.0))
+        with open(self.logfile, 'a') as fp:
+            fp.write('{"run": 6, "truncat')
+        self.assertEqual([5], [r['run'] for r in
+            metrics.readMetrics(self.logfile)])
+        with open(self.logfile, 'a') as fp:
+            fp.write('\n')
+        metrics.appendMetrics(self.logfile, self._record(7, 10, 1.0))
+        records = metrics.readMetrics([self.logfile])
+        self.assertEqual([5, 7], [r['run'] for r in records])
+        return
+
+
+    def test_summarizeMetrics(self):
+        """check summarizeMetrics()
+        """
+        records = [self._record(1, 100, 1.0), self._record(2, 100, 1.0),
+                   self._record(3, 100, 10.0, host='node2'),
+                   self._record(4, 0, 0.5, host='node2', ok=False)]
+        summary = metrics.summarizeMetrics(records)
+        lines = summary.split('\n')
+        self.assertTrue(lines[1].startswith('node1'))
+        self.assertEqual(['2', '0', '200', '100.0'], lines[1].split()[1:5])
+        self.assertEqual(['2', '1', '100', '10.0'], lines[2].split()[1:5])
+        self.assertTrue('  run 3 on node2: 10.0 frames/s, run_3.h5'
+                in lines)
+        self.assertTrue('  run 4 on node2: IOError: bad' in lines)
+        # stages of the prefetch thread have separate percentages
+        records[0]['stages'].update({'wait' : 0.5,
+            'prefetch read' : 0.75, 'prefetch idle' : 0.25})
+        lines = metrics.summarizeMetrics(records).split('\n')
+        i = lines.index('time in stages:')
+        j = lines.index('time in prefetch thread stages:')
+        self.assertEqual(['read', '6.2', 's', '92.6%'], lines[i + 1].split())
+        self.assertEqual(['wait', '0.5', 's', '7.4%'], lines[i + 2].split())
+        self.assertEqual(['prefetch', 'read', '0.8', 's', '75.0%'],
+                lines[j + 1].split())
+        summary = metrics.summarizeMetrics(records, by='run')
+        table = summary.split('\n\n')[0].split('\n')
+        self.assertEqual(['1', '2', '3', '4'],
+                [line.split()[0] for line in table[1:]])
+        return
+
+# End of class TestMetrics
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.prefetch
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy
+import h5py
+
+from py15sacla.ccdframes import CCDFrames
+from py15sacla.prefetch import FramePrefetcher
+
+##############################################################################
+class TestFramePrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(5)
+        with h5py.File(h5file, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(9):
+                dd = rs.poisson(0.5, (5, 4)).astype(numpy.float32) * 10
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = dd
+        self.ccd = CCDFrames(h5file)
+        self.nthreads = threading.active_count()
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_iteration(self):
+        """check frames and buffers returned by FramePrefetcher
+        """
+        sel = self.ccd.selection
+        roi = numpy.s_[1:3, 2:]
+        items = []
+        for name, shape, cfg, data in FramePrefetcher(sel, roi, depth=2,
+                start=3):
+            items.append((name, data.copy(), id(data)))
+            self.assertEqual((5, 4), shape)
+            self.assertAlmostEqual(0.1, cfg['tophotons'])
+        self.assertEqual(sel.names[3:], [n for n, d, b in items])
+        for n, d, b in items:
+            self.assertTrue(numpy.array_equal(sel.hdffile[n][roi], d))
+        # at most depth + 1 buffers are in use
+        self.assertTrue(len(set(b for n, d, b in items)) <= 3)
+        self.assertEqual(self.nthreads, threading.active_count())
+        self.assertRaises(ValueError, FramePrefetcher, sel, depth=0)
+        return
+
+
+    def test_close(self):
+        """check stopping of an unfinished FramePrefetcher
+        """
+        pf = FramePrefetcher(self.ccd.selection, depth=1)
+        next(pf)
+        pf.close()
+        self.assertEqual(self.nthreads, threading.active_count())
+        g = self.ccd.generate()
+        next(g)
+        g.close()
+        self.assertEqual(self.nthreads, threading.active_count())
+        return
+
+
+    def test_generate(self):
+        """check CCDFrames.generate with and without read-ahead
+        """
+        self.ccd.setROI(numpy.s_[1:, :3])
+        self.ccd.setThreshold(0.5, 4)
+        self.ccd.setBackground(self.ccd.toarray(0))
+        a1 = numpy.array(list(self.ccd.generate(2)))
+        self.ccd.cprefetch = 0
+        a0 = numpy.array(list(self.ccd.generate(2)))
+        self.assertEqual((7, 4, 3), a1.shape)
+        self.assertTrue(numpy.array_equal(a0, a1))
+        return
+
+# End of class TestFramePrefetcher
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
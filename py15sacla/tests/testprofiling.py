@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.profiling
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from py15sacla.profiling import ProfileStats, profile, active
+from py15sacla.synthetic import writeSyntheticRun
+from py15sacla.hdfselection import HDFSelection
+from py15sacla.ccdframes import CCDFrames
+
+##############################################################################
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        writeSyntheticRun(self.h5file, nframes=6, shape=(16, 12))
+        self.ccd = CCDFrames(self.h5file)
+        self.ccd.setBackground(0.1)
+        self.ccd.setThreshold(0.5, None)
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_ProfileStats(self):
+        """check ProfileStats counters and report
+        """
+        stats = ProfileStats()
+        stats.add('read', 0.5)
+        stats.add('read', 0.25)
+        stats.count('frames')
+        stats.count('frames', 2)
+        self.assertEqual(0.75, stats.times['read'])
+        self.assertEqual(2, stats.calls['read'])
+        self.assertEqual(3, stats.counters['frames'])
+        self.assertTrue('read' in str(stats))
+        stats.peak('rss', 5)
+        stats.peak('rss', 3)
+        self.assertEqual(5, stats.peaks['rss'])
+        other = pickle.loads(pickle.dumps(stats))
+        other.peak('rss', 7)
+        stats.merge(other)
+        self.assertEqual(1.5, stats.times['read'])
+        self.assertEqual(4, stats.calls['read'])
+        self.assertEqual(6, stats.counters['frames'])
+        self.assertEqual(7, stats.peaks['rss'])
+        return
+
+
+    def test_profile(self):
+        """check CCDFrames.profile()
+        """
+        ccd = self.ccd
+        self.assertIsNone(active())
+        with ccd.profile() as stats:
+            self.assertTrue(stats is active())
+            HDFSelection(self.h5file, 'detector_data$').hdffile.close()
+            ccd.mean()
+        self.assertIsNone(active())
+        self.assertEqual(6, stats.counters['frames'])
+        self.assertEqual(6 * 16 * 12 * 4, stats.counters['bytes'])
+        for stage in ('wait', 'convert', 'background', 'threshold',
+                'reduce', 'prefetch read', 'prefetch config',
+                'selection scan', 'selection match'):
+            self.assertTrue(stage in stats.times, stage)
+        self.assertEqual(6, stats.calls['convert'])
+        self.assertTrue(stats.elapsed > 0)
+        ccd.cprefetch = 0
+        with profile(stats):
+            ccd.mean()
+        self.assertEqual(12, stats.counters['frames'])
+        self.assertEqual(6, stats.calls['read'])
+        self.assertEqual(6, stats.calls['config'])
+        ccd.mean()
+        self.assertEqual(12, stats.counters['frames'])
+        return
+
+
+    def test_sketch_stage(self):
+        """check sketch is collected only in the sketch() pass
+        """
+        ccd = self.ccd
+        with ccd.profile() as stats:
+            ccd.mean()
+            ccd.histogram()
+        self.assertFalse('sketch' in stats.times)
+        with ccd.profile() as stats:
+            sk = ccd.sketch()
+            ccd.sketch()
+        self.assertEqual(6, stats.calls['sketch'])
+        self.assertEqual(6, stats.counters['frames'])
+        self.assertEqual(1, stats.counters['sketch cache hits'])
+        self.assertEqual(6 * 16 * 12, sk.count)
+        return
+
+# End of class TestProfiling
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.progress
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import h5py
+
+from py15sacla.ccdframes import CCDFrames
+from py15sacla.accumulators import MeanVarianceAccumulator
+from py15sacla.progress import Progress, relativeErrorBelow
+
+##############################################################################
+class TestProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        h5file = os.path.join(self.tmpdir, 'run_1.h5')
+        rs = numpy.random.RandomState(13)
+        with h5py.File(h5file, 'w') as fp:
+            fp['file_info/run_number_list'] = [1]
+            g = fp.create_group('run_1')
+            g['detector_2d_1/detector_info/absolute_gain'] = 2.0
+            g['run_info/sacla_config/photon_energy_in_eV'] = 73.0
+            for i in range(40):
+                dd = rs.normal(100, 5, (5, 4)).astype(numpy.float32)
+                g['detector_2d_1/tag_{}/detector_data'.format(100 + i)] = dd
+        self.ccd = CCDFrames(h5file)
+        return
+
+
+    def tearDown(self):
+        self.ccd.hdffile.close()
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_Progress(self):
+        """check Progress counting and report times
+        """
+        p = Progress(None, 4)
+        self.assertTrue(p.tick(0))
+        self.assertTrue(p.isreported())
+        self.assertFalse(p.tick(100))
+        self.assertFalse(p.isreported())
+        self.assertEqual(2, p.nframes)
+        self.assertEqual(0.5, p.fraction)
+        self.assertTrue(0 <= p.eta < 1)
+        return
+
+
+    def test_callback(self):
+        """check progress reports from CCDFrames reductions
+        """
+        reports = []
+        cb = lambda p: reports.append((p.nframes, p.acc.mean.copy()))
+        m = self.ccd.mean(callback=cb, interval=0)
+        self.assertEqual(list(range(1, 41)), [n for n, pm in reports])
+        self.assertTrue(numpy.allclose(self.ccd.mean(), m))
+        self.assertTrue(numpy.allclose(self.ccd.toarray(0), reports[0][1]))
+        self.assertTrue(numpy.allclose(self.ccd.sum(),
+            self.ccd.sum(callback=cb)))
+        # the final state is always reported
+        hreports = []
+        self.ccd.histogram(callback=lambda p: hreports.append(p.nframes),
+                interval=100)
+        self.assertEqual([40], hreports)
+        return
+
+
+    def test_stop(self):
+        """check early stopping on the relative error of the mean
+        """
+        stop = relativeErrorBelow(0.01, minframes=5)
+        p = self.ccd.accumulate(MeanVarianceAccumulator(), stop=stop,
+                interval=0)
+        self.assertTrue(p.stopped)
+        # relative error 0.05 / sqrt(n) is below 0.01 after ~25 frames
+        self.assertTrue(10 < p.nframes < 40)
+        m = self.ccd.mean(stop=stop, interval=0)
+        self.assertTrue(numpy.allclose(
+            self.ccd.toarray(slice(p.nframes)).mean(0), m))
+        stop = relativeErrorBelow(0.001)
+        p = self.ccd.accumulate(MeanVarianceAccumulator(), stop=stop)
+        self.assertFalse(p.stopped)
+        self.assertEqual(40, p.nframes)
+        return
+
+# End of class TestProgress
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.pumpprobe
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla.pumpprobe import PumpProbeAccumulator, pumpProbeRun
+
+##############################################################################
+class TestPumpProbeAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(3)
+        self.frames = rs.normal(10.0, 2.0, size=(12, 4, 3))
+        self.delays = [0.5, 0.5, 0.5, 0.5, 1.0, 1.0, 1.0, 1.0, 2, 2, 2, 2]
+        self.laser = [1, 0] * 6
+        self.keys = list(zip(self.delays, self.laser))
+        return
+
+
+    def test_update(self):
+        """check PumpProbeAccumulator.update()
+        """
+        acc = PumpProbeAccumulator()
+        for a, k in zip(self.frames[:5], self.keys):
+            acc.update(a, k)
+        acc.update(self.frames[5:], self.keys[5:])
+        self.assertEqual([0.5, 1.0, 2], acc.delays)
+        delays, non, noff = acc.counts()
+        self.assertEqual([2, 2, 2], list(non))
+        self.assertEqual([2, 2, 2], list(noff))
+        self.assertRaises(ValueError, acc.update, self.frames[:2],
+                          self.keys[:1])
+        return
+
+
+    def test_merge(self):
+        """check PumpProbeAccumulator.merge()
+        """
+        acc = PumpProbeAccumulator()
+        acc.update(self.frames, self.keys)
+        acc1 = PumpProbeAccumulator()
+        acc1.update(self.frames[:3], self.keys[:3])
+        acc2 = PumpProbeAccumulator()
+        acc2.update(self.frames[3:], self.keys[3:])
+        acc1.merge(acc2)
+        self.assertEqual(acc.delays, acc1.delays)
+        d0, diff0, err0 = acc.difference()
+        d1, diff1, err1 = acc1.difference()
+        self.assertTrue(numpy.allclose(diff0, diff1))
+        self.assertTrue(numpy.allclose(err0, err1))
+        return
+
+
+    def test_difference(self):
+        """check PumpProbeAccumulator.difference()
+        """
+        acc = PumpProbeAccumulator()
+        acc.update(self.frames, self.keys)
+        acc.update(self.frames[0], (3.0, True))
+        delays, diff, err = acc.difference()
+        self.assertEqual([0.5, 1.0, 2, 3.0], delays)
+        self.assertEqual((4, 4, 3), diff.shape)
+        on = self.frames[4:8:2]
+        off = self.frames[5:8:2]
+        self.assertTrue(numpy.allclose(on.mean(0) - off.mean(0), diff[1]))
+        e2 = on.var(0, ddof=1) / 2 + off.var(0, ddof=1) / 2
+        self.assertTrue(numpy.allclose(numpy.sqrt(e2), err[1]))
+        self.assertTrue(numpy.all(numpy.isnan(diff[3])))
+        delays, mon, moff = acc.means()
+        self.assertTrue(numpy.allclose(self.frames[0], mon[3]))
+        self.assertTrue(numpy.all(numpy.isnan(moff[3])))
+        delays, diff, err = PumpProbeAccumulator().difference()
+        self.assertEqual((0, 0, 0), diff.shape)
+        return
+
+# End of class TestPumpProbeAccumulator
+
+##############################################################################
+class TestPumpProbeRun(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'run_1.h5')
+        writeSyntheticRun(self.filename, nframes=40, shape=(16, 16),
+                          rate=2.0, noise=0.1, ndelays=2)
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_pumpProbeRun(self):
+        """check pumpProbeRun()
+        """
+        from py15sacla.ccdframes import CCDFrames
+        pp = pumpProbeRun(self.filename, background=None,
+                          threshold=(None, None))
+        delays, diff, err = pp.difference()
+        self.assertEqual([0.0, 0.5], delays)
+        self.assertEqual([10, 10], list(pp.counts()[1]))
+        # laser-on shots have a 1.5 times higher rate in the center
+        spot = diff[:, 4:12, 4:12].mean(axis=(1, 2))
+        self.assertTrue(numpy.all(spot > 0.7))
+        self.assertTrue(abs(diff[:, :4].mean()) < 0.3)
+        self.assertTrue(numpy.all((0.2 < err) & (err < 1.5)))
+        ccd = CCDFrames(self.filename)
+        laser = numpy.arange(40) % 2 == 0
+        self.assertRaises(ValueError, ccd.pumpProbe, laser[:5])
+        pp1 = ccd.pumpProbe(laser)
+        self.assertEqual([None], pp1.delays)
+        d, mon, moff = pp1.means()
+        self.assertTrue(numpy.allclose(ccd.groupby(laser)[0].mean(), mon[0]))
+        return
+
+# End of class TestPumpProbeRun
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
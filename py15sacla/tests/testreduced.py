@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.reduced
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import h5py
+
+from py15sacla.reduced import ReducedRun, ReducedStore, loadReduced
+from py15sacla.reduced import loadPreview
+
+##############################################################################
+class TestReduced(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _makeRun(self, run, delay=None):
+        rs = numpy.random.RandomState(run)
+        events = [] if delay is None else [('opt_delay', [delay, delay])]
+        rv = ReducedRun(run, rs.uniform(size=(4, 3)),
+                variance=rs.uniform(size=(4, 3)), nframes=2, events=events,
+                keys=[1, 2], keyimages=numpy.ones((2, 4, 3)),
+                histogram=([1, 2], [0.0, 1.0, 2.0]),
+                provenance={'infile' : 'run_{}.h5'.format(run)})
+        return rv
+
+
+    def test_save(self):
+        """check ReducedRun.save() and loadReduced()
+        """
+        fn = os.path.join(self.tmpdir, 'comp.h5')
+        rr = self._makeRun(3, delay=1.5)
+        rr.save(fn)
+        with h5py.File(fn, 'r') as fp:
+            self.assertEqual('lzf', fp['image'].compression)
+            self.assertEqual((4, 3), fp['keys/means'].chunks[1:])
+        r1 = loadReduced(fn)
+        self.assertEqual(3, r1.run)
+        self.assertEqual(2, r1.nframes)
+        self.assertTrue(numpy.array_equal(rr.image, r1.image))
+        self.assertTrue(numpy.array_equal(rr.variance, r1.variance))
+        self.assertEqual(['opt_delay'], list(r1.events))
+        self.assertEqual([1, 2], list(r1.keys))
+        self.assertEqual([0, 1, 2], list(r1.histogram[1]))
+        self.assertEqual('run_3.h5', r1.provenance['infile'])
+        self.assertRaises(ValueError, ReducedRun, 1, rr.image,
+                events=[('image', [1])])
+        # per-shot features
+        self.assertEqual({}, r1.features)
+        rr.features = ReducedRun(3, rr.image, features=[
+            ('tag', [4, 6]), ('total', [1.5, 2.5])]).features
+        rr.save(fn)
+        r2 = loadReduced(fn)
+        self.assertEqual(['tag', 'total'], list(r2.features))
+        self.assertEqual([1.5, 2.5], list(r2.features['total']))
+        self.assertEqual(['opt_delay'], list(r2.events))
+        self.assertRaises(ValueError, ReducedRun, 1, rr.image,
+                features=[('tag', [4, 6]), ('total', [1.5])])
+        return
+
+
+    def test_loadReduced_legacy(self):
+        """check loadReduced() for files of the comp1file.py script
+        """
+        fn = os.path.join(self.tmpdir, 'comp_legacy.h5')
+        with h5py.File(fn, 'w') as fp:
+            fp['run'] = 7
+            fp['opt_delay'] = [1.0, 2.0]
+            fp['image'] = numpy.ones((4, 3))
+        r1 = loadReduced(fn)
+        self.assertEqual(7, r1.run)
+        self.assertIsNone(r1.variance)
+        self.assertEqual(['opt_delay'], list(r1.events))
+        return
+
+
+    def test_ReducedStore(self):
+        """check adding runs to ReducedStore and reading its index
+        """
+        fn = os.path.join(self.tmpdir, 'store.h5')
+        with ReducedStore(fn) as store:
+            store.add(self._makeRun(5))
+            store.add(self._makeRun(6, delay=2.0))
+        rrfile = os.path.join(self.tmpdir, 'comp.h5')
+        self._makeRun(5, delay=3.0).save(rrfile)
+        with ReducedStore(fn) as store:
+            store.add(rrfile)
+            self.assertEqual([5, 6], list(store.runs))
+            self.assertTrue(5 in store)
+            self.assertEqual([3.0, 2.0], list(store.column('opt_delay')))
+            self.assertEqual((2, 4, 1), store.images(numpy.s_[:, 2:]).shape)
+            self.assertTrue(numpy.array_equal(self._makeRun(6).image,
+                store.images()[1]))
+            self.assertEqual(2, store.read(6).nframes)
+            self.assertRaises(KeyError, store.read, 8)
+            self.assertRaises(ValueError, store.add,
+                    ReducedRun(8, numpy.ones((2, 2))))
+            self.assertEqual(2, len(store))
+        self.assertRaises(ValueError, ReducedStore, rrfile)
+        return
+
+    def test_loadPreview(self):
+        """check loadPreview() and ReducedStore.preview()
+        """
+        fn = os.path.join(self.tmpdir, 'comp.h5')
+        image = numpy.random.RandomState(3).uniform(size=(300, 130))
+        ReducedRun(3, image, nframes=1).save(fn)
+        with h5py.File(fn, 'r') as fp:
+            self.assertEqual(['2', '4', '8'], sorted(fp['pyramid']))
+            self.assertEqual((75, 32), fp['pyramid/4'].shape)
+        factor, a = loadPreview(fn)
+        self.assertEqual(2, factor)
+        self.assertEqual((150, 65), a.shape)
+        self.assertAlmostEqual(image[:2, :2].mean(), a[0, 0])
+        self.assertEqual(4, loadPreview(fn, maxsize=100)[0])
+        self.assertEqual(8, loadPreview(fn, maxsize=10)[0])
+        self.assertEqual(1, loadPreview(fn, maxsize=300)[0])
+        legacy = os.path.join(self.tmpdir, 'comp_legacy.h5')
+        with h5py.File(legacy, 'w') as fp:
+            fp['image'] = image
+        factor, a = loadPreview(legacy, maxsize=100)
+        self.assertEqual(4, factor)
+        self.assertEqual((75, 32), a.shape)
+        storefile = os.path.join(self.tmpdir, 'store.h5')
+        with ReducedStore(storefile) as store:
+            store.add(fn)
+            self.assertEqual(4, store.preview(3, maxsize=100)[0])
+            self.assertRaises(KeyError, store.preview, 4)
+        return
+
+# End of class TestReduced
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.scheduler
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla import scheduler
+
+##############################################################################
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.states = {}
+        for run, nframes in [(1, 1000), (2, 200), (3, 300), (4, 100)]:
+            st = _FakeRunState()
+            st.nframes = nframes
+            st.chunks = [(run, lo, min(lo + 100, nframes))
+                    for lo in range(0, nframes, 100)]
+            st.failed = False
+            self.states[run] = st
+        return
+
+
+    def test__assignRuns(self):
+        """check balancing of runs between worker queues.
+        """
+        queues = scheduler._assignRuns(list(self.states.values()), 2)
+        loads = [sum(hi - lo for run, lo, hi in q) for q in queues]
+        self.assertEqual([1000, 600], loads)
+        self.assertEqual((3, 0, 100), queues[1][0])
+        return
+
+
+    def test__nextChunk(self):
+        """check that idle workers steal from the longest queue.
+        """
+        queues = scheduler._assignRuns(list(self.states.values()), 3)
+        sch = scheduler._Scheduler(queues, self.states, {}, {}, 1)
+        self.assertEqual((1, 0, 100), sch._nextChunk(0))
+        # worker 2 has runs 4 and 2, after those it steals from run 1
+        order = [sch._nextChunk(2) for i in range(4)]
+        self.assertEqual([(2, 0, 100), (2, 100, 200), (4, 0, 100),
+            (1, 900, 1000)], order)
+        self.states[1].failed = True
+        # chunks of the failed run are skipped when stealing
+        self.assertEqual((3, 200, 300), sch._nextChunk(2))
+        self.assertEqual((3, 100, 200), sch._nextChunk(0))
+        self.assertEqual((3, 0, 100), sch._nextChunk(0))
+        self.assertEqual(None, sch._nextChunk(0))
+        return
+
+# End of class TestScheduler
+
+##############################################################################
+class TestRunChunked(unittest.TestCase):
+
+    def setUp(self):
+        from py15sacla.synthetic import writeSyntheticRun
+        self.tmpdir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.tmpdir, 'run_{run}_sig.h5')
+        self.logdir = os.path.join(self.tmpdir, 'logs')
+        for run, nframes in [(1, 11), (2, 5)]:
+            writeSyntheticRun(self.infile.format(run=run), run=run,
+                    nframes=nframes, shape=(12, 10), seed=run)
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def _run(self, name, **kw):
+        "Return runChunked results and output file template."
+        outfile = os.path.join(self.tmpdir, name + '_{run}.h5')
+        kw.setdefault('chunksize', 3)
+        results = scheduler.runChunked([1, 2], logdir=self.logdir,
+                infile=self.infile, outfile=outfile, background=None,
+                **kw)
+        return (results, outfile)
+
+
+    def test_runChunked(self):
+        """check runChunked() output agrees with runBatch()
+        """
+        from py15sacla.batch import runBatch
+        from py15sacla.reduced import loadReduced
+        results, outfile = self._run('chunked', jobs=2)
+        self.assertEqual([1, 2], [r.run for r in results])
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([1, 1], [r.attempts for r in results])
+        with open(results[0].logfile) as fp:
+            self.assertEqual(4, fp.read().count('done on worker'))
+        batchfile = os.path.join(self.tmpdir, 'batch_{run}.h5')
+        runBatch([1, 2], logdir=self.logdir, infile=self.infile,
+                outfile=batchfile, background=None)
+        for run in (1, 2):
+            r0 = loadReduced(batchfile.format(run=run))
+            r1 = loadReduced(outfile.format(run=run))
+            self.assertEqual(r0.nframes, r1.nframes)
+            self.assertTrue(numpy.allclose(r0.image, r1.image))
+            self.assertTrue(numpy.allclose(r0.variance, r1.variance))
+        return
+
+
+    def test_retries(self):
+        """check runChunked() retries of failed chunks
+        """
+        from unittest import mock
+        from py15sacla import compression
+        accumulate = compression.accumulateFrames
+        failures = []
+        def flaky(signal, start=0, stop=None):
+            if start == 3 and not failures:
+                failures.append(start)
+                raise RuntimeError("read error")
+            return accumulate(signal, start, stop)
+        with mock.patch.object(compression, 'accumulateFrames', flaky):
+            results, outfile = self._run('retry', jobs=1)
+        self.assertEqual([3], failures)
+        self.assertTrue(results[0].ok)
+        self.assertEqual(2, results[0].attempts)
+        with open(results[0].logfile) as fp:
+            self.assertTrue('RuntimeError: read error' in fp.read())
+        # run fails when retries are exhausted
+        del failures[:]
+        with mock.patch.object(compression, 'accumulateFrames', flaky):
+            results, outfile = self._run('noretry', jobs=1, retries=0)
+        self.assertFalse(results[0].ok)
+        self.assertEqual('RuntimeError: read error', results[0].error)
+        self.assertTrue(results[1].ok)
+        self.assertFalse(os.path.exists(outfile.format(run=1)))
+        return
+
+
+    def test_dead_worker(self):
+        """check runChunked() restarts a worker process that died
+        """
+        from unittest import mock
+        from py15sacla import compression
+        accumulate = compression.accumulateFrames
+        marker = os.path.join(self.tmpdir, 'died')
+        def crash(signal, start=0, stop=None):
+            if start == 3 and not os.path.exists(marker):
+                open(marker, 'w').close()
+                os._exit(1)
+            return accumulate(signal, start, stop)
+        with mock.patch.object(compression, 'accumulateFrames', crash):
+            results, outfile = self._run('dead', jobs=2)
+        self.assertTrue(os.path.exists(marker))
+        self.assertTrue(all(r.ok for r in results))
+        # the first chunk from frame 3 may belong to either run
+        self.assertEqual([1, 2], sorted(r.attempts for r in results))
+        r = max(results, key=lambda r: r.attempts)
+        with open(r.logfile) as fp:
+            self.assertTrue('worker process died' in fp.read())
+        return
+
+# End of class TestRunChunked
+
+
+class _FakeRunState(object):
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
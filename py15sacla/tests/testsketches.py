@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.sketches
+"""
+
+import unittest
+import numpy
+
+from py15sacla.sketches import ExtremaSketch, QuantileSketch
+
+##############################################################################
+class TestExtremaSketch(unittest.TestCase):
+
+    def test_update(self):
+        """check ExtremaSketch.update() and merge()
+        """
+        es = ExtremaSketch()
+        self.assertEqual(None, es.vmin)
+        es.update([[3, 1], [4, 1]])
+        es.update([])
+        es2 = ExtremaSketch()
+        es2.update([-5, 9, 2])
+        es.merge(es2)
+        es.merge(ExtremaSketch())
+        self.assertEqual((7, -5, 9), (es.count, es.vmin, es.vmax))
+        return
+
+# End of class TestExtremaSketch
+
+##############################################################################
+class TestQuantileSketch(unittest.TestCase):
+
+    def setUp(self):
+        rs = numpy.random.RandomState(3)
+        self.frames = rs.exponential(2.0, size=(40, 50, 50))
+        return
+
+
+    def test_quantile(self):
+        """check QuantileSketch.quantile()
+        """
+        qs = QuantileSketch(capacity=2000, seed=1)
+        self.assertRaises(ValueError, qs.quantile, 0.5)
+        for a in self.frames:
+            qs.update(a)
+        self.assertEqual(self.frames.size, qs.count)
+        self.assertEqual(2000, len(qs.values))
+        self.assertEqual(self.frames.min(), qs.quantile(0))
+        self.assertEqual(self.frames.max(), qs.percentile(100))
+        q = [0.1, 0.5, 0.9]
+        qexact = numpy.quantile(self.frames, q)
+        qrank = numpy.searchsorted(numpy.sort(self.frames.ravel()),
+                qs.quantile(q)) / float(self.frames.size)
+        self.assertTrue(numpy.allclose(q, qrank, atol=0.05))
+        self.assertTrue(numpy.allclose(qexact, qs.quantile(q), rtol=0.2))
+        return
+
+
+    def test_merge(self):
+        """check QuantileSketch.merge()
+        """
+        qs1 = QuantileSketch(capacity=1000, seed=1)
+        qs2 = QuantileSketch(capacity=1000, seed=2)
+        for a in self.frames[:20]:
+            qs1.update(a)
+        for a in self.frames[20:]:
+            qs2.update(2 * a)
+        qs1.merge(qs2)
+        self.assertEqual(self.frames.size, qs1.count)
+        self.assertEqual(1000, len(qs1.values))
+        self.assertEqual(2 * self.frames[20:].max(), qs1.quantile(1))
+        # about half of the kept values should come from each part
+        nhi = numpy.sum(numpy.isin(qs1.values, qs2.values))
+        self.assertTrue(400 < nhi < 600)
+        return
+
+# End of class TestQuantileSketch
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Unit tests for py15sacla.synthetic
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from py15sacla.synthetic import writeSyntheticRun, FIRST_TAG
+from py15sacla.hdfselection import HDFSelection
+from py15sacla.ccdframes import CCDFrames
+from py15sacla.compression import readEventColumns
+from py15sacla.utils import getDetectorConfig
+
+##############################################################################
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+
+    def test_writeSyntheticRun(self):
+        """check writeSyntheticRun()
+        """
+        fn = os.path.join(self.tmpdir, 'run_3_sig.h5')
+        tags = writeSyntheticRun(fn, run=3, nframes=8, shape=(12, 10),
+                rate=0.5, noise=0, ndelays=2, dtype=numpy.int16)
+        self.assertEqual(list(range(FIRST_TAG, FIRST_TAG + 16, 2)), tags)
+        sel = HDFSelection(fn, 'detector_data$')
+        self.assertEqual(8, len(sel))
+        self.assertEqual('/run_3/detector_2d_1/tag_{}/detector_data'.format(
+            tags[1]), sel[1].name)
+        self.assertEqual(numpy.int16, sel[0].dtype)
+        cfg = getDetectorConfig(sel[0])
+        self.assertEqual(3, cfg['run_number'])
+        ccd = CCDFrames(sel)
+        photons = ccd.toarray(slice(None))
+        self.assertEqual((8, 12, 10), photons.shape)
+        self.assertTrue(numpy.allclose(photons, numpy.round(photons),
+            atol=0.01))
+        events = dict(readEventColumns(HDFSelection(fn)))
+        self.assertEqual([0, 0, 0.5, 0.5, 0, 0, 0.5, 0.5],
+                list(events['opt_delay']))
+        self.assertEqual([1, 0, 1, 0], list(events['laser_selector'][:4]))
+        self.assertEqual(8, len(events['I0']))
+        sel.hdffile.close()
+        return
+
+# End of class TestSynthetic
+
+if __name__ == '__main__':
+    unittest.main()
+
+# End of file
@@ -47,6 +47,9 @@ def getDetectorConfig(src):
     ('absolute_gain', 'photon_energy_in_eV', 'e_per_ph', 'tophotons',
      'run_number')
     """
+    from py15sacla.framecache import CachedFrame
+    if isinstance(src, CachedFrame):
+        return src.config()
     # upper lookup when src is under some run_N group
     if src.name.startswith('/run_'):
         run_name = src.name.split('/', 2)[1]
@@ -60,9 +63,9 @@ def getDetectorConfig(src):
     # collect configuration data
     rv = {'run_number' : run_number}
     dsgain = grun['detector_2d_1/detector_info/absolute_gain']
-    rv['absolute_gain'] = dsgain.value
+    rv['absolute_gain'] = dsgain[()]
     dsphe = grun['run_info/sacla_config/photon_energy_in_eV']
-    rv['photon_energy_in_eV'] = dsphe.value
+    rv['photon_energy_in_eV'] = dsphe[()]
     rv['e_per_ph'] = (rv['photon_energy_in_eV'] /
             (SILICON_GAP * rv['absolute_gain']))
     rv['tophotons'] = 1.0 / rv['e_per_ph']
@@ -100,29 +103,24 @@ def getHDFArray(src, pattern):
 
     Return NumPy array.
     '''
-    return getHDFDataset(src, pattern).value
+    return getHDFDataset(src, pattern)[()]
 
 
 def unique_ordered(a):
     "Return unique values in array a in the order of appearance."
-    import pandas
-    return pandas.unique(a)
+    from py15sacla.groupstats import unique_ordered as _unique_ordered
+    return _unique_ordered(a)
 
 ordered_unique = unique_ordered
 
 
 def multiplicities(a):
     "Return multiplicities of unique values in array a."
-    import numpy
-    import collections
-    a = numpy.asarray(a)
-    cnts = collections.OrderedDict()
-    for x in a.flat:
-        cnts[x] = cnts.get(x, 0) + 1
-    return numpy.array(cnts.values())
+    from py15sacla.groupstats import multiplicities as _multiplicities
+    return _multiplicities(a)
 
 
-def findfiles(patterns=(), path=None):
+def findfiles(patterns=(), path=None, cache=True):
     '''Return filenames that match all specified patterns.
 
     patterns -- a list of string patterns that must all match in the
@@ -131,6 +129,9 @@ def findfiles(patterns=(), path=None):
     path     -- optional list of directories to be searched instead
                 of the current directory.  Can be also a string which
                 is taken as a single directory path.
+    cache    -- reuse directory listings from previous calls when the
+                directory modification time has not changed.  Use False
+                to always read the directories.
 
     Pattern syntax and examples:
 
@@ -142,26 +143,35 @@ def findfiles(patterns=(), path=None):
     <7->     -- match an integer greater or equal 7 allowing leading zeros
     <->      -- match any integer
 
-    Return a list of matching filenames.
+    Several directories are scanned concurrently.
+
+    Return a list of matching filenames.  The list is IPython SList
+    when IPython is already imported, e.g., in an interactive session.
     '''
+    import sys
     import os.path
     from py15sacla.multipattern import MultiPattern
-    from IPython.utils.text import SList
-    if isinstance(path, basestring):
+    if isinstance(path, str):
         path = [path]
     mp = MultiPattern(patterns)
-    allpaths = ['.'] if path is None else path
-    rv = SList()
-    for d in unique_everseen(allpaths):
-        if not os.path.isdir(d):  continue
-        dirfiles = os.listdir(d)
-        dirfiles.sort(key=sortKeyNumericString)
-        # filter matching names first, this does not need any disk access
-        files = filter(mp.match, dirfiles)
-        files = [os.path.normpath(os.path.join(d, f)) for f in files]
-        # filter out any directories
-        files = filter(os.path.isfile, files)
-        rv += files
+    allpaths = list(unique_everseen(['.'] if path is None else path))
+    rv = []
+    # avoid slow import of IPython in batch jobs
+    if 'IPython' in sys.modules:
+        from IPython.utils.text import SList
+        rv = SList()
+    listdir = lambda d: _listFiles(d, cache)
+    if len(allpaths) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(min(8, len(allpaths))) as pool:
+            listings = list(pool.map(listdir, allpaths))
+    else:
+        listings = [listdir(d) for d in allpaths]
+    for d, dirfiles in zip(allpaths, listings):
+        # filter matching names first and sort only the matches
+        files = [f for f in dirfiles if mp.match(f)]
+        files.sort(key=sortKeyNumericString)
+        rv += [os.path.normpath(os.path.join(d, f)) for f in files]
     return rv
 
 
@@ -200,3 +210,42 @@ def sortKeyNumericString(s):
     rv = sortKeyNumericString.rxdigits.split(s)
     rv[1::2] = map(int, rv[1::2])
     return rv
+
+# Local Helpers --------------------------------------------------------------
+
+# Cached directory listings as {path : (mtime_ns, filenames)}.
+_dircache = {}
+
+# Listings of directories modified less than this many seconds before
+# the scan are not cached, because a file system with a coarse time
+# resolution may not update mtime for a change in the same interval.
+_DIRCACHE_MINAGE = 2.0
+
+
+def _listFiles(d, cache=True):
+    """Return names of regular files in directory d.
+
+    d        -- directory path.  Return empty list when not a directory.
+    cache    -- use and update the cached listings of _dircache.
+
+    The listing uses file type from os.scandir, so that it does not
+    need a stat call per each file on most file systems.
+    """
+    import os
+    import time
+    try:
+        st = os.stat(d)
+    except OSError:
+        return []
+    key = os.path.abspath(d)
+    cached = _dircache.get(key) if cache else None
+    if cached is not None and cached[0] == st.st_mtime_ns:
+        return cached[1]
+    try:
+        with os.scandir(d) as entries:
+            rv = [e.name for e in entries if e.is_file()]
+    except NotADirectoryError:
+        return []
+    if cache and time.time() - st.st_mtime >= _DIRCACHE_MINAGE:
+        _dircache[key] = (st.st_mtime_ns, rv)
+    return rv
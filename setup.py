@@ -3,4 +3,7 @@ from setuptools import setup
 setup(name='py15sacla',
       version=0.1,
       packages=['py15sacla'],
+      entry_points={
+          'console_scripts' : ['py15sacla = py15sacla.cli:main'],
+      },
       zip_safe=False)